@@ -5,6 +5,8 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from yolowebapp2.conditional import add_validators, make_etag, not_modified
+
 from .models import DetectionResult, MultiDetectionBatch
 from .serializers import DetectionResultSerializer, MultiDetectionBatchSerializer
 
@@ -57,6 +59,11 @@ class DetectionResultViewSet(viewsets.ModelViewSet):
         """
         Get detection statistics across all results
         GET /api/detections/statistics/
+
+        Answers 304 while the statistics equal the client's copy. The ETag
+        is a digest of the aggregated values themselves, so any create,
+        update or delete that changes them also changes the validator.
+        Results carry no modification time, so no Last-Modified is sent.
         """
         from django.db.models import Avg, Count, Sum
 
@@ -67,18 +74,28 @@ class DetectionResultViewSet(viewsets.ModelViewSet):
             avg_processing_time=Avg("processing_time"),
         )
 
-        fruit_stats = DetectionResult.objects.values("fruit_type").annotate(
-            count=Count("id"),
-            total_detected=Sum("detected_count"),
-            total_weight=Sum("total_weight"),
+        fruit_stats = list(
+            DetectionResult.objects.values("fruit_type")
+            .annotate(
+                count=Count("id"),
+                total_detected=Sum("detected_count"),
+                total_weight=Sum("total_weight"),
+            )
+            .order_by("fruit_type")
         )
 
-        return Response(
+        etag = make_etag("detection-statistics", stats, fruit_stats)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        response = Response(
             {
                 "overall": stats,
                 "by_fruit_type": fruit_stats,
             }
         )
+        return add_validators(response, etag)
 
     @action(detail=False, methods=["get"])
     def recent(self, request):
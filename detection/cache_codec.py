@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary encoding for cached prediction payloads.
+
+A pickled payload spends most of its bytes on ``bbox_coordinates``, a list
+of ``{"x": .., "y": ..}`` dicts that runs to thousands of entries on
+tree-dense images. The codec stores the centres as one packed int32 array
+inside a msgpack envelope and compresses the envelope with zstd once it is
+large enough to benefit.
+
+Layout: ``b"FVP"`` magic, format version byte, flags byte, body. Decoded
+payloads are plain dicts identical to what was encoded, so callers never
+see the encoding.
+"""
+import threading
+from typing import Any, Dict, Optional
+
+import msgpack
+import numpy as np
+import zstandard
+
+MAGIC = b"FVP"
+FORMAT_VERSION = 1
+_HEADER_SIZE = len(MAGIC) + 2
+
+_FLAG_ZSTD = 0x01
+
+# Envelope field holding the packed centres in place of bbox_coordinates
+_CENTERS_FIELD = "bbox_centers_i4"
+
+# Bodies below this size are stored uncompressed
+COMPRESS_MIN_BYTES = 256
+ZSTD_LEVEL = 3
+
+# zstd contexts are not thread-safe, keep one pair per thread
+_local = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        compressor = _local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    decompressor = getattr(_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+
+def pack_centers(centers: list) -> bytes:
+    """
+    ``[{"x": x, "y": y}, ...]`` as little-endian int32 pairs, byte-shuffled.
+
+    The bytes are stored plane by plane (all lowest bytes first, then the
+    next, ...). Pixel coordinates leave the upper planes almost entirely zero,
+    which zstd then reduces to a few bytes.
+    """
+    values = np.fromiter(
+        (v for c in centers for v in (c["x"], c["y"])),
+        dtype="<i4",
+        count=2 * len(centers),
+    )
+    return values.view(np.uint8).reshape(-1, 4).T.tobytes()
+
+
+def unpack_centers(data: bytes) -> list:
+    """Inverse of :func:`pack_centers`."""
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(4, -1)
+    values = np.ascontiguousarray(planes.T).view("<i4")
+    return [{"x": x, "y": y} for x, y in values.reshape(-1, 2).tolist()]
+
+
+def encode_prediction(data: Dict[str, Any]) -> bytes:
+    """
+    Encode a prediction payload for storage in Redis.
+
+    Args:
+        data: Payload as built by the detection view or task
+
+    Returns:
+        bytes: Encoded payload
+    """
+    envelope = dict(data)
+    centers = envelope.pop("bbox_coordinates", None)
+    if centers is not None:
+        envelope[_CENTERS_FIELD] = pack_centers(centers)
+
+    body = msgpack.packb(envelope, use_bin_type=True)
+    flags = 0
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = _compressor().compress(body)
+        flags |= _FLAG_ZSTD
+    return MAGIC + bytes((FORMAT_VERSION, flags)) + body
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, bytes) and value[: len(MAGIC)] == MAGIC
+
+
+def decode_prediction(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Decode a cached value back into the payload dict.
+
+    Dicts stored before the codec existed are returned unchanged.
+
+    Args:
+        value: Raw value read from the cache
+
+    Returns:
+        dict or None: Payload, or None for an empty value
+
+    Raises:
+        ValueError: If the value is not a payload this codec understands
+    """
+    if value is None or isinstance(value, dict):
+        return value
+    if not is_encoded(value):
+        raise ValueError("Tanınmayan önbellek kaydı")
+
+    version, flags = value[len(MAGIC)], value[len(MAGIC) + 1]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Desteklenmeyen önbellek kodlama sürümü: {version}")
+
+    body = value[_HEADER_SIZE:]
+    if flags & _FLAG_ZSTD:
+        body = _decompressor().decompress(body)
+
+    data = msgpack.unpackb(body, raw=False)
+    centers = data.pop(_CENTERS_FIELD, None)
+    if centers is not None:
+        data["bbox_coordinates"] = unpack_centers(centers)
+    return data
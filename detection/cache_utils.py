@@ -4,20 +4,199 @@ Cache utilities for detection results.
 
 This module provides:
 - Image hashing (SHA256)
-- Cache key generation
-- Cache operations with error handling
-- Cache statistics
+- Cache key generation, versioned by model fingerprint and a per-fruit
+  generation counter
+- Cache operations with error handling; Redis values use the compact
+  encoding from cache_codec
+- An in-process LRU tier in front of Redis
+- Single-flight coordination so concurrent uploads of the same image run
+  the model only once
+- Per-fruit, per-day prediction cache statistics kept in Redis counters
+- A perceptual-hash index so re-compressed or resized re-uploads reuse the
+  earlier prediction (near hits, reported separately from exact hits)
 """
+import atexit
+import copy
 import hashlib
 import logging
-from typing import Any, Dict, Optional
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
+
+from detection import perceptual_hash
+from detection.cache_codec import decode_prediction, encode_prediction
 
 logger = logging.getLogger(__name__)
 
 
+class LocalPredictionCache:
+    """
+    Small per-process LRU with a TTL, consulted before Redis.
+
+    Entries expire after ``ttl`` seconds so an invalidation in another
+    process is picked up here within that window. Values are deep-copied on
+    the way in and out so callers cannot mutate a cached entry.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_local_cache = LocalPredictionCache(
+    max_entries=getattr(settings, "PREDICTION_LOCAL_CACHE_SIZE", 512),
+    ttl=getattr(settings, "PREDICTION_LOCAL_CACHE_TTL", 300),
+)
+
+# Process-local counters, reported by get_cache_statistics()
+_counters = {
+    "local_hits": 0,
+    "redis_hits": 0,
+    "near_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+}
+_counters_lock = threading.Lock()
+
+# fruit_type -> (expires_at, generation), see get_prediction_generation()
+_generations: Dict[str, Tuple[float, int]] = {}
+_generations_lock = threading.Lock()
+
+# Keys this process is currently computing; followers wait on the event
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+# Statistics deltas not yet written to Redis, see flush_prediction_stats()
+_stats_pending: Dict[Tuple[str, str], int] = {}
+_stats_images: Dict[str, set] = {}
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+# near_hits are lookups that missed exactly and were served by a near-duplicate
+_STAT_FIELDS = ("hits", "near_hits", "misses", "sets", "bytes_written")
+
+# image_hash -> dHash; the dHash is a function of the content, so the memo
+# never goes stale and an upload is decoded for hashing at most once
+_perceptual_hashes: "OrderedDict[str, Optional[int]]" = OrderedDict()
+_perceptual_hashes_lock = threading.Lock()
+_PERCEPTUAL_MEMO_SIZE = 256
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _stats_key(day: str, suffix: str = "") -> str:
+    return cache.make_key(f"prediction_stats:{day}{suffix}")
+
+
+def _record_stat(
+    fruit_type: str, field: str, amount: int = 1, image_hash: Optional[str] = None
+) -> None:
+    """Buffer a statistics delta; flushed every PREDICTION_STATS_FLUSH_INTERVAL."""
+    with _stats_lock:
+        key = (fruit_type, field)
+        _stats_pending[key] = _stats_pending.get(key, 0) + amount
+        if image_hash:
+            _stats_images.setdefault(fruit_type, set()).add(image_hash)
+        due = time.monotonic() - _stats_flushed_at >= getattr(
+            settings, "PREDICTION_STATS_FLUSH_INTERVAL", 10
+        )
+    if due:
+        flush_prediction_stats()
+
+
+def flush_prediction_stats() -> None:
+    """
+    Write buffered prediction statistics to today's Redis counters.
+
+    Counts go to the hash ``prediction_stats:<day>`` (field
+    ``<fruit>:<counter>``) and image hashes to the HyperLogLog
+    ``prediction_stats:<day>:<fruit>:images``, all expiring after
+    PREDICTION_STATS_RETENTION_DAYS. Buffered deltas are dropped if Redis
+    is unavailable.
+    """
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_stats_pending)
+        images = {k: list(v) for k, v in _stats_images.items()}
+        _stats_pending.clear()
+        _stats_images.clear()
+        _stats_flushed_at = time.monotonic()
+    if not pending and not images:
+        return
+
+    day = timezone.localdate().strftime("%Y%m%d")
+    ttl = getattr(settings, "PREDICTION_STATS_RETENTION_DAYS", 30) * 86400
+    try:
+        from django_redis import get_redis_connection
+
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        counters_key = _stats_key(day)
+        for (fruit_type, field), amount in pending.items():
+            pipe.hincrby(counters_key, f"{fruit_type}:{field}", amount)
+        pipe.expire(counters_key, ttl)
+        for fruit_type, hashes in images.items():
+            images_key = _stats_key(day, f":{fruit_type}:images")
+            pipe.pfadd(images_key, *hashes)
+            pipe.expire(images_key, ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Cache statistics flush error (Redis unavailable?): %s", e)
+
+
+# Buffered deltas would otherwise be lost when a worker is recycled
+# (gunicorn max_requests, Celery MAX_TASKS_PER_CHILD). Celery workers also
+# flush after every task and on process shutdown, see yolowebapp2.celery.
+atexit.register(flush_prediction_stats)
+
+
 def calculate_image_hash(image_data: bytes) -> str:
     """
     Calculate SHA256 hash of image data.
@@ -37,11 +216,130 @@ def calculate_image_hash(image_data: bytes) -> str:
         raise
 
 
+def hash_and_spool_upload(upload: Any, destination: "os.PathLike[str] | str") -> str:
+    """
+    Hash an uploaded file while copying it to disk in the same pass.
+
+    Iterates ``upload.chunks()`` so only one chunk is held in memory at a
+    time. The digest equals calculate_image_hash() over the full content.
+
+    Args:
+        upload: Django UploadedFile
+        destination: File to write the upload to
+
+    Returns:
+        str: Hexadecimal SHA256 hash
+    """
+    sha256_hash = hashlib.sha256()
+    with open(destination, "wb") as out:
+        for chunk in upload.chunks():
+            sha256_hash.update(chunk)
+            out.write(chunk)
+    return sha256_hash.hexdigest()
+
+
+def get_model_fingerprint(fruit_type: str) -> str:
+    """
+    Short digest of everything besides the image that shapes a prediction.
+
+    Covers the SHA256 of the fruit's weights file, its registry version and
+    the inference parameters (confidence, IoU, input size), so replacing
+    ``elma.pt`` or changing a threshold yields new cache keys.
+
+    Args:
+        fruit_type: Type of fruit
+
+    Returns:
+        str: 16 hex characters
+    """
+    from detection.constants import FRUIT_MODEL_PATHS
+    from detection.model_registry import get_model_info
+    from yolowebapp2.artifact_cache import file_sha256
+    from yolowebapp2.predict_tree import CONF_THRES, IMG_SIZE, IOU_THRES
+
+    weights_path = FRUIT_MODEL_PATHS.get(fruit_type)
+    try:
+        weights_digest = file_sha256(weights_path) if weights_path else "none"
+    except OSError:
+        weights_digest = "missing"
+
+    version = (get_model_info(os.path.basename(str(weights_path))) or {}).get(
+        "version", "0"
+    )
+    parts = [weights_digest, version, str(CONF_THRES), str(IOU_THRES), str(IMG_SIZE)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _generation_key(fruit_type: str) -> str:
+    return f"prediction_generation:{fruit_type}"
+
+
+def get_prediction_generation(fruit_type: str) -> int:
+    """
+    Current cache generation of a fruit type.
+
+    Every prediction key embeds the generation, so bumping it orphans all
+    earlier keys at once; they then expire through their TTL. The value is
+    memoized per process for PREDICTION_GENERATION_TTL seconds.
+
+    Args:
+        fruit_type: Type of fruit
+
+    Returns:
+        int: Generation number (0 if Redis is unavailable)
+    """
+    now = time.monotonic()
+    with _generations_lock:
+        memo = _generations.get(fruit_type)
+        if memo and memo[0] > now:
+            return memo[1]
+
+    generation = 0
+    try:
+        key = _generation_key(fruit_type)
+        value = cache.get(key)
+        if value is None:
+            # Seeded from the clock so a lost counter never revives old keys
+            cache.add(key, int(time.time()), None)
+            value = cache.get(key)
+        generation = int(value or 0)
+    except Exception as e:
+        logger.warning("Cache generation read error (Redis unavailable?): %s", e)
+
+    ttl = getattr(settings, "PREDICTION_GENERATION_TTL", 5)
+    with _generations_lock:
+        _generations[fruit_type] = (now + ttl, generation)
+    return generation
+
+
+def bump_prediction_generation(fruit_type: str) -> int:
+    """
+    Invalidate every cached prediction of a fruit type in O(1).
+
+    Args:
+        fruit_type: Type of fruit
+
+    Returns:
+        int: New generation number
+    """
+    key = _generation_key(fruit_type)
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        generation = int(time.time())
+        cache.set(key, generation, None)
+
+    with _generations_lock:
+        _generations.pop(fruit_type, None)
+    logger.info("Cache generation bumped: %s -> %s", fruit_type, generation)
+    return generation
+
+
 def get_prediction_cache_key(image_hash: str, fruit_type: str) -> str:
     """
     Generate cache key for prediction results.
 
-    Format: prediction:{image_hash}:{fruit_type}
+    Format: prediction:{fruit_type}:{generation}:{model}:{image_hash}
 
     Args:
         image_hash: SHA256 hash of image
@@ -51,9 +349,25 @@ def get_prediction_cache_key(image_hash: str, fruit_type: str) -> str:
         str: Cache key
     """
     cache_key_format = getattr(
-        settings, "PREDICTION_CACHE_KEY_FORMAT", "prediction:{image_hash}:{fruit_type}"
+        settings,
+        "PREDICTION_CACHE_KEY_FORMAT",
+        "prediction:{fruit_type}:{generation}:{model}:{image_hash}",
+    )
+    return cache_key_format.format(
+        image_hash=image_hash,
+        fruit_type=fruit_type,
+        generation=get_prediction_generation(fruit_type),
+        model=get_model_fingerprint(fruit_type),
     )
-    return cache_key_format.format(image_hash=image_hash, fruit_type=fruit_type)
+
+
+def _decode(cache_key: str, value: Any) -> Optional[Dict[str, Any]]:
+    """Decode a Redis value; undecodable entries are treated as a miss."""
+    try:
+        return decode_prediction(value)
+    except Exception as e:
+        logger.warning("Cache decode error %s: %s", cache_key, e)
+        return None
 
 
 def get_cached_prediction(image_hash: str, fruit_type: str) -> Optional[Dict[str, Any]]:
@@ -69,12 +383,25 @@ def get_cached_prediction(image_hash: str, fruit_type: str) -> Optional[Dict[str
     """
     try:
         cache_key = get_prediction_cache_key(image_hash, fruit_type)
-        cached_result = cache.get(cache_key)
+
+        cached_result = _local_cache.get(cache_key)
+        if cached_result:
+            _count("local_hits")
+            _record_stat(fruit_type, "hits", image_hash=image_hash)
+            logger.info("Cache HIT (local): %s", cache_key)
+            return cached_result
+
+        cached_result = _decode(cache_key, cache.get(cache_key))
 
         if cached_result:
+            _count("redis_hits")
+            _record_stat(fruit_type, "hits", image_hash=image_hash)
+            _local_cache.set(cache_key, cached_result)
             logger.info("Cache HIT: %s", cache_key)
             return cached_result
         else:
+            _count("misses")
+            _record_stat(fruit_type, "misses", image_hash=image_hash)
             logger.info("Cache MISS: %s", cache_key)
             return None
 
@@ -88,6 +415,7 @@ def set_cached_prediction(
     fruit_type: str,
     prediction_data: Dict[str, Any],
     timeout: Optional[int] = None,
+    image_path: Optional[str] = None,
 ) -> bool:
     """
     Cache prediction result.
@@ -97,6 +425,8 @@ def set_cached_prediction(
         fruit_type: Type of fruit
         prediction_data: Prediction results to cache
         timeout: Cache timeout in seconds (default: 24 hours)
+        image_path: The image file; when given, the image is also added to
+            the near-duplicate index
 
     Returns:
         bool: True if successfully cached, False otherwise
@@ -107,8 +437,17 @@ def set_cached_prediction(
         if timeout is None:
             timeout = getattr(settings, "PREDICTION_CACHE_TIMEOUT", 86400)
 
-        cache.set(cache_key, prediction_data, timeout)
+        encoded = encode_prediction(prediction_data)
+        # Keep what Redis readers will see, so both tiers return the same value
+        decoded = _decode(cache_key, encoded)
+        if decoded is not None:
+            _local_cache.set(cache_key, decoded)
+        cache.set(cache_key, encoded, timeout)
+        _record_stat(fruit_type, "sets")
+        _record_stat(fruit_type, "bytes_written", len(encoded))
         logger.info("Cache SET: %s (timeout=%ss)", cache_key, timeout)
+        if image_path:
+            index_perceptual_hash(image_hash, fruit_type, image_path, timeout)
         return True
 
     except Exception as e:
@@ -116,6 +455,255 @@ def set_cached_prediction(
         return False
 
 
+def _near_duplicate_distance() -> int:
+    return getattr(settings, "PREDICTION_NEAR_DUPLICATE_MAX_DISTANCE", 0)
+
+
+def _perceptual_hash(image_hash: str, image_path: str) -> Optional[int]:
+    with _perceptual_hashes_lock:
+        if image_hash in _perceptual_hashes:
+            _perceptual_hashes.move_to_end(image_hash)
+            return _perceptual_hashes[image_hash]
+
+    value = perceptual_hash.dhash(image_path)
+
+    with _perceptual_hashes_lock:
+        _perceptual_hashes[image_hash] = value
+        while len(_perceptual_hashes) > _PERCEPTUAL_MEMO_SIZE:
+            _perceptual_hashes.popitem(last=False)
+    return value
+
+
+def _band_keys(fruit_type: str, value: int, max_distance: int) -> list:
+    """Redis keys of the LSH buckets ``value`` falls into."""
+    prefix = "prediction_phash:{}:{}:{}:{}".format(
+        fruit_type,
+        get_prediction_generation(fruit_type),
+        get_model_fingerprint(fruit_type),
+        max_distance,
+    )
+    return [
+        cache.make_key(f"{prefix}:{index}:{band:x}")
+        for index, band in perceptual_hash.bands(value, max_distance)
+    ]
+
+
+def index_perceptual_hash(
+    image_hash: str, fruit_type: str, image_path: str, timeout: Optional[int] = None
+) -> bool:
+    """
+    Add an image to the near-duplicate index of its fruit type.
+
+    Each LSH bucket is a Redis set of ``<dhash>:<image_hash>`` members. The
+    bucket keys embed the cache generation and model fingerprint, so they
+    are orphaned together with the predictions they point to.
+
+    Args:
+        image_hash: SHA256 hash of image
+        fruit_type: Type of fruit
+        image_path: The image file
+        timeout: Bucket TTL in seconds (default: PREDICTION_CACHE_TIMEOUT)
+
+    Returns:
+        bool: True if the image was indexed
+    """
+    max_distance = _near_duplicate_distance()
+    if max_distance <= 0:
+        return False
+    value = _perceptual_hash(image_hash, image_path)
+    if value is None:
+        return False
+
+    if timeout is None:
+        timeout = getattr(settings, "PREDICTION_CACHE_TIMEOUT", 86400)
+    try:
+        from django_redis import get_redis_connection
+
+        member = f"{value:016x}:{image_hash}"
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for key in _band_keys(fruit_type, value, max_distance):
+            pipe.sadd(key, member)
+            pipe.expire(key, timeout)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning("Perceptual index error (Redis unavailable?): %s", e)
+        return False
+
+
+def find_near_duplicate(
+    image_hash: str, fruit_type: str, image_path: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Cached prediction of an earlier, perceptually identical image.
+
+    Candidates share at least one LSH bucket with the upload; the closest
+    one within PREDICTION_NEAR_DUPLICATE_MAX_DISTANCE bits whose prediction
+    is still cached wins. A copy of its prediction is then cached under
+    ``image_hash`` so the next identical upload is an exact hit; the copy's
+    ``image_hash`` is the upload's own and ``near_duplicate_of`` names the
+    image the prediction was actually computed for.
+
+    Args:
+        image_hash: SHA256 hash of the upload
+        fruit_type: Type of fruit
+        image_path: The uploaded image file
+
+    Returns:
+        dict or None: The aliased prediction, or None if there is no near-duplicate
+    """
+    max_distance = _near_duplicate_distance()
+    if max_distance <= 0:
+        return None
+    value = _perceptual_hash(image_hash, image_path)
+    if value is None:
+        return None
+
+    try:
+        from django_redis import get_redis_connection
+
+        members = get_redis_connection("default").sunion(
+            _band_keys(fruit_type, value, max_distance)
+        )
+    except Exception as e:
+        logger.warning("Perceptual index lookup error (Redis unavailable?): %s", e)
+        return None
+
+    candidates = []
+    for member in members:
+        hex_value, _, candidate_hash = member.decode("utf-8").partition(":")
+        distance = perceptual_hash.hamming_distance(value, int(hex_value, 16))
+        if distance <= max_distance and candidate_hash != image_hash:
+            candidates.append((distance, candidate_hash))
+
+    for distance, candidate_hash in sorted(candidates):
+        try:
+            cache_key = get_prediction_cache_key(candidate_hash, fruit_type)
+            cached_result = _local_cache.get(cache_key) or _decode(
+                cache_key, cache.get(cache_key)
+            )
+        except Exception as e:
+            logger.warning("Cache retrieval error (Redis unavailable?): %s", e)
+            return None
+        if cached_result:
+            _count("near_hits")
+            _record_stat(fruit_type, "near_hits", image_hash=image_hash)
+            logger.info(
+                "Cache NEAR HIT: %s ~ %s (distance=%s)",
+                image_hash[:16],
+                candidate_hash[:16],
+                distance,
+            )
+            alias = dict(
+                cached_result,
+                image_hash=image_hash,
+                near_duplicate_of=cached_result.get("near_duplicate_of") or candidate_hash,
+            )
+            set_cached_prediction(image_hash, fruit_type, alias, image_path=image_path)
+            return alias
+    return None
+
+
+def _wait_for_result(
+    cache_key: str, lock_key: str, wait_timeout: float
+) -> Optional[Dict[str, Any]]:
+    """Poll Redis until another worker publishes the result or drops its lock."""
+    poll_interval = getattr(settings, "PREDICTION_LOCK_POLL_INTERVAL", 0.1)
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        cached_result = _decode(cache_key, cache.get(cache_key))
+        if cached_result:
+            _local_cache.set(cache_key, cached_result)
+            return cached_result
+        if not cache.get(lock_key):
+            return None
+    return None
+
+
+@contextmanager
+def prediction_single_flight(
+    image_hash: str,
+    fruit_type: str,
+    wait_timeout: Optional[float] = None,
+    image_path: Optional[str] = None,
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Coordinate concurrent requests for the same image and fruit type.
+
+    Yields the cached prediction when it exists or when another thread or
+    worker produces it while this one waits. Yields None when the caller is
+    the one that must run the model; it should then call
+    set_cached_prediction() inside the block. Same-process followers wait on
+    an event, other processes on a Redis lock (``cache.add``). If Redis is
+    unavailable or the wait times out, the caller computes on its own.
+
+    Args:
+        image_hash: SHA256 hash of image
+        fruit_type: Type of fruit
+        wait_timeout: Seconds to wait for another worker (default:
+            PREDICTION_LOCK_WAIT)
+        image_path: The image file; when given, an exact miss is followed by
+            a near-duplicate lookup (see find_near_duplicate())
+    """
+    cached_result = get_cached_prediction(image_hash, fruit_type)
+    if not cached_result and image_path:
+        cached_result = find_near_duplicate(image_hash, fruit_type, image_path)
+    if cached_result:
+        yield cached_result
+        return
+
+    if wait_timeout is None:
+        wait_timeout = getattr(settings, "PREDICTION_LOCK_WAIT", 60)
+
+    cache_key = get_prediction_cache_key(image_hash, fruit_type)
+    lock_key = f"{cache_key}:lock"
+
+    with _inflight_lock:
+        event = _inflight.get(cache_key)
+        is_leader = event is None
+        if is_leader:
+            event = _inflight[cache_key] = threading.Event()
+
+    if not is_leader:
+        event.wait(wait_timeout)
+        cached_result = get_cached_prediction(image_hash, fruit_type)
+        if cached_result:
+            _count("coalesced")
+            logger.info("Cache COALESCED (local): %s", cache_key)
+        yield cached_result
+        return
+
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    acquired = None
+    try:
+        try:
+            acquired = cache.add(
+                lock_key, token, getattr(settings, "PREDICTION_LOCK_TIMEOUT", 120)
+            )
+        except Exception as e:
+            logger.warning("Cache lock error (Redis unavailable?): %s", e)
+
+        # add() is None when django-redis swallowed a connection error
+        if acquired is False:
+            cached_result = _wait_for_result(cache_key, lock_key, wait_timeout)
+            if cached_result:
+                _count("coalesced")
+                logger.info("Cache COALESCED: %s", cache_key)
+
+        yield cached_result
+    finally:
+        if acquired:
+            try:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            except Exception as e:
+                logger.warning("Cache lock release error: %s", e)
+        with _inflight_lock:
+            _inflight.pop(cache_key, None)
+        event.set()
+
+
 def invalidate_prediction_cache(image_hash: str, fruit_type: str) -> bool:
     """
     Invalidate (delete) a cached prediction.
@@ -129,6 +717,7 @@ def invalidate_prediction_cache(image_hash: str, fruit_type: str) -> bool:
     """
     try:
         cache_key = get_prediction_cache_key(image_hash, fruit_type)
+        _local_cache.delete(cache_key)
         cache.delete(cache_key)
         logger.info("Cache INVALIDATED: %s", cache_key)
         return True
@@ -142,108 +731,123 @@ def invalidate_all_predictions(fruit_type: Optional[str] = None) -> int:
     """
     Invalidate all cached predictions, optionally filtered by fruit type.
 
+    Bumps the generation of each affected fruit type instead of scanning
+    Redis; the orphaned keys expire through PREDICTION_CACHE_TIMEOUT.
+
     Args:
         fruit_type: If provided, only invalidate predictions for this fruit type
 
     Returns:
-        int: Number of keys deleted
+        int: Number of fruit types invalidated
     """
-    try:
-        if fruit_type:
-            pattern = f"farmvision:prediction:*:{fruit_type}"
-        else:
-            pattern = "farmvision:prediction:*"
+    from detection.constants import FRUIT_MODEL_FILES
 
-        # Get all matching keys using SCAN (non-blocking alternative to KEYS)
-        from django_redis import get_redis_connection
+    # Other processes drop their local copies within PREDICTION_GENERATION_TTL
+    _local_cache.clear()
 
-        redis_conn = get_redis_connection("default")
+    fruit_types = [fruit_type] if fruit_type else list(FRUIT_MODEL_FILES)
+    invalidated = 0
+    for name in fruit_types:
+        try:
+            bump_prediction_generation(name)
+            invalidated += 1
+        except Exception as e:
+            logger.warning("Bulk cache invalidation error (%s): %s", name, e)
 
-        # Use SCAN instead of KEYS to avoid blocking Redis
-        cursor = 0
-        keys_to_delete = []
-        while True:
-            cursor, keys = redis_conn.scan(cursor, match=pattern, count=100)
-            keys_to_delete.extend(keys)
-            if cursor == 0:
-                break
-
-        if keys_to_delete:
-            # Delete keys in batches to avoid overwhelming Redis
-            batch_size = 1000
-            total_deleted = 0
-            for i in range(0, len(keys_to_delete), batch_size):
-                batch = keys_to_delete[i : i + batch_size]
-                total_deleted += redis_conn.delete(*batch)
+    logger.info("Cache BULK INVALIDATED: %s fruit types", invalidated)
+    return invalidated
 
-            logger.info(
-                "Cache BULK INVALIDATED: %s keys (pattern=%s)", total_deleted, pattern
-            )
-            return total_deleted
-        else:
-            logger.info("No cache keys found for pattern: %s", pattern)
-            return 0
 
-    except Exception as e:
-        logger.warning("Bulk cache invalidation error: %s", e)
-        return 0
+def get_prediction_counters() -> Dict[str, int]:
+    """
+    Prediction cache hit/miss/coalesce counters of this process.
 
+    Returns:
+        dict: local_hits, redis_hits, misses, coalesced and local_entries
+    """
+    with _counters_lock:
+        counters = dict(_counters)
+    counters["local_entries"] = len(_local_cache)
+    return counters
 
-def get_cache_statistics() -> Dict[str, Any]:
+
+def get_cache_statistics(days: int = 1) -> Dict[str, Any]:
     """
-    Get cache statistics including hit/miss ratios and memory usage.
+    Get prediction cache statistics per fruit type.
+
+    Reads the dedicated counters maintained by get_cached_prediction() and
+    set_cached_prediction(), so the cost does not grow with the number of
+    cached keys and other Redis traffic (Celery, throttling) is excluded.
+
+    Args:
+        days: Number of days to aggregate, ending today
 
     Returns:
         dict: Cache statistics
     """
+    from detection.constants import FRUIT_MODEL_FILES
+
+    flush_prediction_stats()
+
     try:
         from django_redis import get_redis_connection
 
         redis_conn = get_redis_connection("default")
 
-        # Get Redis info
-        redis_info = redis_conn.info()
+        today = timezone.localdate()
+        day_keys = [
+            (today - timedelta(days=offset)).strftime("%Y%m%d")
+            for offset in range(max(days, 1))
+        ]
+
+        pipe = redis_conn.pipeline(transaction=False)
+        for day in day_keys:
+            pipe.hgetall(_stats_key(day))
+        fruit_types = list(FRUIT_MODEL_FILES)
+        for fruit_type in fruit_types:
+            pipe.pfcount(
+                *[_stats_key(day, f":{fruit_type}:images") for day in day_keys]
+            )
+        results = pipe.execute()
 
-        # Count prediction cache keys using SCAN to avoid blocking Redis
-        prediction_keys = []
-        cursor = 0
-        while True:
-            cursor, keys = redis_conn.scan(
-                cursor, match="farmvision:prediction:*", count=100
-            )
-            prediction_keys.extend(keys)
-            if cursor == 0:
-                break
-        prediction_count = len(prediction_keys)
-
-        # Calculate memory usage for prediction keys
-        prediction_memory = 0
-        if prediction_keys:
-            for key in prediction_keys[:100]:  # Sample first 100 keys
-                try:
-                    prediction_memory += redis_conn.memory_usage(key) or 0
-                except BaseException:
-                    pass
-
-            # Estimate total memory
-            if len(prediction_keys) > 100:
-                prediction_memory = int(prediction_memory * len(prediction_keys) / 100)
-
-        # Get hit/miss stats
-        keyspace_hits = redis_info.get("keyspace_hits", 0)
-        keyspace_misses = redis_info.get("keyspace_misses", 0)
-        total_requests = keyspace_hits + keyspace_misses
-
-        hit_rate = (keyspace_hits / total_requests * 100) if total_requests > 0 else 0
+        per_fruit: Dict[str, Dict[str, Any]] = {
+            fruit_type: dict.fromkeys(_STAT_FIELDS, 0) for fruit_type in fruit_types
+        }
+        for counters in results[: len(day_keys)]:
+            for field, value in counters.items():
+                fruit_type, _, name = field.decode("utf-8").rpartition(":")
+                entry = per_fruit.setdefault(
+                    fruit_type, dict.fromkeys(_STAT_FIELDS, 0)
+                )
+                entry[name] = entry.get(name, 0) + int(value)
+        for fruit_type, unique in zip(fruit_types, results[len(day_keys) :]):
+            per_fruit[fruit_type]["unique_images"] = unique
+
+        totals = dict.fromkeys(_STAT_FIELDS, 0)
+        for entry in per_fruit.values():
+            entry.setdefault("unique_images", 0)
+            lookups = entry["hits"] + entry["misses"]
+            entry["hit_rate_percent"] = (
+                round(entry["hits"] / lookups * 100, 2) if lookups else 0
+            )
+            for field in _STAT_FIELDS:
+                totals[field] += entry[field]
+        lookups = totals["hits"] + totals["misses"]
+
+        redis_info = redis_conn.info()
 
         stats = {
             "redis_available": True,
-            "prediction_keys_count": prediction_count,
-            "prediction_memory_bytes": prediction_memory,
-            "prediction_memory_mb": round(prediction_memory / (1024 * 1024), 2),
-            "keyspace_hits": keyspace_hits,
-            "keyspace_misses": keyspace_misses,
-            "hit_rate_percent": round(hit_rate, 2),
+            "days": len(day_keys),
+            "fruit_types": per_fruit,
+            "hits": totals["hits"],
+            "near_hits": totals["near_hits"],
+            "misses": totals["misses"],
+            "sets": totals["sets"],
+            "bytes_written": totals["bytes_written"],
+            "hit_rate_percent": round(totals["hits"] / lookups * 100, 2)
+            if lookups
+            else 0,
             "total_memory_used_mb": round(
                 redis_info.get("used_memory", 0) / (1024 * 1024), 2
             ),
@@ -252,9 +856,10 @@ def get_cache_statistics() -> Dict[str, Any]:
             ),
             "connected_clients": redis_info.get("connected_clients", 0),
             "uptime_seconds": redis_info.get("uptime_in_seconds", 0),
+            "prediction_requests": get_prediction_counters(),
         }
 
-        logger.info("Cache statistics retrieved: %s prediction keys", prediction_count)
+        logger.info("Cache statistics retrieved: %s lookups", lookups)
         return stats
 
     except Exception as e:
@@ -263,4 +868,5 @@ def get_cache_statistics() -> Dict[str, Any]:
             "redis_available": False,
             "error": str(e),
             "message": "Redis bağlantısı kurulamadı",
+            "prediction_requests": get_prediction_counters(),
         }
@@ -50,6 +50,9 @@ FRUIT_MODEL_PATHS: Dict[str, Path] = {
 MAX_DETECTION_FILE_SIZE = 10 * 1024 * 1024  # 10MB for fruit detection
 MAX_DRONE_FILE_SIZE = 100 * 1024 * 1024  # 100MB for drone orthophotos
 
+# Prefix of the per-request temp directories uploads are spooled into
+UPLOAD_SPOOL_PREFIX = "farmvision_upload_"
+
 # Allowed file extensions
 DETECTION_ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "bmp"}
 DRONE_ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "tif", "tiff"}
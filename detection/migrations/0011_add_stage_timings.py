@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("detection", "0010_add_created_by"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="detectionresult",
+            name="stage_timings",
+            field=models.JSONField(
+                null=True,
+                blank=True,
+                help_text="Per-stage latency in milliseconds for sampled requests: {'forward': float, 'nms': float, ...}",
+            ),
+        ),
+    ]
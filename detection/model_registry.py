@@ -12,6 +12,10 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 # Model metadata registry
+#
+# "backend" selects the inference runtime: "pytorch" (eager model from
+# attempt_load) or "onnx" (ONNX Runtime on CPU, using the <name>.onnx file
+# produced by ``manage.py export_onnx`` next to the weights).
 MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
     "mandalina.pt": {
         "version": "1.0.0",
@@ -23,6 +27,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.1,
         "iou_threshold": 0.45,
+        "backend": "pytorch",
     },
     "elma.pt": {
         "version": "1.0.0",
@@ -34,6 +39,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.1,
         "iou_threshold": 0.45,
+        "backend": "pytorch",
     },
     "armut.pt": {
         "version": "1.0.0",
@@ -45,6 +51,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.1,
         "iou_threshold": 0.45,
+        "backend": "pytorch",
     },
     "seftale.pt": {
         "version": "1.0.0",
@@ -56,6 +63,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.1,
         "iou_threshold": 0.45,
+        "backend": "pytorch",
     },
     "nar.pt": {
         "version": "1.0.0",
@@ -67,6 +75,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.1,
         "iou_threshold": 0.45,
+        "backend": "pytorch",
     },
     "agac.pt": {
         "version": "1.0.0",
@@ -78,6 +87,7 @@ MODEL_REGISTRY: Dict[str, Dict[str, Any]] = {
         "input_size": 640,
         "confidence_threshold": 0.25,
         "iou_threshold": 0.7,
+        "backend": "pytorch",
     },
 }
 
@@ -95,6 +105,20 @@ def get_model_info(model_name: str) -> Optional[Dict[str, Any]]:
     return MODEL_REGISTRY.get(model_name)
 
 
+def get_model_backend(model_name: str) -> str:
+    """
+    Get the inference backend configured for a model
+
+    Args:
+        model_name: Weights file name or path (e.g., 'agac.pt')
+
+    Returns:
+        "pytorch" or "onnx"; unregistered models use "pytorch"
+    """
+    info = MODEL_REGISTRY.get(os.path.basename(model_name)) or {}
+    return info.get("backend", "pytorch")
+
+
 def get_all_models() -> Dict[str, Dict[str, Any]]:
     """
     Get metadata for all registered models
@@ -129,6 +153,7 @@ def get_loaded_models_info() -> list:
                 "description": info["description"],
                 "framework": info.get("framework", "Unknown"),
                 "input_size": info.get("input_size", 0),
+                "backend": info.get("backend", "pytorch"),
             }
         )
     return loaded_models
@@ -14,6 +14,11 @@ class DetectionResult(models.Model):
     weight: models.FloatField = models.FloatField()
     total_weight: models.FloatField = models.FloatField()
     processing_time: models.FloatField = models.FloatField()
+    stage_timings: models.JSONField = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Per-stage latency in milliseconds for sampled requests: {'forward': float, 'nms': float, ...}",
+    )
     confidence_score: models.FloatField = models.FloatField(
         null=True, blank=True, help_text="Average confidence score from YOLO detection"
     )
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Perceptual hashing for near-duplicate upload detection.
+
+Field teams often re-upload a photo that a phone has re-compressed, resized
+or re-tagged, which changes every byte and so misses the SHA256 cache. The
+64-bit difference hash (dHash) of such a copy differs from the original's in
+only a few bits.
+
+Near-duplicates are found with a banded Hamming LSH: the hash is split into
+``max_distance + 1`` bands, and by the pigeonhole principle two hashes within
+``max_distance`` bits agree exactly on at least one band. Candidates are
+therefore the images sharing any band value, and only those are compared
+bit by bit.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+_HASH_SIZE = 8
+
+
+def dhash(image_path: str) -> Optional[int]:
+    """
+    64-bit difference hash of an image.
+
+    The image is oriented by its EXIF tag, reduced to 9x8 grey pixels and
+    each bit records whether a pixel is brighter than its right neighbour.
+    JPEGs are decoded at reduced scale via ``draft``, so hashing a
+    multi-megapixel photo costs a fraction of a full decode.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        int or None: Hash, or None if the image cannot be read
+    """
+    try:
+        with Image.open(image_path) as img:
+            img.draft("L", (_HASH_SIZE * 8, _HASH_SIZE * 8))
+            img = ImageOps.exif_transpose(img)
+            pixels = list(
+                img.convert("L")
+                .resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.LANCZOS)
+                .getdata()
+            )
+    except Exception as e:
+        logger.warning("Algısal özet hesaplanamadı %s: %s", image_path, e)
+        return None
+
+    value = 0
+    for row in range(_HASH_SIZE):
+        offset = row * (_HASH_SIZE + 1)
+        for col in range(_HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def band_ranges(max_distance: int) -> List[Tuple[int, int]]:
+    """``(shift, width)`` of each band for a given distance threshold."""
+    bands = max_distance + 1
+    base, extra = divmod(HASH_BITS, bands)
+    ranges = []
+    shift = 0
+    for index in range(bands):
+        width = base + (1 if index < extra else 0)
+        ranges.append((shift, width))
+        shift += width
+    return ranges
+
+
+def bands(value: int, max_distance: int) -> List[Tuple[int, int]]:
+    """``(band_index, band_value)`` pairs of ``value``."""
+    return [
+        (index, (value >> shift) & ((1 << width) - 1))
+        for index, (shift, width) in enumerate(band_ranges(max_distance))
+    ]
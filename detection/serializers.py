@@ -18,6 +18,7 @@ class DetectionResultSerializer(serializers.ModelSerializer):
             "weight",
             "total_weight",
             "processing_time",
+            "stage_timings",
             "confidence_score",
             "model_version",
             "threshold_used",
@@ -10,11 +10,13 @@ This module contains background tasks for:
 import logging
 import os
 import time
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 from celery import shared_task
 
+from detection.cache_utils import prediction_single_flight, set_cached_prediction
 from detection.models import DetectionResult
 from yolowebapp2 import predict_tree
 
@@ -22,6 +24,7 @@ from detection.constants import (
     DETECTION_CONFIDENCE_THRESHOLD,
     FRUIT_MODEL_PATHS,
     FRUIT_WEIGHTS,
+    UPLOAD_SPOOL_PREFIX,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,6 +33,15 @@ logger = logging.getLogger(__name__)
 FRUIT_MODELS = {k: str(v) for k, v in FRUIT_MODEL_PATHS.items()}
 
 
+def _remove_upload(image_path: str) -> None:
+    """Delete a spooled upload and its per-request directory."""
+    if os.path.exists(image_path):
+        os.unlink(image_path)
+    spool_dir = Path(image_path).parent
+    if spool_dir.name.startswith(UPLOAD_SPOOL_PREFIX):
+        spool_dir.rmdir()
+
+
 def _send_degradation_alert(alerts: list) -> None:
     """
     Send model degradation alerts via webhook and/or email.
@@ -110,6 +122,7 @@ def process_image_detection(
     tree_count: int,
     tree_age: int,
     user_id: Optional[int] = None,
+    image_hash: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Asynchronous image detection task.
@@ -121,6 +134,8 @@ def process_image_detection(
         tree_count: Number of trees
         tree_age: Age of trees
         user_id: Optional user ID who initiated the task
+        image_hash: SHA256 of the upload; when given, concurrent tasks for the
+            same image share one prediction and the result is cached
 
     Returns:
         dict: Detection results including count, weight, confidence, etc.
@@ -153,26 +168,59 @@ def process_image_detection(
         )
 
         start_time = time.time()
+        stage_timings: dict = {}
 
-        try:
-            (
-                detec,
-                unique_id,
-                confidence_score,
-                bbox_centers,
-            ) = predict_tree.predict(
-                path_to_weights=model_path,
-                path_to_source=image_path,
-                return_boxes=True,
-            )
-
-            # Extract detection count
-            count_str = detec.decode("utf-8")
-            detected_count = int(count_str)
-
-        except Exception as e:
-            logger.error("Task %s: Detection failed: %s", self.request.id, e)
-            raise
+        single_flight = (
+            prediction_single_flight(image_hash, fruit_type)
+            if image_hash
+            else nullcontext()
+        )
+        with single_flight as cached_result:
+            if cached_result:
+                # Another worker finished the same image while this task waited
+                detected_count = int(cached_result["detected_count"])
+                confidence_score = cached_result["confidence_score"]
+                bbox_centers = cached_result.get("bbox_coordinates")
+                result_image_path = cached_result["image_path"]
+                unique_id = Path(result_image_path).parent.name
+            else:
+                try:
+                    (
+                        detec,
+                        unique_id,
+                        confidence_score,
+                        bbox_centers,
+                    ) = predict_tree.predict(
+                        path_to_weights=model_path,
+                        path_to_source=image_path,
+                        return_boxes=True,
+                        timings=stage_timings,
+                    )
+
+                    # Extract detection count
+                    count_str = detec.decode("utf-8")
+                    detected_count = int(count_str)
+
+                except Exception as e:
+                    logger.error("Task %s: Detection failed: %s", self.request.id, e)
+                    raise
+
+                result_image_path = f"detected/{unique_id}/{Path(image_path).name}"
+                if image_hash:
+                    set_cached_prediction(
+                        image_hash,
+                        fruit_type,
+                        {
+                            "detected_count": detected_count,
+                            "weight_per_fruit": FRUIT_WEIGHTS[fruit_type],
+                            "confidence_score": confidence_score,
+                            "image_path": result_image_path,
+                            "fruit_type": fruit_type,
+                            "image_hash": image_hash,
+                            "bbox_coordinates": bbox_centers,
+                        },
+                        image_path=image_path,
+                    )
 
         # Update state
         self.update_state(
@@ -198,10 +246,11 @@ def process_image_detection(
             weight=weight,
             total_weight=total_weight,
             processing_time=processing_time,
+            stage_timings=stage_timings or None,
             confidence_score=confidence_score,
             model_version=Path(model_path).name,
             threshold_used=conf_thres,
-            image_path=f"detected/{unique_id}/{Path(image_path).name}",
+            image_path=result_image_path,
             task_id=self.request.id,
             bbox_coordinates=bbox_centers,
         )
@@ -215,11 +264,8 @@ def process_image_detection(
 
         # Clean up temp file
         try:
-            if os.path.exists(image_path):
-                os.unlink(image_path)
-                logger.debug(
-                    "Task %s: Cleaned up temp file %s", self.request.id, image_path
-                )
+            _remove_upload(image_path)
+            logger.debug("Task %s: Cleaned up temp file %s", self.request.id, image_path)
         except Exception as cleanup_error:
             logger.warning(f"Task {self.request.id}: Cleanup failed: {cleanup_error}")
 
@@ -233,7 +279,7 @@ def process_image_detection(
             "total_weight": float(total_weight),
             "confidence_score": float(confidence_score),
             "processing_time": float(processing_time),
-            "image_path": f"detected/{unique_id}/{Path(image_path).name}",
+            "image_path": result_image_path,
             "unique_id": str(unique_id),
             "detection_result_id": int(detection_result.pk),
         }
@@ -245,8 +291,7 @@ def process_image_detection(
 
         # Clean up on failure
         try:
-            if os.path.exists(image_path):
-                os.unlink(image_path)
+            _remove_upload(image_path)
         except BaseException:
             pass
 
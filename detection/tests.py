@@ -14,17 +14,22 @@ To run tests:
 """
 
 import io
+import pickle
+import random
 import tempfile
 from unittest.mock import MagicMock, patch
 
 from PIL import Image
 from django.urls import reverse
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .cache_utils import calculate_image_hash
+from . import cache_codec, cache_utils, perceptual_hash
+from .cache_utils import calculate_image_hash, hash_and_spool_upload
+from .constants import FRUIT_MODEL_FILES
 from .models import DetectionResult, MultiDetectionBatch
 
 
@@ -119,6 +124,41 @@ class DetectionAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("overall", response.data)
 
+    def test_statistics_revalidates_with_etag(self):
+        """Test that unchanged statistics are answered with 304."""
+        first = self.client.get("/api/detections/statistics/")
+        etag = first["ETag"]
+
+        response = self.client.get(
+            "/api/detections/statistics/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        DetectionResult.objects.create(
+            fruit_type="elma", tree_count=1, tree_age=1, detected_count=1,
+            weight=1.0, total_weight=1.0, processing_time=0.1,
+            confidence_score=0.5, image_path="detected/test/elma.jpg",
+        )
+        response = self.client.get(
+            "/api/detections/statistics/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_statistics_etag_changes_when_a_result_is_edited(self):
+        """Test that an update leaving row count and created_at alone still revalidates."""
+        first = self.client.get("/api/detections/statistics/")
+        self.assertNotIn("Last-Modified", first)
+
+        # What a PATCH does: same row count, same created_at
+        DetectionResult.objects.filter(pk=self.detection.pk).update(detected_count=150)
+
+        response = self.client.get(
+            "/api/detections/statistics/", HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["overall"]["total_fruits_detected"], 150)
+
     def test_get_recent_detections(self):
         """Test getting recent detections."""
         response = self.client.get("/api/detections/recent/")
@@ -155,6 +195,318 @@ class CacheUtilsTests(TestCase):
         hash2 = calculate_image_hash(data2)
         self.assertNotEqual(hash1, hash2)
 
+    def test_spooled_hash_matches_in_memory_hash(self):
+        """Test that hashing while spooling matches hashing the full bytes."""
+        data = bytes(range(256)) * 1000
+        upload = SimpleUploadedFile("image.jpg", data)
+        with tempfile.TemporaryDirectory() as tmp:
+            destination = f"{tmp}/image.jpg"
+            with patch.object(upload, "DEFAULT_CHUNK_SIZE", 4096):
+                image_hash = hash_and_spool_upload(upload, destination)
+            with open(destination, "rb") as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(image_hash, calculate_image_hash(data))
+
+
+class PredictionCacheTierTests(TestCase):
+    """Test cases for the local cache tier and single-flight coordination."""
+
+    def setUp(self):
+        cache_utils._local_cache.clear()
+        self.payload = {"detected_count": 7, "weight": 1.0}
+        generation = patch.object(cache_utils, "get_prediction_generation", return_value=0)
+        generation.start()
+        self.addCleanup(generation.stop)
+
+    def tearDown(self):
+        cache_utils._local_cache.clear()
+
+    def test_local_tier_serves_repeat_lookups(self):
+        """Test that a Redis hit is answered locally the next time."""
+        with patch.object(cache_utils, "cache") as mock_cache:
+            mock_cache.get.return_value = self.payload
+            first = cache_utils.get_cached_prediction("h1", "mandalina")
+            second = cache_utils.get_cached_prediction("h1", "mandalina")
+        self.assertEqual(first, self.payload)
+        self.assertEqual(second, self.payload)
+        self.assertEqual(mock_cache.get.call_count, 1)
+
+    def test_local_tier_evicts_least_recently_used(self):
+        """Test that the local tier keeps at most max_entries keys."""
+        local = cache_utils.LocalPredictionCache(max_entries=2, ttl=60)
+        local.set("a", {"v": 1})
+        local.set("b", {"v": 2})
+        local.get("a")
+        local.set("c", {"v": 3})
+        self.assertIsNone(local.get("b"))
+        self.assertEqual(local.get("a"), {"v": 1})
+
+    def test_single_flight_leader_computes(self):
+        """Test that the lock holder gets None and releases the lock."""
+        with patch.object(cache_utils, "cache") as mock_cache:
+            mock_cache.get.return_value = None
+            mock_cache.add.return_value = True
+            with cache_utils.prediction_single_flight("h2", "elma") as cached:
+                self.assertIsNone(cached)
+            mock_cache.add.assert_called_once()
+
+    def test_single_flight_follower_receives_result(self):
+        """Test that a follower waits for the holder's result instead of computing."""
+        before = cache_utils.get_prediction_counters()["coalesced"]
+        with patch.object(cache_utils, "cache") as mock_cache, patch.object(
+            cache_utils.time, "sleep"
+        ):
+            mock_cache.add.return_value = False
+            # Initial lookup misses, then the other worker publishes the result
+            mock_cache.get.side_effect = [None, self.payload]
+            with cache_utils.prediction_single_flight("h3", "armut") as cached:
+                self.assertEqual(cached, self.payload)
+        after = cache_utils.get_prediction_counters()["coalesced"]
+        self.assertEqual(after, before + 1)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PREDICTION_GENERATION_TTL=0,
+)
+class PredictionCacheKeyTests(TestCase):
+    """Test cases for generation- and model-versioned prediction cache keys."""
+
+    def setUp(self):
+        cache_utils._generations.clear()
+
+    def test_bumping_generation_orphans_existing_keys(self):
+        """Test that bulk invalidation changes the key instead of deleting."""
+        cache_utils.set_cached_prediction("h4", "elma", {"detected_count": 3})
+        old_key = cache_utils.get_prediction_cache_key("h4", "elma")
+
+        self.assertEqual(cache_utils.invalidate_all_predictions("elma"), 1)
+
+        self.assertNotEqual(cache_utils.get_prediction_cache_key("h4", "elma"), old_key)
+        self.assertIsNone(cache_utils.get_cached_prediction("h4", "elma"))
+
+    def test_other_fruit_types_keep_their_keys(self):
+        """Test that a fruit-specific invalidation leaves other fruit types alone."""
+        key = cache_utils.get_prediction_cache_key("h5", "armut")
+        cache_utils.invalidate_all_predictions("elma")
+        self.assertEqual(cache_utils.get_prediction_cache_key("h5", "armut"), key)
+
+    def test_new_weights_change_the_key(self):
+        """Test that replacing the weights file yields a different key."""
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = f"{tmp}/elma.pt"
+            paths = {"elma": weights}
+            with open(weights, "wb") as f:
+                f.write(b"v1")
+            with patch.dict("detection.constants.FRUIT_MODEL_PATHS", paths):
+                first = cache_utils.get_prediction_cache_key("h6", "elma")
+                with open(weights, "wb") as f:
+                    f.write(b"v2 weights")
+                second = cache_utils.get_prediction_cache_key("h6", "elma")
+        self.assertNotEqual(first, second)
+
+
+class PredictionCacheStatisticsTests(TestCase):
+    """Test cases for the per-fruit prediction cache counters."""
+
+    def setUp(self):
+        cache_utils._stats_pending.clear()
+        cache_utils._stats_images.clear()
+
+    @patch("django_redis.get_redis_connection")
+    def test_flush_writes_buffered_counters(self, mock_connection):
+        """Test that buffered deltas are written in one pipeline."""
+        pipe = mock_connection.return_value.pipeline.return_value
+        with patch.object(cache_utils, "_stats_flushed_at", float("inf")):
+            cache_utils._record_stat("elma", "hits", image_hash="h7")
+            cache_utils._record_stat("elma", "hits", image_hash="h7")
+            cache_utils._record_stat("elma", "misses", image_hash="h8")
+            pipe.hincrby.assert_not_called()
+
+            cache_utils.flush_prediction_stats()
+
+        fields = {c.args[1]: c.args[2] for c in pipe.hincrby.call_args_list}
+        self.assertEqual(fields, {"elma:hits": 2, "elma:misses": 1})
+        self.assertCountEqual(pipe.pfadd.call_args.args[1:], ["h7", "h8"])
+        pipe.execute.assert_called_once()
+
+    def test_celery_workers_flush_after_each_task_and_on_shutdown(self):
+        """Test that buffered statistics are not lost when a worker child is recycled."""
+        from celery.signals import task_postrun, worker_process_shutdown
+
+        import yolowebapp2.celery  # noqa: F401  (connects the signal handlers)
+
+        with patch.object(cache_utils, "flush_prediction_stats") as mock_flush:
+            task_postrun.send(sender=None, task_id="t1", task=None)
+            worker_process_shutdown.send(sender=None, pid=1, exitcode=0)
+        self.assertEqual(mock_flush.call_count, 2)
+
+    @patch("django_redis.get_redis_connection")
+    def test_statistics_aggregate_counters(self, mock_connection):
+        """Test that statistics are built from the counters, not a keyspace scan."""
+        redis_conn = mock_connection.return_value
+        redis_conn.info.return_value = {}
+        pipe = redis_conn.pipeline.return_value
+        fruit_types = list(FRUIT_MODEL_FILES)
+        pipe.execute.return_value = [
+            {b"elma:hits": b"3", b"elma:misses": b"1", b"elma:sets": b"1"}
+        ] + [2 if f == "elma" else 0 for f in fruit_types]
+
+        stats = cache_utils.get_cache_statistics()
+
+        elma = stats["fruit_types"]["elma"]
+        self.assertEqual((elma["hits"], elma["misses"], elma["unique_images"]), (3, 1, 2))
+        self.assertEqual(elma["hit_rate_percent"], 75.0)
+        self.assertEqual(stats["hits"], 3)
+        redis_conn.scan.assert_not_called()
+
+
+class PredictionCacheCodecTests(TestCase):
+    """Test cases for the compact cached prediction encoding."""
+
+    def _payload(self, boxes):
+        rng = random.Random(0)
+        return {
+            "detected_count": boxes,
+            "weight_per_fruit": 0.125,
+            "confidence_score": 0.8734,
+            "image_path": "detected/abc/image.jpg",
+            "fruit_type": "mandalina",
+            "image_hash": "f" * 64,
+            "bbox_coordinates": [
+                {"x": rng.randint(0, 4000), "y": rng.randint(0, 3000)}
+                for _ in range(boxes)
+            ],
+        }
+
+    def test_round_trip_is_lossless(self):
+        """Test that decoding returns exactly the encoded payload."""
+        for boxes in (0, 1, 2000):
+            payload = self._payload(boxes)
+            encoded = cache_codec.encode_prediction(payload)
+            self.assertEqual(cache_codec.decode_prediction(encoded), payload)
+
+    def test_missing_boxes_round_trip(self):
+        """Test payloads whose bbox_coordinates is None."""
+        payload = dict(self._payload(0), bbox_coordinates=None)
+        encoded = cache_codec.encode_prediction(payload)
+        self.assertEqual(cache_codec.decode_prediction(encoded), payload)
+
+    def test_encoding_is_smaller_than_pickle(self):
+        """Test that dense payloads shrink well below their pickled size."""
+        payload = self._payload(2000)
+        encoded = cache_codec.encode_prediction(payload)
+        pickled = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+        self.assertLess(len(encoded) * 3, len(pickled))
+
+    def test_legacy_dict_entries_pass_through(self):
+        """Test that entries cached before the codec still decode."""
+        payload = self._payload(3)
+        self.assertEqual(cache_codec.decode_prediction(payload), payload)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_cache_stores_encoded_bytes(self):
+        """Test that Redis receives bytes and readers get the original dict."""
+        payload = self._payload(50)
+        cache_utils.set_cached_prediction("h9", "mandalina", payload)
+        key = cache_utils.get_prediction_cache_key("h9", "mandalina")
+        self.assertTrue(cache_codec.is_encoded(cache_utils.cache.get(key)))
+
+        cache_utils._local_cache.clear()
+        self.assertEqual(cache_utils.get_cached_prediction("h9", "mandalina"), payload)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_local_and_redis_tiers_return_the_same_value(self):
+        """Test that the local tier holds the decoded value, not the caller's dict."""
+        payload = dict(self._payload(3), model_input=(640, 640))
+        cache_utils._local_cache.clear()
+        cache_utils.set_cached_prediction("h10", "mandalina", payload)
+        payload["bbox_coordinates"].append({"x": 1, "y": 1})
+
+        local = cache_utils.get_cached_prediction("h10", "mandalina")
+        cache_utils._local_cache.clear()
+        remote = cache_utils.get_cached_prediction("h10", "mandalina")
+        self.assertEqual(local, remote)
+        self.assertEqual(local["model_input"], [640, 640])
+        self.assertEqual(len(local["bbox_coordinates"]), 3)
+
+
+class NearDuplicateCacheTests(TestCase):
+    """Test cases for the perceptual-hash near-duplicate lookup."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        cache_utils._perceptual_hashes.clear()
+
+    def _photo(self, name, seed, size=(640, 480), quality=95):
+        rng = random.Random(seed)
+        img = Image.new("L", (16, 12))
+        img.putdata([rng.randint(0, 255) for _ in range(16 * 12)])
+        img = img.convert("RGB").resize((640, 480), Image.Resampling.BICUBIC)
+        path = f"{self.tmp}/{name}.jpg"
+        img.resize(size).save(path, "JPEG", quality=quality)
+        return path
+
+    def test_recompressed_copy_is_within_threshold(self):
+        """Test that a resized, re-compressed copy keeps almost the same dHash."""
+        original = perceptual_hash.dhash(self._photo("orig", seed=1))
+        copy = perceptual_hash.dhash(self._photo("copy", seed=1, size=(320, 240), quality=40))
+        other = perceptual_hash.dhash(self._photo("other", seed=2))
+
+        self.assertLessEqual(perceptual_hash.hamming_distance(original, copy), 4)
+        self.assertGreater(perceptual_hash.hamming_distance(original, other), 4)
+
+    def test_hashes_within_threshold_share_a_band(self):
+        """Test the pigeonhole guarantee of the LSH bands."""
+        rng = random.Random(0)
+        for _ in range(100):
+            value = rng.getrandbits(64)
+            flipped = value
+            for bit in rng.sample(range(64), 4):
+                flipped ^= 1 << bit
+            self.assertTrue(
+                set(perceptual_hash.bands(value, 4)) & set(perceptual_hash.bands(flipped, 4))
+            )
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        PREDICTION_NEAR_DUPLICATE_MAX_DISTANCE=4,
+    )
+    @patch("django_redis.get_redis_connection")
+    def test_near_duplicate_reuses_earlier_prediction(self, mock_connection):
+        """Test that a near hit returns the earlier result and counts separately."""
+        payload = {"detected_count": 12, "image_hash": "earlier"}
+        cache_utils.set_cached_prediction("earlier", "elma", payload)
+        earlier = perceptual_hash.dhash(self._photo("orig", seed=3))
+        mock_connection.return_value.sunion.return_value = {
+            f"{earlier:016x}:earlier".encode()
+        }
+        before = cache_utils.get_prediction_counters()["near_hits"]
+
+        copy_path = self._photo("copy", seed=3, size=(480, 360), quality=50)
+        self.assertIsNone(cache_utils.get_cached_prediction("copy", "elma"))
+        result = cache_utils.find_near_duplicate("copy", "elma", copy_path)
+
+        alias = {"detected_count": 12, "image_hash": "copy", "near_duplicate_of": "earlier"}
+        self.assertEqual(result, alias)
+        self.assertEqual(cache_utils.get_prediction_counters()["near_hits"], before + 1)
+        # Aliased under the new hash, so the next identical upload is an exact hit
+        self.assertEqual(cache_utils.get_cached_prediction("copy", "elma"), alias)
+
+    @patch("django_redis.get_redis_connection")
+    def test_near_duplicate_lookup_is_off_by_default(self, mock_connection):
+        """Test that without an explicit threshold no other photo's result is reused."""
+        path = self._photo("orig", seed=4)
+        self.assertIsNone(cache_utils.find_near_duplicate("copy", "elma", path))
+        self.assertFalse(cache_utils.index_perceptual_hash("copy", "elma", path))
+        mock_connection.assert_not_called()
+
 
 class DetectionViewTests(TestCase):
     """Test cases for detection web views."""
@@ -10,6 +10,7 @@ from typing import Any, Dict
 
 import magic
 from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import UploadedFile
@@ -18,11 +19,13 @@ from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
 
 from detection.cache_utils import (
-    calculate_image_hash,
+    find_near_duplicate,
     get_cache_statistics,
     get_cached_prediction,
+    hash_and_spool_upload,
     invalidate_all_predictions,
     invalidate_prediction_cache,
+    prediction_single_flight,
     set_cached_prediction,
 )
 from detection.constants import (
@@ -32,6 +35,7 @@ from detection.constants import (
     FRUIT_MODEL_PATHS,
     FRUIT_WEIGHTS,
     MAX_DETECTION_FILE_SIZE,
+    UPLOAD_SPOOL_PREFIX,
 )
 from detection.tasks import process_image_detection
 from yolowebapp2 import hashing, predict_tree
@@ -275,152 +279,146 @@ def index(request: HttpRequest) -> HttpResponse:
 
             safe_filename = sanitize_filename(filename.name or "")
 
-            # Read image data for hashing and caching
-            filename.seek(0)
-            image_data = filename.read()
-            filename.seek(0)
-
-            # Calculate image hash for cache lookup
-            image_hash = calculate_image_hash(image_data)
-
-            # Check cache first
-            cached_result = get_cached_prediction(image_hash, meyve_grubu)
-
-            if cached_result:
-                # Cache HIT - return cached result
-                logger.info(
-                    "Using cached result for %s, hash=%s...",
-                    meyve_grubu,
-                    image_hash[:16],
-                )
-
-                # Adjust for current tree count
-                cached_weight = (
-                    cached_result["weight_per_fruit"] * cached_result["detected_count"]
-                )
-
-                response["count"] = cached_result["detected_count"]
-                response["kilo"] = cached_weight
-                response["toplam_agirlik"] = agac_sayisi_int * cached_weight
-                response["time"] = "0.00"  # Instant from cache
-                response["image"] = cached_result["image_path"]
-                response["confidence"] = f"{cached_result['confidence_score']:.2%}"
-                response["from_cache"] = True
-
-                # Create DetectionResult even for cached results to enable reporting
-                try:
-                    model_path = FRUIT_MODELS[meyve_grubu]
-                    detection_instance = DetectionResult.objects.create(
-                        fruit_type=meyve_grubu,
-                        tree_count=agac_sayisi_int,
-                        tree_age=agac_yasi_int,
-                        detected_count=cached_result["detected_count"],
-                        weight=response["kilo"],
-                        total_weight=response["toplam_agirlik"],
-                        processing_time=0.0,
-                        confidence_score=cached_result["confidence_score"],
-                        model_version=Path(model_path).name,
-                        threshold_used=DETECTION_CONFIDENCE_THRESHOLD,
-                        image_path=cached_result["image_path"],
-                        bbox_coordinates=cached_result.get("bbox_coordinates"),
-                        created_by=request.user,
-                    )
-                    response["detection_id"] = detection_instance.pk
-                except Exception as e:
-                    logger.error("Cache detection save error: %s", e)
-            else:
-                # Cache MISS - run prediction
-                temp_dir = Path(tempfile.gettempdir())
-                tmp_path = (temp_dir / safe_filename).resolve()
-
-                # Security: Verify path is within temp directory
-                if not str(tmp_path).startswith(str(temp_dir.resolve())):
-                    logger.warning("Path traversal attempt detected: %s", tmp_path)
-                    raise ValidationError("Geçersiz dosya yolu")
-
-                # Write uploaded file to temp directory
-                try:
-                    with open(tmp_path, "wb") as tmp:
-                        tmp.write(image_data)
-                except Exception as e:
-                    logger.error("Geçici dosya yazma hatası: %s: %s", tmp_path, e)
-                    raise ValidationError("Dosya yüklenirken hata oluştu")
-
-                start_time = time.time()
+            # Hash while spooling to disk, in one pass over the upload chunks
+            spool_dir = Path(tempfile.mkdtemp(prefix=UPLOAD_SPOOL_PREFIX))
+            tmp_path = spool_dir / safe_filename
+            try:
+                image_hash = hash_and_spool_upload(filename, tmp_path)
+            except OSError as e:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+                logger.error("Geçici dosya yazma hatası: %s: %s", tmp_path, e)
+                raise ValidationError("Dosya yüklenirken hata oluştu")
 
-                try:
-                    model_path = FRUIT_MODELS[meyve_grubu]
-                    conf_thres = DETECTION_CONFIDENCE_THRESHOLD
-                    detec, unique_id, confidence_score, bbox_centers = (
-                        predict_tree.predict(
-                            path_to_weights=model_path,
-                            path_to_source=str(tmp_path),
-                            return_boxes=True,
+            try:
+                # Check cache first; concurrent uploads of the same image wait
+                # for the one request that runs the model
+                with prediction_single_flight(
+                    image_hash, meyve_grubu, image_path=str(tmp_path)
+                ) as cached_result:
+                    if cached_result:
+                        # Cache HIT - return cached result (possibly computed
+                        # for a near-duplicate of this upload)
+                        logger.info(
+                            "Using cached result for %s, hash=%s...",
+                            meyve_grubu,
+                            image_hash[:16],
                         )
-                    )
-                    count = extract_detection_count(detec)
-                    weight_per_fruit = FRUIT_WEIGHTS[meyve_grubu]
-                    processing_time = time.time() - start_time
-
-                    response["count"] = count
-                    response["kilo"] = count * weight_per_fruit
-                    response["toplam_agirlik"] = agac_sayisi_int * response["kilo"]
-                    response["time"] = f"{processing_time:.2f}"
-                    response["image"] = f"detected/{unique_id}/{safe_filename}"
-                    response["confidence"] = f"{confidence_score:.2%}"
-                    response["from_cache"] = False
-
-                    # Cache the prediction result
-                    cache_data = {
-                        "detected_count": count,
-                        "weight_per_fruit": weight_per_fruit,
-                        "confidence_score": confidence_score,
-                        "image_path": f"detected/{unique_id}/{safe_filename}",
-                        "fruit_type": meyve_grubu,
-                        "image_hash": image_hash,
-                        "bbox_coordinates": bbox_centers,
-                    }
-                    set_cached_prediction(image_hash, meyve_grubu, cache_data)
 
-                    # Save detection result to database
-                    try:
-                        detection_instance = DetectionResult.objects.create(
-                            fruit_type=meyve_grubu,
-                            tree_count=agac_sayisi_int,
-                            tree_age=agac_yasi_int,
-                            detected_count=count,
-                            weight=response["kilo"],
-                            total_weight=response["toplam_agirlik"],
-                            processing_time=processing_time,
-                            confidence_score=confidence_score,
-                            model_version=Path(model_path).name,
-                            threshold_used=conf_thres,
-                            image_path=f"detected/{unique_id}/{safe_filename}",
-                            bbox_coordinates=bbox_centers,
-                            created_by=request.user,
+                        # Adjust for current tree count
+                        cached_weight = (
+                            cached_result["weight_per_fruit"] * cached_result["detected_count"]
                         )
-                        logger.info(
-                            f"Detection result saved: {meyve_grubu}, count={count}, confidence={confidence_score:.3f}"
+
+                        response["count"] = cached_result["detected_count"]
+                        response["kilo"] = cached_weight
+                        response["toplam_agirlik"] = agac_sayisi_int * cached_weight
+                        response["time"] = "0.00"  # Instant from cache
+                        response["image"] = cached_result["image_path"]
+                        response["confidence"] = f"{cached_result['confidence_score']:.2%}"
+                        response["from_cache"] = True
+                        response["near_duplicate"] = bool(
+                            cached_result.get("near_duplicate_of")
                         )
-                        # Add detection_id to response context for report generation
-                        response["detection_id"] = detection_instance.pk
-                    except Exception as db_error:
-                        logger.error("Veritabanı kaydetme hatası: %s", db_error)
-                        # Don't fail the request if DB save fails, just log it
-
-                except (FileNotFoundError, RuntimeError, ValueError, IOError) as e:
-                    logger.error("Model algılama hatası: %s", e)
-                    # Don't expose internal error details to users
-                    raise ValidationError(
-                        "Algılama işlemi başarısız oldu. Lütfen tekrar deneyin."
-                    )
-                finally:
-                    # Clean up temp file
-                    try:
-                        if tmp_path.exists():
-                            tmp_path.unlink()
-                    except Exception as e:
-                        logger.error("Geçici dosya silme hatası: %s: %s", tmp_path, e)
+
+                        # Create DetectionResult even for cached results to enable reporting
+                        try:
+                            model_path = FRUIT_MODELS[meyve_grubu]
+                            detection_instance = DetectionResult.objects.create(
+                                fruit_type=meyve_grubu,
+                                tree_count=agac_sayisi_int,
+                                tree_age=agac_yasi_int,
+                                detected_count=cached_result["detected_count"],
+                                weight=response["kilo"],
+                                total_weight=response["toplam_agirlik"],
+                                processing_time=0.0,
+                                confidence_score=cached_result["confidence_score"],
+                                model_version=Path(model_path).name,
+                                threshold_used=DETECTION_CONFIDENCE_THRESHOLD,
+                                image_path=cached_result["image_path"],
+                                bbox_coordinates=cached_result.get("bbox_coordinates"),
+                                created_by=request.user,
+                            )
+                            response["detection_id"] = detection_instance.pk
+                        except Exception as e:
+                            logger.error("Cache detection save error: %s", e)
+                    else:
+                        # Cache MISS - run prediction on the spooled upload
+                        start_time = time.time()
+                        stage_timings: Dict[str, float] = {}
+
+                        try:
+                            model_path = FRUIT_MODELS[meyve_grubu]
+                            conf_thres = DETECTION_CONFIDENCE_THRESHOLD
+                            detec, unique_id, confidence_score, bbox_centers = (
+                                predict_tree.predict(
+                                    path_to_weights=model_path,
+                                    path_to_source=str(tmp_path),
+                                    return_boxes=True,
+                                    timings=stage_timings,
+                                )
+                            )
+                            count = extract_detection_count(detec)
+                            weight_per_fruit = FRUIT_WEIGHTS[meyve_grubu]
+                            processing_time = time.time() - start_time
+
+                            response["count"] = count
+                            response["kilo"] = count * weight_per_fruit
+                            response["toplam_agirlik"] = agac_sayisi_int * response["kilo"]
+                            response["time"] = f"{processing_time:.2f}"
+                            response["image"] = f"detected/{unique_id}/{safe_filename}"
+                            response["confidence"] = f"{confidence_score:.2%}"
+                            response["from_cache"] = False
+
+                            # Cache the prediction result
+                            cache_data = {
+                                "detected_count": count,
+                                "weight_per_fruit": weight_per_fruit,
+                                "confidence_score": confidence_score,
+                                "image_path": f"detected/{unique_id}/{safe_filename}",
+                                "fruit_type": meyve_grubu,
+                                "image_hash": image_hash,
+                                "bbox_coordinates": bbox_centers,
+                            }
+                            set_cached_prediction(
+                                image_hash, meyve_grubu, cache_data, image_path=str(tmp_path)
+                            )
+
+                            # Save detection result to database
+                            try:
+                                detection_instance = DetectionResult.objects.create(
+                                    fruit_type=meyve_grubu,
+                                    tree_count=agac_sayisi_int,
+                                    tree_age=agac_yasi_int,
+                                    detected_count=count,
+                                    weight=response["kilo"],
+                                    total_weight=response["toplam_agirlik"],
+                                    processing_time=processing_time,
+                                    stage_timings=stage_timings or None,
+                                    confidence_score=confidence_score,
+                                    model_version=Path(model_path).name,
+                                    threshold_used=conf_thres,
+                                    image_path=f"detected/{unique_id}/{safe_filename}",
+                                    bbox_coordinates=bbox_centers,
+                                    created_by=request.user,
+                                )
+                                logger.info(
+                                    f"Detection result saved: {meyve_grubu}, count={count}, confidence={confidence_score:.3f}"
+                                )
+                                # Add detection_id to response context for report generation
+                                response["detection_id"] = detection_instance.pk
+                            except Exception as db_error:
+                                logger.error("Veritabanı kaydetme hatası: %s", db_error)
+                                # Don't fail the request if DB save fails, just log it
+
+                        except (FileNotFoundError, RuntimeError, ValueError, IOError) as e:
+                            logger.error("Model algılama hatası: %s", e)
+                            # Don't expose internal error details to users
+                            raise ValidationError(
+                                "Algılama işlemi başarısız oldu. Lütfen tekrar deneyin."
+                            )
+            finally:
+                # Clean up the spooled upload
+                shutil.rmtree(spool_dir, ignore_errors=True)
 
         except ValidationError as e:
             return render(request, "main.html", {"error": str(e)})
@@ -774,18 +772,24 @@ def async_detection(request: HttpRequest) -> JsonResponse:
         # Sanitize filename
         safe_filename = sanitize_filename(filename.name or "")
 
-        # Read image data for hashing and caching
-        filename.seek(0)
-        image_data = filename.read()
-        filename.seek(0)
-
-        # Calculate image hash for cache lookup
-        image_hash = calculate_image_hash(image_data)
+        # Hash while spooling to disk, in one pass over the upload chunks
+        spool_dir = Path(tempfile.mkdtemp(prefix=UPLOAD_SPOOL_PREFIX))
+        tmp_path = spool_dir / safe_filename
+        try:
+            image_hash = hash_and_spool_upload(filename, tmp_path)
+        except OSError as e:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            logger.error("Geçici dosya yazma hatası: %s: %s", tmp_path, e)
+            return JsonResponse({"error": "Dosya yüklenirken hata oluştu"}, status=500)
 
-        # Check cache first
-        cached_result = get_cached_prediction(image_hash, meyve_grubu)
+        # Check cache first, then for a near-duplicate of an earlier upload
+        cached_result = get_cached_prediction(
+            image_hash, meyve_grubu
+        ) or find_near_duplicate(image_hash, meyve_grubu, str(tmp_path))
 
         if cached_result:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
             # Cache HIT - return cached result immediately
             logger.info(
                 "Async endpoint: Using cached result for %s, hash=%s...",
@@ -804,6 +808,7 @@ def async_detection(request: HttpRequest) -> JsonResponse:
                     "status": "SUCCESS",
                     "message": "Önbellekten döndürüldü",
                     "from_cache": True,
+                    "near_duplicate": bool(cached_result.get("near_duplicate_of")),
                     "result": {
                         "detected_count": cached_result["detected_count"],
                         "weight": cached_weight,
@@ -816,30 +821,19 @@ def async_detection(request: HttpRequest) -> JsonResponse:
                 status=200,
             )
 
-        # Cache MISS - save to temp directory and queue async task
-        temp_dir = Path(tempfile.gettempdir())
-        tmp_path = (temp_dir / safe_filename).resolve()
-
-        # Security: Verify path is within temp directory
-        if not str(tmp_path).startswith(str(temp_dir.resolve())):
-            logger.warning("Path traversal attempt detected: %s", tmp_path)
-            return JsonResponse({"error": "Geçersiz dosya yolu"}, status=400)
-
+        # Cache MISS - queue async task on the spooled upload; the task
+        # removes the spool directory when done
         try:
-            with open(tmp_path, "wb") as tmp:
-                tmp.write(image_data)
-
             # Re-validate MIME type after writing to disk for security
             actual_mime = magic.from_file(str(tmp_path), mime=True)
             if actual_mime not in DETECTION_ALLOWED_MIME_TYPES:
-                tmp_path.unlink()
+                shutil.rmtree(spool_dir, ignore_errors=True)
                 logger.warning("MIME type mismatch after upload: %s", actual_mime)
                 return JsonResponse({"error": "Geçersiz dosya formatı"}, status=400)
 
         except Exception as e:
-            logger.error("Geçici dosya yazma hatası: %s: %s", tmp_path, e)
-            if tmp_path.exists():
-                tmp_path.unlink()
+            logger.error("Geçici dosya doğrulama hatası: %s: %s", tmp_path, e)
+            shutil.rmtree(spool_dir, ignore_errors=True)
             return JsonResponse({"error": "Dosya yüklenirken hata oluştu"}, status=500)
 
         # Queue async task
@@ -849,6 +843,7 @@ def async_detection(request: HttpRequest) -> JsonResponse:
             tree_count=agac_sayisi_int,
             tree_age=agac_yasi_int,
             user_id=request.user.pk if request.user.is_authenticated else None,
+            image_hash=image_hash,
         )
 
         logger.info("Async detection task queued: %s for %s", task.id, meyve_grubu)
@@ -981,7 +976,7 @@ def cache_invalidate(request: HttpRequest) -> JsonResponse:
         if invalidate_all:
             # Invalidate all predictions (optionally filtered by fruit_type)
             deleted_count = invalidate_all_predictions(fruit_type=fruit_type)
-            message = f"{deleted_count} önbellek anahtarı silindi"
+            message = f"{deleted_count} meyve türünün önbelleği geçersiz kılındı"
             if fruit_type:
                 message += f" ({fruit_type} için)"
 
@@ -1028,20 +1023,35 @@ def cache_invalidate(request: HttpRequest) -> JsonResponse:
 @require_http_methods(["GET"])
 def cache_statistics(request: HttpRequest) -> JsonResponse:
     """
-    Get cache statistics including hit/miss rates and memory usage.
+    Get prediction cache statistics per fruit type.
+
+    Query Parameters:
+        - days: (optional) Number of days to aggregate, ending today (default 1)
 
     Returns:
         JSON: {
             'redis_available': bool,
-            'prediction_keys_count': int,
-            'prediction_memory_mb': float,
-            'keyspace_hits': int,
-            'keyspace_misses': int,
+            'days': int,
+            'fruit_types': {
+                '<fruit>': {
+                    'hits': int,
+                    'misses': int,
+                    'sets': int,
+                    'bytes_written': int,
+                    'unique_images': int,
+                    'hit_rate_percent': float
+                }
+            },
+            'hits': int,
+            'misses': int,
+            'sets': int,
+            'bytes_written': int,
             'hit_rate_percent': float,
             'total_memory_used_mb': float,
             'total_memory_peak_mb': float,
             'connected_clients': int,
-            'uptime_seconds': int
+            'uptime_seconds': int,
+            'prediction_requests': dict
         }
     """
     if not request.user.is_staff:
@@ -1050,10 +1060,19 @@ def cache_statistics(request: HttpRequest) -> JsonResponse:
             status=403,
         )
 
+    try:
+        days = int(request.GET.get("days", 1))
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "error": "Geçersiz gün sayısı"}, status=400
+        )
+    retention = getattr(settings, "PREDICTION_STATS_RETENTION_DAYS", 30)
+    days = min(max(days, 1), retention)
+
     try:
         from detection.cache_utils import get_cache_statistics
 
-        stats = get_cache_statistics()
+        stats = get_cache_statistics(days=days)
 
         return JsonResponse(stats)
 
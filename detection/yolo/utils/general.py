@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 
+import contextlib
 import glob
 import logging
 import math
@@ -788,6 +789,20 @@ def box_diou(box1, box2, eps: float = 1e-7):
     return iou - (centers_distance_squared / diagonal_distance_squared)
 
 
+def _rank_within_image(img_idx, order):
+    """Rank of each element of ``order`` among those of the same image.
+
+    ``order`` must already be sorted by descending score; the result is
+    aligned with the image-grouped permutation that is returned alongside.
+    """
+    grouped = order[torch.sort(img_idx[order], stable=True)[1]]
+    img_sorted = img_idx[grouped]
+    counts = torch.bincount(img_sorted)
+    starts = torch.cumsum(counts, 0) - counts
+    rank = torch.arange(len(grouped), device=grouped.device) - starts[img_sorted]
+    return grouped, rank
+
+
 def non_max_suppression(
     prediction,
     conf_thres=0.25,
@@ -796,12 +811,106 @@ def non_max_suppression(
     agnostic=False,
     multi_label=False,
     labels=(),
+    timer=None,
+    max_det=300,
+    max_nms=30000,
 ):
     """Runs Non-Maximum Suppression (NMS) on inference results
 
+    The whole batch is handled at once: candidates are confidence-filtered
+    in one pass, capped to the ``max_nms`` best per image, and suppressed by a
+    single ``torchvision.ops.batched_nms`` whose group index combines image
+    and class. Appended ``labels`` fall back to the per-image implementation.
+
+    ``timer`` is an optional stage timer (``yolowebapp2.metrics``); the
+    candidate filtering and the NMS kernel are recorded as ``nms_filter`` and
+    ``nms``.
+
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
+    if labels and any(len(l) for l in labels):
+        return _non_max_suppression_per_image(
+            prediction, conf_thres, iou_thres, classes, agnostic, multi_label, labels
+        )
+
+    def stage(name):
+        return timer.stage(name) if timer is not None else contextlib.nullcontext()
+
+    bs = prediction.shape[0]
+    nc = prediction.shape[2] - 5
+    multi_label &= nc > 1
+    device = prediction.device
+
+    with stage("nms_filter"):
+        img_idx, anchor_idx = (prediction[..., 4] > conf_thres).nonzero(as_tuple=True)
+        x = prediction[img_idx, anchor_idx]
+
+        if nc == 1:
+            cls_conf = x[:, 4:5]
+        else:
+            cls_conf = x[:, 5:] * x[:, 4:5]
+
+        box = xywh2xyxy(x[:, :4])
+
+        if multi_label:
+            i, j = (cls_conf > conf_thres).nonzero(as_tuple=True)
+            box, scores, cls, img_idx = box[i], cls_conf[i, j], j, img_idx[i]
+        else:
+            scores, cls = cls_conf.max(1)
+            keep = scores > conf_thres
+            box, scores, cls, img_idx = box[keep], scores[keep], cls[keep], img_idx[keep]
+
+        if classes is not None:
+            keep = torch.isin(cls, torch.as_tensor(classes, device=device))
+            box, scores, cls, img_idx = box[keep], scores[keep], cls[keep], img_idx[keep]
+
+        if len(scores) > max_nms:
+            grouped, rank = _rank_within_image(
+                img_idx, scores.argsort(descending=True)
+            )
+            top = grouped[rank < max_nms]
+            box, scores, cls, img_idx = box[top], scores[top], cls[top], img_idx[top]
+
+    output = [torch.zeros((0, 6), device=device)] * bs
+    if not len(scores):
+        return output
+
+    with stage("nms"):
+        groups = img_idx if agnostic else img_idx * max(nc, 1) + cls
+        keep = torchvision.ops.batched_nms(box.float(), scores.float(), groups, iou_thres)
+
+    # batched_nms returns indices by descending score; regroup per image
+    keep, rank = _rank_within_image(img_idx, keep)
+    keep = keep[rank < max_det]
+    det = torch.cat((box[keep], scores[keep, None], cls[keep, None].to(box.dtype)), 1)
+
+    counts = torch.bincount(img_idx[keep], minlength=bs).tolist()
+    for xi, d in enumerate(det.split(counts)):
+        if len(d):
+            output[xi] = d
+    return output
+
+
+def _non_max_suppression_per_image(
+    prediction,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    classes=None,
+    agnostic=False,
+    multi_label=False,
+    labels=(),
+    timer=None,
+):
+    """Per-image reference NMS, kept for appended ``labels`` (autolabelling)
+    and as the parity baseline for the batched :func:`non_max_suppression`.
+
+    Returns:
+         list of detections, on (n,6) tensor per image [xyxy, conf, cls]
+    """
+
+    def stage(name):
+        return timer.stage(name) if timer is not None else contextlib.nullcontext()
 
     nc = prediction.shape[2] - 5
     xc = prediction[..., 4] > conf_thres
@@ -818,36 +927,37 @@ def non_max_suppression(
     output = [torch.zeros((0, 6), device=prediction.device)] * prediction.shape[0]
     for xi, x in enumerate(prediction):
 
-        x = x[xc[xi]]
+        with stage("nms_filter"):
+            x = x[xc[xi]]
 
-        if labels and len(labels[xi]):
-            l = labels[xi]
-            v = torch.zeros((len(l), nc + 5), device=x.device)
-            v[:, :4] = l[:, 1:5]
-            v[:, 4] = 1.0
-            v[range(len(l)), l[:, 0].long() + 5] = 1.0
-            x = torch.cat((x, v), 0)
+            if labels and len(labels[xi]):
+                l = labels[xi]
+                v = torch.zeros((len(l), nc + 5), device=x.device)
+                v[:, :4] = l[:, 1:5]
+                v[:, 4] = 1.0
+                v[range(len(l)), l[:, 0].long() + 5] = 1.0
+                x = torch.cat((x, v), 0)
 
-        if not x.shape[0]:
-            continue
-
-        if nc == 1:
-            x[:, 5:] = x[:, 4:5]
+            if x.shape[0]:
+                if nc == 1:
+                    x[:, 5:] = x[:, 4:5]
 
-        else:
-            x[:, 5:] *= x[:, 4:5]
+                else:
+                    x[:, 5:] *= x[:, 4:5]
 
-        box = xywh2xyxy(x[:, :4])
+                box = xywh2xyxy(x[:, :4])
 
-        if multi_label:
-            i, j = (x[:, 5:] > conf_thres).nonzero(as_tuple=False).T
-            x = torch.cat((box[i], x[i, j + 5, None], j[:, None].float()), 1)
-        else:
-            conf, j = x[:, 5:].max(1, keepdim=True)
-            x = torch.cat((box, conf, j.float()), 1)[conf.view(-1) > conf_thres]
+                if multi_label:
+                    i, j = (x[:, 5:] > conf_thres).nonzero(as_tuple=False).T
+                    x = torch.cat((box[i], x[i, j + 5, None], j[:, None].float()), 1)
+                else:
+                    conf, j = x[:, 5:].max(1, keepdim=True)
+                    x = torch.cat((box, conf, j.float()), 1)[
+                        conf.view(-1) > conf_thres
+                    ]
 
-        if classes is not None:
-            x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
+                if classes is not None:
+                    x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
 
         n = x.shape[0]
         if not n:
@@ -857,7 +967,8 @@ def non_max_suppression(
 
         c = x[:, 5:6] * (0 if agnostic else max_wh)
         boxes, scores = x[:, :4] + c, x[:, 4]
-        i = torchvision.ops.nms(boxes, scores, iou_thres)
+        with stage("nms"):
+            i = torchvision.ops.nms(boxes, scores, iou_thres)
         if i.shape[0] > max_det:
             i = i[:max_det]
         if merge and (1 < n < 3e3):
@@ -436,7 +436,9 @@ def revert_sync_batchnorm(module):
 
 class TracedModel(nn.Module):
 
-    def __init__(self, model=None, device=None, img_size=(640, 640)):
+    def __init__(
+        self, model=None, device=None, img_size=(640, 640), save_path="traced_model.pt"
+    ):
         super(TracedModel, self).__init__()
 
         print(" Convert model to Traced-model... ")
@@ -454,8 +456,9 @@ class TracedModel(nn.Module):
         rand_example = torch.rand(1, 3, img_size, img_size)
 
         traced_script_module = torch.jit.trace(self.model, rand_example, strict=False)
-        traced_script_module.save("traced_model.pt")
-        print(" traced_script_module saved! ")
+        if save_path:
+            traced_script_module.save(save_path)
+            print(" traced_script_module saved! ")
         self.model = traced_script_module
         self.model.to(device)
         self.detect_layer.to(device)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent per-project cache of orthophoto analysis artifacts.
+
+The density, stress-zones, decisions, yield and full-analysis endpoints all
+derive their answers from the same few expensive intermediates: the tree
+detections of a full-orthophoto YOLO pass, the stress zones of the NDVI
+raster and the average NDVI. Each is stored once as JSON under
+``ANALYSIS_CACHE_DIR/<hashing_path>/`` and reused by every endpoint.
+
+File names start with a fingerprint of the orthophoto (size and mtime), so
+when ODM writes a new orthophoto every earlier entry stops matching and is
+pruned on the next write. The rest of the name is a digest of the artifact
+kind and everything else it depends on (model fingerprint, thresholds, ...).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, TypeVar
+
+from django.conf import settings
+
+from yolowebapp2.raster_store import source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _cache_root() -> Path:
+    return Path(
+        getattr(
+            settings,
+            "ANALYSIS_CACHE_DIR",
+            Path(settings.BASE_DIR) / "cache" / "analysis",
+        )
+    )
+
+
+def orthophoto_fingerprint(raster_path: str | Path) -> str:
+    """Fingerprint of a raster that changes whenever it is rewritten."""
+    return source_fingerprint(raster_path)
+
+
+def _entry_name(ortho_fp: str, kind: str, params: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(
+        json.dumps([kind, params], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{ortho_fp}-{kind}-{digest}.json"
+
+
+def _prune_stale(project_dir: Path, ortho_fp: str) -> None:
+    """Remove entries computed from an earlier orthophoto."""
+    for path in project_dir.glob("*.json"):
+        if not path.name.startswith(f"{ortho_fp}-"):
+            path.unlink(missing_ok=True)
+
+
+def _atomic_write_json(path: Path, value: Any) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def artifact_version(raster_path: str | Path, kind: str, params: Dict[str, Any]) -> str:
+    """
+    Identifier that changes whenever the artifact would be recomputed.
+
+    Raises:
+        OSError: If the orthophoto cannot be read
+    """
+    return _entry_name(orthophoto_fingerprint(raster_path), kind, params)[: -len(".json")]
+
+
+def get_or_compute(
+    project_key: str,
+    raster_path: str | Path,
+    kind: str,
+    params: Dict[str, Any],
+    compute: Callable[[], T],
+) -> T:
+    """
+    Return the cached artifact, computing and storing it on a miss.
+
+    Args:
+        project_key: Project ``hashing_path``
+        raster_path: Orthophoto the artifact is derived from
+        kind: Artifact name, e.g. ``"tree_centers"``
+        params: Everything else the artifact depends on; must be JSON-serializable
+        compute: Produces the artifact; its result must be JSON-serializable
+
+    Returns:
+        The artifact. Exceptions from ``compute`` propagate and nothing is stored.
+    """
+    if not project_key or not getattr(settings, "ANALYSIS_CACHE_ENABLED", True):
+        return compute()
+
+    try:
+        ortho_fp = orthophoto_fingerprint(raster_path)
+    except OSError:
+        # No readable orthophoto to key on; let compute() report the problem
+        return compute()
+
+    project_dir = _cache_root() / project_key
+    entry = project_dir / _entry_name(ortho_fp, kind, params)
+
+    try:
+        with open(entry, encoding="utf-8") as f:
+            value = json.load(f)
+        logger.info("Analiz önbelleği isabeti: %s (%s)", kind, project_key)
+        return value
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning("Analiz önbelleği okunamadı %s: %s", entry, e)
+
+    value = compute()
+
+    try:
+        project_dir.mkdir(parents=True, exist_ok=True)
+        _prune_stale(project_dir, ortho_fp)
+        _atomic_write_json(entry, value)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning("Analiz önbelleğe yazılamadı %s: %s", entry, e)
+    return value
+
+
+def invalidate_project(project_key: str) -> None:
+    """Drop every cached artifact of a project."""
+    if not project_key:
+        return
+    shutil.rmtree(_cache_root() / project_key, ignore_errors=True)
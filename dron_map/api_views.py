@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
+import functools
 import logging
+import os
 from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
 from pathlib import Path
-from typing import Dict, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import rasterio
+from django.conf import settings
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, viewsets
@@ -21,6 +25,8 @@ from spatial_analysis.config import (
     YIELD_MODEL_VERSION,
 )
 from analysis_logger.service import log_full_analysis
+from detection.cache_utils import get_model_fingerprint
+from . import analysis_cache
 from .models import Projects
 from .serializers import ProjectSerializer, ProjectSummarySerializer
 from .views import get_statistics
@@ -30,21 +36,14 @@ from spatial_analysis.stress_zones import generate_stress_zones
 from decision_engine.service import generate_recommendations
 from yield_prediction.service import predict_yield
 from yolowebapp2.histogram import algos
-from yolowebapp2 import predict_tree
+from yolowebapp2 import predict_tree, raster_io
+from yolowebapp2.conditional import add_validators, make_etag, not_modified
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 logger = logging.getLogger(__name__)
 
 
-def _iter_windows(width: int, height: int, tile_size: int = 1024):
-    for row_off in range(0, height, tile_size):
-        win_h = min(tile_size, height - row_off)
-        for col_off in range(0, width, tile_size):
-            win_w = min(tile_size, width - col_off)
-            yield rasterio.windows.Window(col_off, row_off, win_w, win_h)
-
-
 def _compute_average_ndvi(raster_path: str) -> float:
     path = Path(raster_path)
     if not path.exists():
@@ -54,12 +53,8 @@ def _compute_average_ndvi(raster_path: str) -> float:
     count = 0
 
     with rasterio.open(path) as src:
-        height = src.height
-        width = src.width
-
-        for window in _iter_windows(width, height):
-            red = src.read(1, window=window).astype("float32")
-            nir = src.read(4, window=window).astype("float32")
+        for _, bands in raster_io.iter_windows(src, [1, 4]):
+            red, nir = bands
             ndvi = (nir - red) / (nir + red)
             valid = np.isfinite(ndvi)
             if not valid.any():
@@ -112,6 +107,159 @@ def _extract_stress_summary(stress_data: Dict[str, object]) -> Tuple[float, floa
     return total_stressed_area_percent, largest_stress_zone_ha
 
 
+class NdviUnavailableError(Exception):
+    """The NDVI raster could not be produced for an orthophoto."""
+
+
+class GeoConversionError(Exception):
+    """Tree detections could not be converted to geographic coordinates."""
+
+
+def _tree_detection_params() -> Dict[str, Any]:
+    """Everything besides the orthophoto that the tree detections depend on."""
+    return {
+        "model": get_model_fingerprint("agac"),
+        "tile_size": getattr(settings, "TILED_INFERENCE_TILE_SIZE", None),
+        "overlap": getattr(settings, "TILED_INFERENCE_OVERLAP", None),
+    }
+
+
+def orthophoto_path(project: Projects) -> Path | None:
+    stats = get_statistics(task_id=project.hashing_path, stat_type="orthophoto")
+    rel_path = stats.get("odm_orthophoto")
+    if not rel_path:
+        return None
+    return BASE_DIR / "static" / rel_path
+
+
+def ndvi_raster(project: Projects, raster_path: Path) -> Path:
+    ndvi_result = algos(str(raster_path), project.hashing_path).Ndvi()
+    ndvi_rel_path = ndvi_result.get("path")
+    if not ndvi_rel_path:
+        raise NdviUnavailableError("NDVI sonucu yolu belirlenemedi.")
+    return BASE_DIR / "static" / ndvi_rel_path
+
+
+def lazy_ndvi_raster(project: Projects, raster_path: Path) -> Callable[[], Path]:
+    """NDVI raster path, computed on first call and only if an artifact misses."""
+    return functools.cache(functools.partial(ndvi_raster, project, raster_path))
+
+
+def tree_centers(project: Projects, raster_path: Path) -> List[Dict[str, int]]:
+    """Pixel centres of every tree in the orthophoto (memoized YOLO pass)."""
+
+    def detect() -> List[Dict[str, int]]:
+        (
+            _detec,
+            _unique_id,
+            _confidence,
+            bbox_centers,
+        ) = predict_tree.predict_tiled(
+            path_to_weights="agac.pt",
+            path_to_source=str(raster_path),
+            return_boxes=True,
+        )
+        return bbox_centers
+
+    return analysis_cache.get_or_compute(
+        project.hashing_path,
+        raster_path,
+        "tree_centers",
+        _tree_detection_params(),
+        detect,
+    )
+
+
+def tree_points(project: Projects, raster_path: Path) -> List[Tuple[float, float]]:
+    """
+    ``(lon, lat)`` of every tree in the orthophoto (memoized).
+
+    Raises:
+        GeoConversionError: If the pixel centres cannot be georeferenced.
+            Detection failures propagate unchanged.
+    """
+
+    def convert() -> List[Tuple[float, float]]:
+        detections = [
+            DetectionPoint(x=p["x"], y=p["y"]) for p in tree_centers(project, raster_path)
+        ]
+        try:
+            geo_points = pixel_to_geo(str(raster_path), detections)
+        except Exception as e:
+            raise GeoConversionError(str(e)) from e
+        return [(p["lon"], p["lat"]) for p in geo_points]
+
+    return analysis_cache.get_or_compute(
+        project.hashing_path,
+        raster_path,
+        "tree_points",
+        _tree_detection_params(),
+        convert,
+    )
+
+
+def _density_grid_params(grid_size: float) -> Dict[str, Any]:
+    return {**_tree_detection_params(), "grid_size": grid_size}
+
+
+def _stress_zone_params(
+    low_threshold: float, high_threshold: float, min_area_ha: float
+) -> Dict[str, Any]:
+    return {"low": low_threshold, "high": high_threshold, "min_area_ha": min_area_ha}
+
+
+def density_grid(
+    project: Projects, raster_path: Path, grid_size: float
+) -> Dict[str, object]:
+    """Tree density grid of the orthophoto for one cell size (memoized)."""
+    return analysis_cache.get_or_compute(
+        project.hashing_path,
+        raster_path,
+        "density_grid",
+        _density_grid_params(grid_size),
+        lambda: generate_density_grid(tree_points(project, raster_path), grid_size),
+    )
+
+
+def stress_zone_data(
+    project: Projects,
+    raster_path: Path,
+    ndvi_path: Callable[[], Path],
+    low_threshold: float,
+    high_threshold: float,
+    min_area_ha: float,
+) -> Dict[str, Any]:
+    """Raw ``generate_stress_zones`` output for the project's NDVI (memoized)."""
+    return analysis_cache.get_or_compute(
+        project.hashing_path,
+        raster_path,
+        "stress_zones",
+        _stress_zone_params(low_threshold, high_threshold, min_area_ha),
+        lambda: generate_stress_zones(
+            str(ndvi_path()),
+            low_threshold=low_threshold,
+            high_threshold=high_threshold,
+            min_area_ha=min_area_ha,
+        ),
+    )
+
+
+def mean_ndvi(
+    project: Projects,
+    raster_path: Path,
+    source_path: Callable[[], Path],
+    source: str,
+) -> float:
+    """Memoized :func:`_compute_average_ndvi` of ``source_path()``."""
+    return analysis_cache.get_or_compute(
+        project.hashing_path,
+        raster_path,
+        "average_ndvi",
+        {"source": source},
+        lambda: _compute_average_ndvi(str(source_path())),
+    )
+
+
 @dataclass
 class _AnalysisData:
     """Holds pre-computed density and stress data so each inference runs only once."""
@@ -177,11 +325,18 @@ class ProjectViewSet(viewsets.ModelViewSet):
             raise ValidationError(f"Karma yol oluşturulamadı: {str(e)}")
 
     def _get_orthophoto_path(self, project: Projects) -> Path | None:
-        stats = get_statistics(task_id=project.hashing_path, stat_type="orthophoto")
-        rel_path = stats.get("odm_orthophoto")
-        if not rel_path:
+        return orthophoto_path(project)
+
+    def _artifact_validators(
+        self, raster_path: Path, kind: str, params: Dict[str, Any]
+    ) -> Optional[Tuple[str, datetime]]:
+        """ETag and Last-Modified of an artifact response; None if the orthophoto is unreadable."""
+        try:
+            version = analysis_cache.artifact_version(raster_path, kind, params)
+            mtime = os.stat(str(raster_path)).st_mtime
+        except OSError:
             return None
-        return BASE_DIR / "static" / rel_path
+        return make_etag(version), datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
 
     def _run_analysis(
         self,
@@ -191,7 +346,10 @@ class ProjectViewSet(viewsets.ModelViewSet):
         ndvi_high: float = NDVI_HIGH,
         min_area_ha: float = MIN_ZONE_AREA_HA,
     ) -> "Union[_AnalysisData, Response]":
-        """Run YOLO inference and NDVI computation exactly once.
+        """Run YOLO inference and NDVI computation at most once.
+
+        Intermediates come from the project analysis cache, so they are only
+        computed when the orthophoto, model or parameters changed.
 
         Returns an ``_AnalysisData`` on success, or a ``Response`` error on
         failure so callers can return it immediately.
@@ -202,24 +360,16 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 {"detail": "Bu proje için ortofoto mevcut değil."}, status=400
             )
 
-        # --- NDVI raster (once) ---
-        ndvi_algo = algos(str(raster_path), project.hashing_path)
-        ndvi_result = ndvi_algo.Ndvi()
-        ndvi_rel_path = ndvi_result.get("path")
-        if not ndvi_rel_path:
+        # --- Stress zones from NDVI (NDVI raster only built on a miss) ---
+        ndvi_path = lazy_ndvi_raster(project, raster_path)
+        try:
+            zones = stress_zone_data(
+                project, raster_path, ndvi_path, ndvi_low, ndvi_high, min_area_ha
+            )
+        except NdviUnavailableError:
             return Response(
                 {"detail": "NDVI sonucu yolu belirlenemedi."}, status=500
             )
-        ndvi_path = BASE_DIR / "static" / ndvi_rel_path
-
-        # --- Stress zones from NDVI (once) ---
-        try:
-            zones = generate_stress_zones(
-                str(ndvi_path),
-                low_threshold=ndvi_low,
-                high_threshold=ndvi_high,
-                min_area_ha=min_area_ha,
-            )
         except Exception as e:
             logger.error(
                 "Proje %s stres zonu üretim hatası: %s", project.id, e, exc_info=True
@@ -263,28 +413,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
             "ozet": ozet,
         }
 
-        # --- YOLO tree detection (once) ---
+        # --- YOLO tree detection + density grid (once per orthophoto) ---
         try:
-            (
-                _detec,
-                _unique_id,
-                _confidence,
-                bbox_centers,
-            ) = predict_tree.predict(
-                path_to_weights="agac.pt",
-                path_to_source=str(raster_path),
-                return_boxes=True,
+            density_data: Dict[str, object] = density_grid(
+                project, raster_path, grid_size
             )
-        except Exception as e:
-            logger.error(
-                "Proje %s yoğunluk tespiti hatası: %s", project.id, e, exc_info=True
-            )
-            return Response({"detail": "Ağaç tespiti başarısız oldu."}, status=500)
-
-        detections = [DetectionPoint(x=p["x"], y=p["y"]) for p in bbox_centers]
-        try:
-            geo_points = pixel_to_geo(str(raster_path), detections)
-        except Exception as e:
+        except GeoConversionError as e:
             logger.error(
                 "Proje %s koordinat dönüşüm hatası: %s", project.id, e, exc_info=True
             )
@@ -292,11 +426,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 {"detail": "Piksel-coğrafi koordinat dönüşümü başarısız oldu."},
                 status=500,
             )
-
-        lonlat_points = [(p["lon"], p["lat"]) for p in geo_points]
-        density_data: Dict[str, object] = generate_density_grid(
-            lonlat_points, grid_size
-        )
+        except Exception as e:
+            logger.error(
+                "Proje %s yoğunluk tespiti hatası: %s", project.id, e, exc_info=True
+            )
+            return Response({"detail": "Ağaç tespiti başarısız oldu."}, status=500)
 
         return _AnalysisData(
             density_data=density_data,
@@ -395,46 +529,40 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 {"detail": "Bu proje için ortofoto mevcut değil."}, status=400
             )
 
+        grid_size_param = request.query_params.get("grid_size_meters")
         try:
-            (
-                _detec,
-                _unique_id,
-                _confidence,
-                bbox_centers,
-            ) = predict_tree.predict(
-                path_to_weights="agac.pt",
-                path_to_source=str(raster_path),
-                return_boxes=True,
-            )
-        except Exception as e:
-            logger.error("Proje %s yoğunluk tespiti hatası: %s", project.id, e, exc_info=True)
-            return Response(
-                {"detail": "Ağaç tespiti başarısız oldu."}, status=500
+            grid_size = (
+                float(grid_size_param) if grid_size_param is not None else GRID_SIZE_METERS
             )
+        except ValueError:
+            grid_size = GRID_SIZE_METERS
 
-        detections = [DetectionPoint(x=p["x"], y=p["y"]) for p in bbox_centers]
+        validators = self._artifact_validators(
+            raster_path, "density_grid", _density_grid_params(grid_size)
+        )
+        if validators is not None:
+            cached = not_modified(request, *validators)
+            if cached is not None:
+                return cached
 
         try:
-            geo_points = pixel_to_geo(str(raster_path), detections)
-        except Exception as e:
+            feature_collection = density_grid(project, raster_path, grid_size)
+        except GeoConversionError as e:
             logger.error("Proje %s koordinat dönüşüm hatası: %s", project.id, e, exc_info=True)
             return Response(
                 {"detail": "Piksel-coğrafi koordinat dönüşümü başarısız oldu."},
                 status=500,
             )
-
-        lonlat_points = [(p["lon"], p["lat"]) for p in geo_points]
-
-        grid_size_param = request.query_params.get("grid_size_meters")
-        try:
-            grid_size = (
-                float(grid_size_param) if grid_size_param is not None else GRID_SIZE_METERS
+        except Exception as e:
+            logger.error("Proje %s yoğunluk tespiti hatası: %s", project.id, e, exc_info=True)
+            return Response(
+                {"detail": "Ağaç tespiti başarısız oldu."}, status=500
             )
-        except ValueError:
-            grid_size = GRID_SIZE_METERS
 
-        feature_collection = generate_density_grid(lonlat_points, grid_size)
-        return Response(feature_collection)
+        response = Response(feature_collection)
+        if validators is not None:
+            add_validators(response, *validators)
+        return response
 
     @action(detail=True, methods=["get"], url_path="stress-zones")
     def stress_zones(self, request, pk=None):
@@ -445,16 +573,6 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 {"detail": "Bu proje için ortofoto mevcut değil."}, status=400
             )
 
-        ndvi_algo = algos(str(raster_path), project.hashing_path)
-        ndvi_result = ndvi_algo.Ndvi()
-        ndvi_rel_path = ndvi_result.get("path")
-        if not ndvi_rel_path:
-            return Response(
-                {"detail": "NDVI sonucu yolu belirlenemedi."}, status=500
-            )
-
-        ndvi_path = BASE_DIR / "static" / ndvi_rel_path
-
         low_param = request.query_params.get("low")
         high_param = request.query_params.get("high")
         min_area_param = request.query_params.get("min_area")
@@ -482,12 +600,28 @@ class ProjectViewSet(viewsets.ModelViewSet):
         except ValueError:
             min_area_ha = MIN_ZONE_AREA_HA
 
+        validators = self._artifact_validators(
+            raster_path,
+            "stress_zones",
+            _stress_zone_params(low_threshold, high_threshold, min_area_ha),
+        )
+        if validators is not None:
+            cached = not_modified(request, *validators)
+            if cached is not None:
+                return cached
+
         try:
-            zones = generate_stress_zones(
-                str(ndvi_path),
-                low_threshold=low_threshold,
-                high_threshold=high_threshold,
-                min_area_ha=min_area_ha,
+            zones = stress_zone_data(
+                project,
+                raster_path,
+                lazy_ndvi_raster(project, raster_path),
+                low_threshold,
+                high_threshold,
+                min_area_ha,
+            )
+        except NdviUnavailableError:
+            return Response(
+                {"detail": "NDVI sonucu yolu belirlenemedi."}, status=500
             )
         except Exception as e:
             logger.error("Proje %s stres zonu üretim hatası: %s", project.id, e, exc_info=True)
@@ -539,7 +673,10 @@ class ProjectViewSet(viewsets.ModelViewSet):
             "ozet": ozet,
         }
 
-        return Response(response_data)
+        response = Response(response_data)
+        if validators is not None:
+            add_validators(response, *validators)
+        return response
 
     @action(detail=True, methods=["get"], url_path="decisions")
     def decisions(self, request, pk=None):
@@ -605,7 +742,9 @@ class ProjectViewSet(viewsets.ModelViewSet):
             largest_stress_zone_ha,
         ) = _extract_stress_summary(stress_data)
 
-        average_ndvi = _compute_average_ndvi(str(analysis.raster_path))
+        average_ndvi = mean_ndvi(
+            project, analysis.raster_path, lambda: analysis.raster_path, "orthophoto"
+        )
 
         age_param = request.query_params.get("tree_age")
         try:
@@ -631,7 +770,8 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def full_analysis(self, request, pk=None):
         """
         Full pipeline: NDVI → stress zones → density → yield → recommendations.
-        Each heavy computation (YOLO inference, NDVI raster) runs exactly once.
+        Each heavy computation (YOLO inference, NDVI raster) runs at most once
+        and is skipped entirely when the project analysis cache has its result.
         """
         import traceback
 
@@ -652,22 +792,16 @@ class ProjectViewSet(viewsets.ModelViewSet):
         start_time = timezone.now()
 
         try:
-            # --- Step 1: NDVI raster (once) ---
-            ndvi_algo = algos(str(raster_path), project.hashing_path)
-            ndvi_result = ndvi_algo.Ndvi()
-            ndvi_rel_path = ndvi_result.get("path")
-            if not ndvi_rel_path:
-                raise ValueError("NDVI sonucu yolu belirlenemedi.")
-            ndvi_path = BASE_DIR / "static" / ndvi_rel_path
-
-            # --- Step 2: Stress zones from NDVI raster (once) ---
+            # --- Step 1: NDVI raster (at most once, only if an artifact misses) ---
+            ndvi_path = lazy_ndvi_raster(project, raster_path)
+
+            # --- Step 2: Stress zones from NDVI raster (cached) ---
             try:
-                zones = generate_stress_zones(
-                    str(ndvi_path),
-                    low_threshold=ndvi_low,
-                    high_threshold=ndvi_high,
-                    min_area_ha=min_area_ha,
+                zones = stress_zone_data(
+                    project, raster_path, ndvi_path, ndvi_low, ndvi_high, min_area_ha
                 )
+            except NdviUnavailableError:
+                raise
             except Exception as e:
                 raise ValueError(f"Stres zonları üretilemedi: {e}")
 
@@ -700,34 +834,18 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 "ozet": ozet,
             }
 
-            # --- Step 3: Tree detection + density grid (once) ---
+            # --- Step 3: Tree detection (cached) + density grid ---
             try:
-                (
-                    _detec,
-                    _unique_id,
-                    _confidence,
-                    bbox_centers,
-                ) = predict_tree.predict(
-                    path_to_weights="agac.pt",
-                    path_to_source=str(raster_path),
-                    return_boxes=True,
-                )
+                density_data = density_grid(project, raster_path, grid_size)
+            except GeoConversionError as e:
+                raise ValueError(f"Piksel-coğrafi dönüşüm başarısız: {e}")
             except Exception as e:
                 raise ValueError(f"Ağaç tespiti başarısız: {e}")
 
-            detections = [DetectionPoint(x=p["x"], y=p["y"]) for p in bbox_centers]
-            try:
-                geo_points = pixel_to_geo(str(raster_path), detections)
-            except Exception as e:
-                raise ValueError(f"Piksel-coğrafi dönüşüm başarısız: {e}")
-
-            lonlat_points = [(p["lon"], p["lat"]) for p in geo_points]
-            density_data = generate_density_grid(lonlat_points, grid_size)
-
             # --- Step 4: Aggregate metrics ---
             total_tree_count, avg_density_per_ha = _aggregate_density_metrics(density_data)
             total_stressed_area_percent, largest_stress_zone_ha = _extract_stress_summary(stress_data)
-            average_ndvi = _compute_average_ndvi(str(ndvi_path))
+            average_ndvi = mean_ndvi(project, raster_path, ndvi_path, "ndvi")
 
             age_param = request.query_params.get("tree_age")
             try:
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.17 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dron_map', '0005_add_odm_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projects',
+            name='analysis_status',
+            field=models.CharField(choices=[('pending', 'Bekliyor'), ('processing', 'İşleniyor'), ('completed', 'Tamamlandı'), ('failed', 'Başarısız')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='projects',
+            name='analysis_progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Percentage of analysis artifacts precomputed'),
+        ),
+    ]
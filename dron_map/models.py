@@ -67,5 +67,28 @@ class Projects(models.Model):
         help_text="Error message if ODM processing failed",
     )
 
+    # Background analysis precompute state (runs after ODM completes)
+    ANALYSIS_PENDING = "pending"
+    ANALYSIS_PROCESSING = "processing"
+    ANALYSIS_COMPLETED = "completed"
+    ANALYSIS_FAILED = "failed"
+    ANALYSIS_STATUS_CHOICES = [
+        (ANALYSIS_PENDING, "Bekliyor"),
+        (ANALYSIS_PROCESSING, "İşleniyor"),
+        (ANALYSIS_COMPLETED, "Tamamlandı"),
+        (ANALYSIS_FAILED, "Başarısız"),
+    ]
+    analysis_status: models.CharField = models.CharField(
+        max_length=20,
+        choices=ANALYSIS_STATUS_CHOICES,
+        default=ANALYSIS_PENDING,
+    )
+    analysis_progress: models.PositiveSmallIntegerField = (
+        models.PositiveSmallIntegerField(
+            default=0,
+            help_text="Percentage of analysis artifacts precomputed",
+        )
+    )
+
     def __str__(self):
         return self.Farm
@@ -9,12 +9,15 @@ Flow:
   4. The task creates a NodeODM task, polls for completion, then downloads
      the output assets into static/results/{hashing_path}/.
   5. Project.odm_status is updated at each step so the frontend can poll.
+  6. On completion a precompute chain warms the analysis artifacts (overviews,
+     NDVI, stress zones, tree points, density grid) so the map and analysis
+     endpoints are answered from cache. Project.analysis_progress tracks it.
 """
 import logging
 import os
 from pathlib import Path
 
-from celery import shared_task
+from celery import chain, shared_task
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -92,7 +95,13 @@ def process_odm_task(self, project_id: int) -> dict:
 
         task = node.create_task(
             images,
-            options={"dsm": True, "dtm": True, "orthophoto-resolution": 5},
+            options={
+                "dsm": True,
+                "dtm": True,
+                "orthophoto-resolution": 5,
+                # Tiled, compressed orthophoto with overviews for the map viewer
+                "cog": True,
+            },
         )
 
         project.odm_task_id = task.uuid
@@ -107,9 +116,22 @@ def process_odm_task(self, project_id: int) -> dict:
         task.download_assets(str(output_dir))
         logger.info("ODM sonuçları indirildi: %s (proje %s)", output_dir, project_id)
 
+        # Analysis artifacts of an earlier orthophoto no longer apply
+        from dron_map.analysis_cache import invalidate_project
+
+        invalidate_project(project.hashing_path)
+
         project.odm_status = Projects.ODM_COMPLETED
         project.odm_error = None
-        project.save(update_fields=["odm_status", "odm_error"])
+        project.analysis_status = Projects.ANALYSIS_PENDING
+        project.analysis_progress = 0
+        project.save(
+            update_fields=[
+                "odm_status", "odm_error", "analysis_status", "analysis_progress"
+            ]
+        )
+
+        schedule_analysis_precompute(project_id)
 
         return {
             "project_id": project_id,
@@ -126,3 +148,138 @@ def process_odm_task(self, project_id: int) -> dict:
         project.odm_error = str(e)
         project.save(update_fields=["odm_status", "odm_error"])
         return {"project_id": project_id, "error": str(e)}
+
+
+# ---------------------------------------------------------------------------
+# Analysis precompute chain
+# ---------------------------------------------------------------------------
+
+OVERVIEW_FACTORS = (2, 4, 8, 16, 32)
+
+
+def schedule_analysis_precompute(project_id: int):
+    """
+    Queue the chain that warms a project's analysis artifacts.
+
+    Every step stores its result in the analysis cache or the index raster
+    store under the same keys the API uses, so a later request for the same
+    artifact is a lookup. Overviews come first because adding them rewrites
+    the orthophoto, which changes the fingerprint the other artifacts are
+    keyed on.
+    """
+    return chain(
+        precompute_overviews.si(project_id),
+        precompute_ndvi.si(project_id),
+        precompute_tree_points.si(project_id),
+        precompute_density.si(project_id),
+    ).apply_async()
+
+
+def _build_overviews(raster_path: Path) -> bool:
+    """Add internal overviews to ``raster_path`` unless it already has them."""
+    import rasterio
+    from rasterio.enums import Resampling
+
+    with rasterio.open(raster_path, "r+") as dst:
+        if dst.overviews(1):
+            return False
+        factors = [f for f in OVERVIEW_FACTORS if min(dst.width, dst.height) // f >= 256]
+        if not factors:
+            return False
+        dst.build_overviews(factors, Resampling.average)
+        dst.update_tags(ns="rio_overview", resampling="average")
+    return True
+
+
+def _run_precompute_step(project_id: int, step: str, progress: int, work) -> dict:
+    """
+    Run one precompute step and record its progress on the project.
+
+    ``work(project, raster_path)`` does the actual warming. A failure marks
+    the project's analysis as failed and is re-raised so the chain stops.
+    """
+    from dron_map.api_views import orthophoto_path
+    from dron_map.models import Projects
+
+    try:
+        project = Projects.objects.get(pk=project_id)
+    except Projects.DoesNotExist:
+        logger.error("Ön hesaplama: proje bulunamadı pk=%s", project_id)
+        return {"error": f"Proje bulunamadı: {project_id}"}
+
+    raster_path = orthophoto_path(project)
+    if raster_path is None or not raster_path.exists():
+        logger.warning("Ön hesaplama: proje %s için ortofoto yok, atlandı.", project_id)
+        project.analysis_status = Projects.ANALYSIS_FAILED
+        project.save(update_fields=["analysis_status"])
+        raise FileNotFoundError(f"Ortofoto bulunamadı: proje {project_id}")
+
+    if project.analysis_status != Projects.ANALYSIS_PROCESSING:
+        project.analysis_status = Projects.ANALYSIS_PROCESSING
+        project.save(update_fields=["analysis_status"])
+
+    try:
+        work(project, raster_path)
+    except Exception as e:
+        logger.error(
+            "Ön hesaplama adımı '%s' başarısız (proje %s): %s",
+            step, project_id, e, exc_info=True,
+        )
+        project.analysis_status = Projects.ANALYSIS_FAILED
+        project.save(update_fields=["analysis_status"])
+        raise
+
+    project.analysis_progress = progress
+    if progress >= 100:
+        project.analysis_status = Projects.ANALYSIS_COMPLETED
+    project.save(update_fields=["analysis_status", "analysis_progress"])
+    logger.info("Ön hesaplama adımı '%s' tamamlandı (proje %s, %%%s)", step, project_id, progress)
+    return {"project_id": project_id, "step": step, "progress": progress}
+
+
+@shared_task(name="dron_map.tasks.precompute_overviews")
+def precompute_overviews(project_id: int) -> dict:
+    """Add overviews to the orthophoto so zoomed-out reads stay cheap."""
+    return _run_precompute_step(
+        project_id, "overviews", 10,
+        lambda project, raster_path: _build_overviews(raster_path),
+    )
+
+
+@shared_task(name="dron_map.tasks.precompute_ndvi")
+def precompute_ndvi(project_id: int) -> dict:
+    """Render the NDVI raster and derive the default stress zones and mean NDVI."""
+    from dron_map import api_views
+    from spatial_analysis.config import MIN_ZONE_AREA_HA, NDVI_HIGH, NDVI_LOW
+
+    def work(project, raster_path):
+        ndvi_path = api_views.lazy_ndvi_raster(project, raster_path)
+        ndvi_path()
+        api_views.stress_zone_data(
+            project, raster_path, ndvi_path, NDVI_LOW, NDVI_HIGH, MIN_ZONE_AREA_HA
+        )
+        api_views.mean_ndvi(project, raster_path, ndvi_path, "ndvi")
+
+    return _run_precompute_step(project_id, "ndvi", 40, work)
+
+
+@shared_task(name="dron_map.tasks.precompute_tree_points")
+def precompute_tree_points(project_id: int) -> dict:
+    """Run tree detection over the orthophoto and georeference the trees."""
+    from dron_map import api_views
+
+    return _run_precompute_step(project_id, "tree_points", 90, api_views.tree_points)
+
+
+@shared_task(name="dron_map.tasks.precompute_density")
+def precompute_density(project_id: int) -> dict:
+    """Build the density grid at the default cell size."""
+    from dron_map import api_views
+    from spatial_analysis.config import GRID_SIZE_METERS
+
+    return _run_precompute_step(
+        project_id, "density", 100,
+        lambda project, raster_path: api_views.density_grid(
+            project, raster_path, GRID_SIZE_METERS
+        ),
+    )
@@ -13,14 +13,25 @@ To run tests:
 """
 
 import io
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
+import numpy as np
+import rasterio
+import torch
 from PIL import Image
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.http import HttpResponse
+from django.test import Client, TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from yolowebapp2 import predict_tree
+from . import analysis_cache, tasks
 from .models import Projects
 
 
@@ -127,6 +138,43 @@ class ProjectViewCreateTests(TestCase):
         response = self.client.get("/dron-map/map/1/")
         self.assertEqual(response.status_code, 302)
 
+    def test_map_renders_requested_layers_in_one_pass(self):
+        """Every requested index layer comes from a single process_indices call."""
+        from yolowebapp2.histogram import EXG, NDVI
+
+        project = Projects.objects.create(Farm="Farm", Title="Map", hashing_path="proj")
+        layers = [{"path": "ndvi.tif"}, {"path": "exg.tif"}]
+        with patch("dron_map.views.get_statistics", return_value={"odm_orthophoto": "o.tif"}), \
+             patch("dron_map.views.os.path.exists", return_value=True), \
+             patch("dron_map.views.hs.algos") as mock_algos, \
+             patch("dron_map.views.render", return_value=HttpResponse()) as mock_render:
+            mock_algos.return_value.process_indices.return_value = layers
+            self.client.post(
+                f"/dron-map/map/{project.pk}/",
+                {"range": ["-1", "1"], "health_color": ["ndvi", "exg"], "cmap": "jet"},
+            )
+
+        mock_algos.return_value.process_indices.assert_called_once()
+        specs = mock_algos.return_value.process_indices.call_args.args[0]
+        self.assertEqual([spec.index_class for spec in specs], [NDVI, EXG])
+        self.assertEqual([spec.rescale for spec in specs], [True, False])
+        context = mock_render.call_args.args[2]
+        self.assertEqual(context["orthophoto"], layers[0])
+        self.assertEqual(context["layers"], {"ndvi": layers[0], "exg": layers[1]})
+
+    def test_map_template_adds_every_layer_to_the_layer_control(self):
+        from django.template.loader import render_to_string
+
+        layers = {"ndvi": {"path": "store/ndvi.tif"}, "exg": {"path": "store/exg.tif"}}
+        html = render_to_string(
+            "map.html",
+            {"orthophoto": layers["ndvi"], "layers": layers, "algo": {}, "colors": {}},
+        )
+
+        self.assertIn('layerControl.addOverlay(layer, "NDVI")', html)
+        self.assertIn('addIndexOverlay("EXG", "/static/store/exg.tif")', html)
+        self.assertNotIn('addIndexOverlay("NDVI"', html)
+
 
 class ProjectAPIWriteTests(APITestCase):
     """Test project create/update/delete via API."""
@@ -174,6 +222,258 @@ class HealthAlgorithmTests(TestCase):
         self.assertIn("ndvi", HEALTH_ALGORITHMS)
 
 
+class IndexRasterStoreTests(TestCase):
+    """Tests for the content-addressed vegetation index raster store."""
+
+    def setUp(self):
+        from yolowebapp2 import raster_store
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.source = self.root / "ortho.tif"
+        with rasterio.open(
+            self.source, "w", driver="GTiff", width=32, height=16, count=4,
+            dtype="uint8",
+        ) as dst:
+            dst.write(np.random.default_rng(0).integers(1, 255, (4, 16, 32), dtype=np.uint8))
+        base_dir = patch.object(raster_store, "BASE_DIR", self.root)
+        base_dir.start()
+        self.addCleanup(base_dir.stop)
+        self.store = raster_store
+
+    def _algos(self):
+        from yolowebapp2.histogram import algos
+
+        return algos(str(self.source), "proj")
+
+    def test_repeat_request_reuses_stored_raster(self):
+        first = self._algos().Ndvi()
+        with patch("yolowebapp2.histogram.algos._write_indices") as mock_write:
+            second = self._algos().Ndvi()
+        mock_write.assert_not_called()
+        self.assertEqual(first["path"], second["path"])
+        self.assertTrue((self.root / "static" / first["path"]).exists())
+
+    def test_indices_do_not_overwrite_each_other(self):
+        ndvi = self._algos().Ndvi()
+        savi = self._algos().SAVI((-1, 1), None)
+        self.assertNotEqual(ndvi["path"], savi["path"])
+        self.assertTrue((self.root / "static" / ndvi["path"]).exists())
+        self.assertTrue((self.root / "static" / savi["path"]).exists())
+
+    def test_single_pass_matches_separate_renders(self):
+        from yolowebapp2.histogram import EVI, LAI, NDVI, SAVI, IndexSpec, algos
+
+        specs = [IndexSpec(cls, (-1, 1)) for cls in (NDVI, SAVI, EVI, LAI)]
+        engine = algos(str(self.source), "proj")
+        with patch.object(engine.raster, "read", wraps=engine.raster.read) as mock_read:
+            combined = engine.process_indices(specs)
+        # One read per window for all bands, however many indices are
+        # rendered; green is used by none of them and never requested
+        self.assertEqual(mock_read.call_count, 1)
+        self.assertEqual(mock_read.call_args.args[0], [1, 3, 4])
+
+        for spec, result in zip(specs, combined):
+            with rasterio.open(self.root / "static" / result["path"]) as src:
+                together = src.read(1)
+            self.store.store_dir("proj").joinpath(Path(result["path"]).name).unlink()
+            alone = self._algos()._process_index(*spec)
+            with rasterio.open(self.root / "static" / alone["path"]) as src:
+                np.testing.assert_array_equal(src.read(1), together)
+
+    def test_parallel_render_is_bit_identical(self):
+        from yolowebapp2.histogram import NDVI, VNDVI, IndexSpec, algos
+
+        with rasterio.open(
+            self.source, "w", driver="GTiff", width=2500, height=1300, count=4,
+            dtype="uint16",
+        ) as dst:
+            dst.write(np.random.default_rng(1).integers(1, 4000, (4, 1300, 2500), dtype=np.uint16))
+        specs = [IndexSpec(NDVI, (-1, 1)), IndexSpec(VNDVI, (0, 2))]
+
+        rendered = {}
+        for workers in (1, 3):
+            for path in self.store.store_dir("proj").glob("*.tif"):
+                path.unlink()
+            with override_settings(INDEX_RENDER_WORKERS=workers):
+                results = algos(str(self.source), "proj").process_indices(specs)
+            arrays = []
+            for result in results:
+                with rasterio.open(self.root / "static" / result["path"]) as src:
+                    arrays.append(src.read(1))
+            rendered[workers] = arrays
+
+        for serial, parallel in zip(rendered[1], rendered[3]):
+            np.testing.assert_array_equal(serial, parallel)
+
+    def test_failed_write_stops_parallel_render(self):
+        from yolowebapp2.histogram import NDVI, IndexSpec, _ordered_map, algos
+
+        started = []
+
+        def render(window):
+            started.append(window)
+            time.sleep(0.01)
+            return window
+
+        rendered = _ordered_map(render, range(100), 2)
+        self.assertEqual(next(rendered), 0)
+        rendered.close()
+        # Nothing is still running or started once the map is closed
+        count = len(started)
+        time.sleep(0.05)
+        self.assertEqual(len(started), count)
+        self.assertLess(count, 100)
+
+        with override_settings(INDEX_RENDER_WORKERS=3), \
+             patch("rasterio.io.DatasetWriter.write", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                algos(str(self.source), "proj").process_indices([IndexSpec(NDVI, (-1, 1))])
+        self.assertEqual(list(self.store.store_dir("proj").glob("*.tif")), [])
+
+    def test_parallel_render_opens_one_dataset_per_thread(self):
+        from yolowebapp2.histogram import _ordered_map
+
+        opened, closed, used = [], [], set()
+
+        def render(window):
+            used.add(threading.get_ident())
+            return window
+
+        rendered = _ordered_map(
+            render,
+            range(50),
+            3,
+            initializer=lambda: opened.append(threading.get_ident()),
+            finalizer=lambda: closed.append(threading.get_ident()),
+        )
+        self.assertEqual(list(rendered), list(range(50)))
+        # Each thread opened and closed exactly one handle, on itself
+        self.assertEqual(len(opened), 3)
+        self.assertEqual(sorted(opened), sorted(set(opened)))
+        self.assertEqual(sorted(closed), sorted(opened))
+        self.assertLessEqual(used, set(opened))
+
+    def test_index_rasters_are_cloud_optimized(self):
+        with rasterio.open(
+            self.source, "w", driver="GTiff", width=1100, height=700, count=4,
+            dtype="uint8",
+        ) as dst:
+            dst.write(np.random.default_rng(3).integers(1, 255, (4, 700, 1100), dtype=np.uint8))
+        result = self._algos().Ndvi()
+
+        with rasterio.open(self.root / "static" / result["path"]) as src:
+            self.assertEqual(src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT"), "COG")
+            self.assertEqual(src.block_shapes[0], (512, 512))
+            self.assertEqual(src.compression.name, "deflate")
+            self.assertTrue(src.overviews(1))
+            self.assertIsNotNone(src.colormap(1))
+
+    def test_convert_command_rewrites_existing_rasters(self):
+        from django.core.management import call_command
+
+        from yolowebapp2 import cog
+
+        Projects.objects.create(Farm="Farm", Title="Old", hashing_path="proj")
+        directory = self.store.store_dir("proj")
+        directory.mkdir(parents=True)
+        legacy = directory / "legacy.tif"
+        with rasterio.open(self.source) as src:
+            data = src.read(1)
+            with rasterio.open(
+                legacy, "w", driver="GTiff", width=src.width, height=src.height,
+                count=1, dtype="uint8",
+            ) as dst:
+                dst.write(data, 1)
+        self.assertFalse(cog.is_cog(legacy))
+
+        call_command("convert_to_cog", "--project", "proj", stdout=io.StringIO())
+
+        self.assertTrue(cog.is_cog(legacy))
+        with rasterio.open(legacy) as src:
+            np.testing.assert_array_equal(src.read(1), data)
+
+    def test_only_the_orthophoto_gets_averaged_overviews(self):
+        from django.core.management import call_command
+
+        from yolowebapp2 import cog
+
+        Projects.objects.create(Farm="Farm", Title="Old", hashing_path="proj")
+        directory = self.store.store_dir("proj")
+        directory.mkdir(parents=True)
+        index = directory / "index.tif"
+        index.write_bytes(b"")
+        with patch("dron_map.api_views.orthophoto_path", return_value=self.source), \
+             patch.object(cog, "is_cog", return_value=False), \
+             patch.object(cog, "convert_in_place") as mock_convert, \
+             patch.object(analysis_cache, "invalidate_project"):
+            call_command(
+                "convert_to_cog", "--project", "proj", "--orthophoto", stdout=io.StringIO()
+            )
+
+        self.assertEqual(
+            [c.args for c in mock_convert.call_args_list],
+            [(index, cog.INDEX_RESAMPLING), (self.source, cog.IMAGERY_RESAMPLING)],
+        )
+        self.assertEqual(cog.cog_options()["OVERVIEW_RESAMPLING"], "NEAREST")
+
+    def test_eviction_removes_least_recently_used(self):
+        directory = self.store.store_dir("proj")
+        directory.mkdir(parents=True)
+        for age, name in enumerate(["new", "mid", "old"]):
+            path = directory / f"{name}.tif"
+            path.write_bytes(b"\0" * 600 * 1024)
+            os.utime(path, (1000 - age, 1000 - age))
+        with override_settings(INDEX_RASTER_STORE_MAX_MB=1):
+            deleted = self.store.evict("proj")
+        self.assertEqual(deleted, 2)
+        self.assertEqual([p.name for p in directory.glob("*.tif")], ["new.tif"])
+
+
+class VegetationIndexMathTests(TestCase):
+    """The in-place index kernels must match the plain numpy formulas exactly."""
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.r, self.g, self.b, self.n = (
+            rng.uniform(0.01, 1.0, (64, 48)).astype(np.float32) for _ in range(4)
+        )
+
+    def test_kernels_match_reference_formulas(self):
+        from yolowebapp2 import histogram
+
+        r, g, b, n = self.r, self.g, self.b, self.n
+        reference = {
+            "ndvi": (n - r) / (n + r),
+            "vari": (g - r) / (g + r - b),
+            "vndvi": 0.5268 * ((r**-0.1294) * (g**0.3389) * (b**-0.3118)),
+            "bai": 1.0 / (((0.1 - r) ** 2) + ((0.06 - n) ** 2)),
+            "mnli": ((n**2 - r) * 1.5) / (n**2 + r + 0.5),
+            "tdvi": 1.5 * ((n - r) / np.sqrt(n**2 + r + 0.5)),
+            "lai": 3.618 * (2.5 * (n - r) / (n + 6 * r - 7.5 * b + 1)) * 0.118,
+            "arvi": (n - (2 * r) + b) / (n + (2 * r) + b),
+        }
+        for name, expected in reference.items():
+            index = histogram.INDICES[name](r, g, b, n)
+            np.testing.assert_array_equal(index.calculate(), expected, err_msg=name)
+
+    def test_shared_window_reuses_scratch_buffers(self):
+        from yolowebapp2.histogram import NDVI, SAVI, BandWindow, ScratchPool
+
+        pool = ScratchPool()
+        first = BandWindow(red=self.r, nir=self.n, pool=pool)
+        NDVI.from_window(first).calculate()
+        SAVI.from_window(first).calculate()
+        buffers = {id(buf) for buf in first._taken.values()}
+        first.release()
+
+        second = BandWindow(red=self.r, nir=self.n, pool=pool)
+        NDVI.from_window(second).calculate()
+        SAVI.from_window(second).calculate()
+        self.assertEqual({id(buf) for buf in second._taken.values()}, buffers)
+
+
 # ---------------------------------------------------------------------------
 # Shared helpers for analysis action tests
 # ---------------------------------------------------------------------------
@@ -255,7 +555,7 @@ class ProjectDensityActionTests(APITestCase):
     def test_density_returns_feature_collection_on_success(self):
         with patch("dron_map.api_views.ProjectViewSet._get_orthophoto_path",
                    return_value=MagicMock()), \
-             patch("dron_map.api_views.predict_tree.predict",
+             patch("dron_map.api_views.predict_tree.predict_tiled",
                    return_value=(5, "uid", 0.9, [{"x": 100, "y": 200}])), \
              patch("dron_map.api_views.pixel_to_geo",
                    return_value=[{"lon": 28.97, "lat": 41.00}]), \
@@ -268,13 +568,168 @@ class ProjectDensityActionTests(APITestCase):
     def test_density_returns_500_when_yolo_fails(self):
         with patch("dron_map.api_views.ProjectViewSet._get_orthophoto_path",
                    return_value=MagicMock()), \
-             patch("dron_map.api_views.predict_tree.predict",
+             patch("dron_map.api_views.predict_tree.predict_tiled",
                    side_effect=RuntimeError("GPU OOM")):
             response = self.client.get(self._url())
         self.assertEqual(response.status_code, 500)
         self.assertIn("detail", response.data)
 
 
+class AnalysisCacheTests(TestCase):
+    """Tests for the per-project analysis artifact cache."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.raster = self.root / "odm_orthophoto.tif"
+        self.raster.write_bytes(b"ortho v1")
+        settings_override = override_settings(ANALYSIS_CACHE_DIR=self.root / "cache")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_second_lookup_is_served_from_disk(self):
+        compute = MagicMock(return_value=[{"x": 1, "y": 2}])
+        for _ in range(2):
+            value = analysis_cache.get_or_compute(
+                "proj", self.raster, "tree_centers", {"model": "m1"}, compute
+            )
+        self.assertEqual(value, [{"x": 1, "y": 2}])
+        compute.assert_called_once()
+
+    def test_params_are_part_of_the_key(self):
+        compute = MagicMock(side_effect=[1.0, 2.0])
+        first = analysis_cache.get_or_compute("proj", self.raster, "z", {"low": 0.2}, compute)
+        second = analysis_cache.get_or_compute("proj", self.raster, "z", {"low": 0.3}, compute)
+        self.assertEqual((first, second), (1.0, 2.0))
+
+    def test_new_orthophoto_invalidates_and_prunes(self):
+        analysis_cache.get_or_compute("proj", self.raster, "z", {}, lambda: 1)
+        self.raster.write_bytes(b"ortho v2, rewritten by ODM")
+
+        value = analysis_cache.get_or_compute("proj", self.raster, "z", {}, lambda: 2)
+
+        self.assertEqual(value, 2)
+        self.assertEqual(len(list((self.root / "cache" / "proj").glob("*.json"))), 1)
+
+    def test_density_reuses_cached_tree_detections(self):
+        user = User.objects.create_user(username="cache_user", password="pass")
+        project = Projects.objects.create(
+            Farm="F", Field="F1", Title="T", State="Active",
+            created_by=user, hashing_path="abc123",
+        )
+        self.client.force_login(user)
+        with patch("dron_map.api_views.ProjectViewSet._get_orthophoto_path",
+                   return_value=self.raster), \
+             patch("dron_map.api_views.predict_tree.predict_tiled",
+                   return_value=(5, "uid", 0.9, [{"x": 100, "y": 200}])) as mock_predict, \
+             patch("dron_map.api_views.pixel_to_geo",
+                   return_value=[{"lon": 28.97, "lat": 41.00}]), \
+             patch("dron_map.api_views.generate_density_grid",
+                   return_value=_make_density_data()):
+            for _ in range(2):
+                response = self.client.get(f"/api/projects/{project.pk}/density/")
+                self.assertEqual(response.status_code, 200)
+        mock_predict.assert_called_once()
+
+
+class AnalysisPrecomputeTests(TestCase):
+    """Tests for the post-ODM analysis precompute chain."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.raster = Path(tmp.name) / "odm_orthophoto.tif"
+        self.raster.write_bytes(b"ortho")
+        user = User.objects.create_user(username="precompute_user", password="pass")
+        self.project = Projects.objects.create(
+            Farm="F", Field="F1", Title="T", State="Active",
+            created_by=user, hashing_path="pre123",
+        )
+        ortho = patch("dron_map.api_views.orthophoto_path", return_value=self.raster)
+        ortho.start()
+        self.addCleanup(ortho.stop)
+
+    def test_last_step_completes_analysis(self):
+        with patch("dron_map.api_views.density_grid") as mock_grid:
+            result = tasks.precompute_density(self.project.pk)
+
+        mock_grid.assert_called_once()
+        self.assertEqual(result["progress"], 100)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.analysis_status, Projects.ANALYSIS_COMPLETED)
+        self.assertEqual(self.project.analysis_progress, 100)
+
+    def test_failed_step_marks_analysis_failed(self):
+        with patch("dron_map.api_views.tree_points",
+                   side_effect=RuntimeError("GPU OOM")):
+            with self.assertRaises(RuntimeError):
+                tasks.precompute_tree_points(self.project.pk)
+
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.analysis_status, Projects.ANALYSIS_FAILED)
+        self.assertEqual(self.project.analysis_progress, 0)
+
+    def test_ndvi_step_warms_stress_zones_and_mean_ndvi(self):
+        with patch("dron_map.api_views.ndvi_raster", return_value=self.raster), \
+             patch("dron_map.api_views.generate_stress_zones",
+                   return_value={"features": []}) as mock_zones, \
+             patch("dron_map.api_views._compute_average_ndvi",
+                   return_value=0.5), \
+             override_settings(ANALYSIS_CACHE_DIR=self.raster.parent / "cache"):
+            tasks.precompute_ndvi(self.project.pk)
+            tasks.precompute_ndvi(self.project.pk)
+
+        mock_zones.assert_called_once()
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.analysis_status, Projects.ANALYSIS_PROCESSING)
+
+
+class ConditionalArtifactTests(APITestCase):
+    """Tests for ETag revalidation of the map artifact endpoints."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.raster = Path(tmp.name) / "odm_orthophoto.tif"
+        self.raster.write_bytes(b"ortho v1")
+        self.user = User.objects.create_user(username="etag_user", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.project = Projects.objects.create(
+            Farm="F", Field="F1", Title="T", State="Active", created_by=self.user,
+        )
+        ortho = patch("dron_map.api_views.ProjectViewSet._get_orthophoto_path",
+                      return_value=self.raster)
+        ortho.start()
+        self.addCleanup(ortho.stop)
+
+    def _url(self, query=""):
+        return f"/api/projects/{self.project.pk}/stress-zones/{query}"
+
+    def test_unchanged_stress_zones_return_304_without_recomputation(self):
+        with patch("dron_map.api_views.ndvi_raster", return_value=self.raster), \
+             patch("dron_map.api_views.generate_stress_zones",
+                   return_value={"features": []}) as mock_zones:
+            first = self.client.get(self._url())
+            second = self.client.get(self._url(), HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        mock_zones.assert_called_once()
+
+    def test_etag_depends_on_parameters_and_orthophoto(self):
+        with patch("dron_map.api_views.ndvi_raster", return_value=self.raster), \
+             patch("dron_map.api_views.generate_stress_zones",
+                   return_value={"features": []}):
+            etag = self.client.get(self._url())["ETag"]
+            other_params = self.client.get(self._url("?low=0.1"), HTTP_IF_NONE_MATCH=etag)
+            self.raster.write_bytes(b"ortho v2, rewritten by ODM")
+            new_ortho = self.client.get(self._url(), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(other_params.status_code, 200)
+        self.assertEqual(new_ortho.status_code, 200)
+
+
 class ProjectDecisionsActionTests(APITestCase):
     """Tests for the /decisions/ action — uses _run_analysis mock."""
 
@@ -373,3 +828,146 @@ class ProjectYieldActionTests(APITestCase):
         score = float(response.data["kalite_skoru"])
         self.assertGreaterEqual(score, 0.0)
         self.assertLessEqual(score, 100.0)
+
+
+# ---------------------------------------------------------------------------
+# Tiled orthophoto inference
+# ---------------------------------------------------------------------------
+
+class TiledInferenceTests(TestCase):
+    """Tests for predict_tree.predict_tiled with a stubbed model."""
+
+    def _write_raster(self, path, width=1000, height=1000):
+        data = np.full((3, height, width), 80, dtype=np.uint8)
+        with rasterio.open(
+            path, "w", driver="GTiff", width=width, height=height,
+            count=3, dtype="uint8",
+        ) as dst:
+            dst.write(data)
+
+    def test_tile_offsets_cover_raster_edge(self):
+        self.assertEqual(predict_tree._tile_offsets(500, 640, 128), [0])
+        self.assertEqual(predict_tree._tile_offsets(1000, 640, 128), [0, 360])
+        offsets = predict_tree._tile_offsets(2000, 640, 128)
+        self.assertEqual(offsets[-1] + 640, 2000)
+        self.assertTrue(all(b - a <= 512 for a, b in zip(offsets, offsets[1:])))
+
+    def test_ownership_bounds_split_overlap_at_midpoint(self):
+        bounds = predict_tree._ownership_bounds([0, 360], 640, 1000)
+        self.assertEqual(bounds, [(0.0, 500.0), (500.0, 1000.0)])
+
+    def test_seam_duplicates_are_merged_and_shifted_to_global(self):
+        def fake_batch(model_name, model, device, tiles):
+            # The same tree (global x=440..460) seen by the two top tiles,
+            # plus one tree only visible in the bottom-right tile.
+            empty = torch.zeros((0, 6))
+            return [
+                torch.tensor([[440.0, 90.0, 460.0, 110.0, 0.9, 0.0]]),
+                torch.tensor([[80.0, 90.0, 100.0, 110.0, 0.8, 0.0]]),
+                empty,
+                torch.tensor([[300.0, 300.0, 320.0, 320.0, 0.7, 0.0]]),
+            ][: len(tiles)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            raster = str(Path(tmp) / "ortho.tif")
+            self._write_raster(raster)
+            with patch("yolowebapp2.predict_tree.get_model", return_value=MagicMock()), \
+                 patch("yolowebapp2.predict_tree.get_device",
+                       return_value=torch.device("cpu")), \
+                 patch("yolowebapp2.predict_tree._infer_tile_batch",
+                       side_effect=fake_batch) as mock_batch:
+                count, _uid, conf, centers = predict_tree.predict_tiled(
+                    "agac.pt", raster, return_boxes=True,
+                    tile_size=640, overlap=128, batch_size=8,
+                )
+
+        self.assertEqual(mock_batch.call_count, 1)
+        self.assertEqual(count, b"02")
+        self.assertEqual(
+            sorted((c["x"], c["y"]) for c in centers), [(450, 100), (670, 670)]
+        )
+        self.assertAlmostEqual(conf, 0.8, places=5)
+
+    def test_empty_tiles_are_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            raster = str(Path(tmp) / "empty.tif")
+            with rasterio.open(
+                raster, "w", driver="GTiff", width=700, height=700,
+                count=3, dtype="uint8",
+            ) as dst:
+                dst.write(np.zeros((3, 700, 700), dtype=np.uint8))
+            with patch("yolowebapp2.predict_tree.get_model", return_value=MagicMock()), \
+                 patch("yolowebapp2.predict_tree.get_device",
+                       return_value=torch.device("cpu")), \
+                 patch("yolowebapp2.predict_tree._infer_tile_batch") as mock_batch:
+                result = predict_tree.predict_tiled("agac.pt", raster)
+
+        mock_batch.assert_not_called()
+        self.assertEqual(result[0], b"00")
+
+    def test_uint16_raster_is_stretched_not_saturated(self):
+        tiles = []
+
+        def fake_batch(model_name, model, device, batch):
+            tiles.extend(tile.copy() for tile in batch)
+            return [torch.zeros((0, 6)) for _ in batch]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            raster = str(Path(tmp) / "ortho16.tif")
+            # 12-bit sensor values: every pixel is above 255
+            ramp = np.linspace(1000, 4000, 640, dtype=np.uint16)
+            with rasterio.open(
+                raster, "w", driver="GTiff", width=640, height=640,
+                count=3, dtype="uint16",
+            ) as dst:
+                dst.write(np.broadcast_to(ramp, (3, 640, 640)))
+            with patch("yolowebapp2.predict_tree.get_model", return_value=MagicMock()), \
+                 patch("yolowebapp2.predict_tree.get_device",
+                       return_value=torch.device("cpu")), \
+                 patch("yolowebapp2.predict_tree._infer_tile_batch",
+                       side_effect=fake_batch):
+                predict_tree.predict_tiled("agac.pt", raster, tile_size=640)
+
+        self.assertEqual(len(tiles), 1)
+        row = tiles[0][0, 0]
+        self.assertEqual(tiles[0].dtype, np.uint8)
+        self.assertLessEqual(row[0], 1)
+        self.assertGreaterEqual(row[-1], 254)
+        # Intensity order is preserved across the full 8-bit range
+        self.assertTrue(np.all(np.diff(row.astype(int)) >= 0))
+        self.assertGreater(len(np.unique(row)), 200)
+
+    def test_tiles_are_clamped_to_fixed_size_graph(self):
+        onnx_model = MagicMock(input_hw=(320, 320))
+        tile_shapes = []
+
+        def fake_batch(model_name, model, device, tiles):
+            tile_shapes.extend(tile.shape for tile in tiles)
+            return [torch.zeros((0, 6)) for _ in tiles]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            raster = str(Path(tmp) / "ortho.tif")
+            self._write_raster(raster, width=700, height=700)
+            with patch("yolowebapp2.predict_tree.get_model", return_value=onnx_model), \
+                 patch("yolowebapp2.predict_tree.get_device",
+                       return_value=torch.device("cpu")), \
+                 patch("yolowebapp2.predict_tree._infer_tile_batch",
+                       side_effect=fake_batch):
+                predict_tree.predict_tiled("agac.pt", raster, tile_size=640, overlap=128)
+
+        self.assertTrue(tile_shapes)
+        self.assertEqual(set(tile_shapes), {(3, 320, 320)})
+
+    @override_settings(INFERENCE_BATCHING_ENABLED=True)
+    def test_tile_batches_go_through_micro_batcher(self):
+        batcher = MagicMock()
+        batcher.submit.side_effect = lambda t: MagicMock(
+            result=MagicMock(return_value=torch.zeros((1, 10, 6)))
+        )
+        model = MagicMock()
+        tiles = [np.zeros((3, 64, 64), dtype=np.uint8) for _ in range(3)]
+        with patch("yolowebapp2.predict_tree.get_batcher", return_value=batcher):
+            predict_tree._infer_tile_batch("agac.pt", model, torch.device("cpu"), tiles)
+
+        self.assertEqual(batcher.submit.call_count, 3)
+        model.assert_not_called()
@@ -422,7 +422,10 @@ def maping(request: HttpRequest, id: int) -> HttpResponse:
                 },
             )
 
-        health_color = request.POST.get("health_color", "")
+        # Several index layers may be requested at once; they are rendered
+        # together in a single pass over the orthophoto
+        health_colors = request.POST.getlist("health_color")
+        health_color = health_colors[0] if health_colors else ""
         cmap = request.POST.get("cmap", "")
 
         if health_color == "detect":
@@ -482,7 +485,7 @@ def maping(request: HttpRequest, id: int) -> HttpResponse:
                     },
                 )
 
-        elif health_color in HEALTH_ALGORITHMS:
+        elif health_colors and all(name in HEALTH_ALGORITHMS for name in health_colors):
             try:
                 orthophoto_path = f'{BASE_DIR}/static/{orthophoto["odm_orthophoto"]}'
 
@@ -504,13 +507,15 @@ def maping(request: HttpRequest, id: int) -> HttpResponse:
                     )
 
                 health_algorithm = hs.algos(orthophoto_path, projes.hashing_path)
-                method = getattr(health_algorithm, HEALTH_ALGORITHMS[health_color])
-                result = method(post_range, cmap)
+                layers = health_algorithm.process_indices(
+                    [hs.index_spec(name, post_range, cmap) for name in health_colors]
+                )
                 return render(
                     request,
                     "map.html",
                     {
-                        "orthophoto": result,
+                        "orthophoto": layers[0],
+                        "layers": dict(zip(health_colors, layers)),
                         "algo": algo,
                         "colors": colors,
                         "static": static,
@@ -518,8 +523,8 @@ def maping(request: HttpRequest, id: int) -> HttpResponse:
                     },
                 )
 
-            except AttributeError as e:
-                logger.error("Algoritma metodu bulunamadı: %s: %s", health_color, e)
+            except KeyError as e:
+                logger.error("Algoritma bulunamadı: %s: %s", health_colors, e)
                 return render(
                     request,
                     "map.html",
@@ -534,7 +539,7 @@ def maping(request: HttpRequest, id: int) -> HttpResponse:
                     },
                 )
             except Exception as e:
-                logger.error("Sağlık algoritması hatası: %s: %s", health_color, e)
+                logger.error("Sağlık algoritması hatası: %s: %s", health_colors, e)
                 return render(
                     request,
                     "map.html",
@@ -595,4 +600,6 @@ def odm_status(request, project_id: int) -> JsonResponse:
         "odm_task_id": project.odm_task_id,
         "odm_error": project.odm_error,
         "ready": project.odm_status == Projects.ODM_COMPLETED,
+        "analysis_status": project.analysis_status,
+        "analysis_progress": project.analysis_progress,
     })
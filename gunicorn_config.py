@@ -1,5 +1,6 @@
 import multiprocessing
 import os
+import sys
 
 # Server socket
 bind = "0.0.0.0:8000"
@@ -10,6 +11,10 @@ workers = min(
     4, multiprocessing.cpu_count()
 )  # Limit to 4 workers max for GPU/ML models
 worker_class = "gevent"  # Use gevent for better concurrency with I/O-bound ML tasks
+
+# Micro-batching groups the concurrent requests of a web worker; it stays off
+# elsewhere (same variable as settings.INFERENCE_BATCHING_ENABLED)
+os.environ.setdefault("INFERENCE_BATCHING_ENABLED", "True")
 threads = 2  # Threads per worker for parallel request handling
 worker_connections = 1000
 max_requests = 500  # Restart workers after 500 requests to prevent memory leaks
@@ -22,6 +27,23 @@ keepalive = 5
 # Memory management - Use RAM disk for temp files (faster I/O)
 worker_tmp_dir = "/dev/shm" if os.path.exists("/dev/shm") else None
 
+# Shared model weights: load the app, and with it the hot models, in the
+# master so workers share the weight pages copy-on-write (CPU nodes only)
+preload_app = os.environ.get("MODEL_SHARED_PRELOAD", "False") == "True"
+
+# gevent workers patch the standard library only after they are forked. With
+# preload_app the master imports Django, torch and predict_tree first, and the
+# workers would inherit locks created unpatched, which cannot exclude
+# greenlets. Patch the master before the app is loaded.
+if preload_app and worker_class == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# Warm up the hot models in every worker before it accepts requests
+# (same variable as settings.MODEL_WARMUP_ENABLED)
+warm_up_workers = os.environ.get("MODEL_WARMUP_ENABLED", "True") == "True"
+
 # Graceful timeout
 graceful_timeout = 30
 
@@ -42,6 +64,17 @@ group = None
 tmp_upload_dir = None
 
 
+def _stdlib_patched():
+    """Whether locks created in the master are safe to hand to the workers."""
+    if worker_class != "gevent":
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
 # Worker lifecycle hooks for memory monitoring
 def on_starting(server):
     """Called just before the master process is initialized."""
@@ -57,12 +90,60 @@ def when_ready(server):
     """Called just after the server is started."""
     server.log.info("Gunicorn server is ready. Workers: %s", workers)
 
+    if preload_app:
+        if not _stdlib_patched():
+            server.log.warning(
+                "Shared model preload skipped: the gevent master is not monkey-patched"
+            )
+            return
+        try:
+            from yolowebapp2.predict_tree import preload_shared_models
+
+            loaded = preload_shared_models()
+            server.log.info("Preloaded shared models: %s", loaded)
+        except Exception as e:
+            server.log.warning("Shared model preload failed: %s", e)
+
 
 def post_fork(server, worker):
     """Called just after a worker has been forked."""
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 
+def post_worker_init(worker):
+    """Called after the worker is initialized, i.e. after gevent monkey-patching.
+
+    Django, torch and predict_tree create locks and threads at import time,
+    so they must not be imported before the worker has patched them.
+    """
+    if not warm_up_workers:
+        return
+
+    # Preload and warm up hot models before the worker accepts requests
+    try:
+        import django
+
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yolowebapp2.settings")
+        django.setup()
+
+        from yolowebapp2.predict_tree import warm_up_models
+
+        warmed = warm_up_models()
+        worker.log.info("Worker %s warmed up models: %s", worker.pid, warmed)
+    except Exception as e:
+        worker.log.warning("Model warm-up failed (pid: %s): %s", worker.pid, e)
+
+
+def worker_exit(server, worker):
+    """Called just after a worker has exited, in the worker process."""
+    if "detection.cache_utils" not in sys.modules:
+        return
+    try:
+        sys.modules["detection.cache_utils"].flush_prediction_stats()
+    except Exception as e:
+        server.log.warning("Cache statistics flush failed (pid: %s): %s", worker.pid, e)
+
+
 def worker_int(worker):
     """Called just after a worker exited on SIGINT or SIGQUIT."""
     worker.log.info("Worker received INT or QUIT signal")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark batched vs per-image non_max_suppression.
+
+Usage: python scripts/bench_nms.py [--device cuda] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "detection" / "yolo"))
+
+from utils.general import (  # noqa: E402
+    _non_max_suppression_per_image,
+    non_max_suppression,
+)
+
+
+def make_prediction(bs, anchors, nc, candidates, device):
+    """Random raw output with roughly ``candidates`` boxes above 0.1 per image."""
+    pred = torch.rand((bs, anchors, 5 + nc), device=device)
+    pred[..., :2] *= 640
+    pred[..., 2:4] = pred[..., 2:4] * 60 + 4
+    pred[..., 4] *= 0.1
+    pred[:, :candidates, 4] += 0.1
+    return pred
+
+
+def timeit(fn, pred, repeat, device):
+    fn(pred.clone(), 0.1, 0.45)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(pred.clone(), 0.1, 0.45)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - started) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--anchors", type=int, default=25200)
+    parser.add_argument("--nc", type=int, default=1)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    print(f"{'batch':>5} {'cands':>6} {'per-image ms':>13} {'batched ms':>11} {'speedup':>8}")
+    for bs in (1, 4, 8, 16):
+        for candidates in (10, 300, 3000):
+            pred = make_prediction(bs, args.anchors, args.nc, candidates, device)
+            ref = timeit(_non_max_suppression_per_image, pred, args.repeat, device)
+            new = timeit(non_max_suppression, pred, args.repeat, device)
+            print(f"{bs:>5} {candidates:>6} {ref:>13.2f} {new:>11.2f} {ref / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
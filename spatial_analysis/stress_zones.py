@@ -8,6 +8,8 @@ import rasterio
 from pyproj import Geod, Transformer
 from rasterio import features, windows
 
+from yolowebapp2 import raster_io
+
 from .config import NDVI_HIGH, NDVI_LOW, MIN_ZONE_AREA_HA
 
 
@@ -73,14 +75,6 @@ def _reproject_geom_to_wgs84(
     return geom
 
 
-def _iter_windows(width: int, height: int, tile_size: int = 1024):
-    for row_off in range(0, height, tile_size):
-        win_h = min(tile_size, height - row_off)
-        for col_off in range(0, width, tile_size):
-            win_w = min(tile_size, width - col_off)
-            yield windows.Window(col_off, row_off, win_w, win_h)
-
-
 def generate_stress_zones(
     ndvi_path: str,
     low_threshold: float | None = None,
@@ -107,8 +101,8 @@ def generate_stress_zones(
         else:
             transformer = None
 
-        for window in _iter_windows(src.width, src.height):
-            ndvi_block = src.read(1, window=window).astype("float32")
+        for window, bands in raster_io.iter_windows(src, [1]):
+            ndvi_block = bands[0]
             classified_block = _classify_ndvi(ndvi_block, low, high)
             block_transform = windows.transform(window, src.transform)
 
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import hmac
 import logging
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status, serializers
+from django.conf import settings
 from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
+from yolowebapp2.batching import get_batching_stats
+from yolowebapp2.metrics import render_prometheus
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,6 +21,7 @@ class HealthCheckResponseSerializer(serializers.Serializer):
     status = serializers.CharField()
     version = serializers.CharField()
     database = serializers.CharField()
+    inference_batching = serializers.DictField(required=False)
 
 
 @extend_schema(
@@ -35,6 +43,7 @@ def health_check(request):
     health_status = {
         "status": "ok",
         "version": "2.0.0",
+        "inference_batching": get_batching_stats(),
     }
 
     try:
@@ -48,3 +57,23 @@ def health_check(request):
         return Response(health_status, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     return Response(health_status, status=status.HTTP_200_OK)
+
+
+def _metrics_allowed(request) -> bool:
+    """Staff users, or a scraper presenting ``Authorization: Bearer <METRICS_TOKEN>``."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    token = getattr(settings, "METRICS_TOKEN", "")
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+
+@require_GET
+def metrics(request):
+    """Per-stage inference latency histograms in the Prometheus text format."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of fused and traced YOLO models.
+
+``attempt_load`` fuses Conv+BN layers on every load, and tracing takes
+several more seconds. The result only depends on the weights, the input size,
+the device and the torch version, so it is stored once under a key derived
+from those and loaded directly by every later worker.
+
+An artifact is two files sharing the key: ``<key>.ts`` holds the TorchScript
+backbone and ``<key>.pt`` the eager detection head plus model metadata. The
+head stays eager so the anchor grid follows the input shape, exactly as in
+``TracedModel``. Files are written under a per-process temporary name and
+renamed into place, so concurrent workers never read a half-written artifact.
+"""
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256, so unchanged weights are hashed once per process
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str | Path) -> str:
+    """SHA256 of a file, memoized on its size and modification time."""
+    stat = os.stat(path)
+    memo_key = (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                sha.update(chunk)
+        digest = _digests[memo_key] = sha.hexdigest()
+    return digest
+
+
+def artifact_key(weights_path: str | Path, img_size: int, device: torch.device) -> str:
+    """Cache key for the compiled form of ``weights_path``."""
+    parts = [
+        file_sha256(weights_path),
+        str(img_size),
+        torch.device(device).type,
+        torch.__version__,
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class CompiledModel(nn.Module):
+    """TorchScript backbone followed by the eager detection head.
+
+    Same call contract as the model returned by ``attempt_load``.
+    """
+
+    def __init__(
+        self, backbone: Any, detect_layer: nn.Module, stride: Any, names: Any
+    ):
+        super().__init__()
+        self.model = backbone
+        self.detect_layer = detect_layer
+        self.stride = stride
+        self.names = names
+
+    def forward(self, x: torch.Tensor) -> Any:
+        return self.detect_layer(self.model(x))
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(str(tmp_path))
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _compile(weights_path: Path, img_size: int, attempt_load: Any) -> CompiledModel:
+    from utils.torch_utils import TracedModel
+
+    model = attempt_load(str(weights_path), map_location="cpu")
+    traced = TracedModel(model, torch.device("cpu"), img_size, save_path=None)
+    return CompiledModel(traced.model, traced.detect_layer, traced.stride, traced.names)
+
+
+def load_compiled_model(
+    weights_path: str | Path,
+    device: torch.device,
+    img_size: int,
+    cache_dir: str | Path,
+    attempt_load: Any,
+) -> CompiledModel:
+    """
+    Return the fused, traced model for ``weights_path``, building it on a miss.
+
+    Args:
+        weights_path: ``.pt`` weights file
+        device: Target device
+        img_size: Tracing input size
+        cache_dir: Directory holding the artifacts
+        attempt_load: Loader used to build the fused eager model on a miss
+
+    Returns:
+        Model in eval mode on ``device``
+    """
+    weights_path = Path(weights_path)
+    cache_dir = Path(cache_dir)
+    key = artifact_key(weights_path, img_size, device)
+    script_path = cache_dir / f"{key}.ts"
+    head_path = cache_dir / f"{key}.pt"
+
+    if script_path.exists() and head_path.exists():
+        logger.info(
+            "Derlenmiş model önbellekten yükleniyor: %s (%s)", weights_path, key[:12]
+        )
+        backbone = torch.jit.load(str(script_path), map_location=device)
+        head = torch.load(str(head_path), map_location=device, weights_only=False)
+        model = CompiledModel(
+            backbone, head["detect_layer"], head["stride"], head["names"]
+        )
+        return model.to(device).eval()
+
+    logger.info("Model derleniyor (füzyon + iz): %s (%s)", weights_path, key[:12])
+    model = _compile(weights_path, img_size, attempt_load)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        head = {
+            "detect_layer": model.detect_layer,
+            "stride": model.stride,
+            "names": model.names,
+            "weights": weights_path.name,
+        }
+        # Head first: a reader only trusts the artifact once the script exists
+        _atomic_write(head_path, lambda p: torch.save(head, p))
+        _atomic_write(script_path, lambda p: torch.jit.save(model.model, p))
+    except Exception as e:
+        logger.warning("Derlenmiş model önbelleğe yazılamadı %s: %s", weights_path, e)
+
+    return model.to(device).eval()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent callers submit preprocessed image tensors for the same weights
+file; a per-model worker thread collects them until either the maximum batch
+size or the latency deadline is reached, runs one forward pass per input
+shape and hands every caller its own slice of the output.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Request:
+    tensor: torch.Tensor
+    future: Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BatchStats:
+    """Thread-safe counters for batch fill rate and queue wait."""
+
+    def __init__(self, max_batch_size: int):
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.forward_passes = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, waits_ms: List[float], forward_passes: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += len(waits_ms)
+            self.forward_passes += forward_passes
+            self.total_wait_ms += sum(waits_ms)
+            self.max_wait_ms = max(self.max_wait_ms, max(waits_ms, default=0.0))
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            fill_rate = (
+                self.items / (self.batches * self.max_batch_size)
+                if self.batches
+                else 0.0
+            )
+            avg_wait = self.total_wait_ms / self.items if self.items else 0.0
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "forward_passes": self.forward_passes,
+                "avg_batch_size": round(self.items / self.batches, 2)
+                if self.batches
+                else 0.0,
+                "fill_rate": round(fill_rate, 4),
+                "avg_queue_wait_ms": round(avg_wait, 3),
+                "max_queue_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+
+class MicroBatcher:
+    """
+    Queue-backed batching front-end for a single model.
+
+    Args:
+        forward: Callable taking a batched tensor and returning the raw
+            prediction tensor with the batch on dim 0
+        name: Label used in logs and statistics
+        max_batch_size: Flush as soon as this many requests are queued
+        max_wait_ms: Flush at the latest this long after the oldest request
+    """
+
+    def __init__(
+        self,
+        forward: Callable[[torch.Tensor], torch.Tensor],
+        name: str,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+    ):
+        self.forward = forward
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats = BatchStats(self.max_batch_size)
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"batcher-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, tensor: torch.Tensor) -> Future:
+        """Queue a single ``(1, C, H, W)`` tensor and return its future."""
+        if tensor.ndimension() == 3:
+            tensor = tensor.unsqueeze(0)
+        request = _Request(tensor=tensor, future=Future())
+        self._queue.put(request)
+        return request.future
+
+    def infer(self, tensor: torch.Tensor, timeout: float | None = None) -> Any:
+        """Blocking helper: submit and wait for this request's prediction."""
+        return self.submit(tensor).result(timeout=timeout)
+
+    def _collect(self) -> List[_Request]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Callers that gave up waiting cancel their futures; skip those
+            batch = [
+                r for r in self._collect() if r.future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            started = time.monotonic()
+            waits_ms = [(started - r.enqueued_at) * 1000.0 for r in batch]
+
+            # Letterboxed images may differ in shape; one forward per shape
+            groups: Dict[Tuple[int, ...], List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(tuple(request.tensor.shape[1:]), []).append(
+                    request
+                )
+
+            for requests in groups.values():
+                try:
+                    with torch.no_grad():
+                        pred = self.forward(torch.cat([r.tensor for r in requests]))
+                    for i, request in enumerate(requests):
+                        request.future.set_result(pred[i : i + 1])
+                except Exception as e:
+                    logger.error("Toplu çıkarım hatası (%s): %s", self.name, e)
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+            self.stats.record(waits_ms, len(groups))
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+_batchers_pid = os.getpid()
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(
+    key: str,
+    forward: Callable[[torch.Tensor], torch.Tensor],
+    max_batch_size: int = 8,
+    max_wait_ms: float = 10.0,
+) -> MicroBatcher:
+    """Return the process-wide batcher for ``key``, creating it on first use.
+
+    Worker threads do not survive ``fork``, so batchers inherited from a
+    parent process are discarded and rebuilt in the child.
+    """
+    global _batchers_pid
+    with _batchers_lock:
+        if _batchers_pid != os.getpid():
+            _batchers.clear()
+            _batchers_pid = os.getpid()
+        if key not in _batchers:
+            _batchers[key] = MicroBatcher(
+                forward,
+                name=key,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+            )
+        return _batchers[key]
+
+
+def get_batching_stats() -> Dict[str, Dict[str, float]]:
+    """Return fill rate and queue-wait statistics for every active batcher."""
+    with _batchers_lock:
+        return {key: b.stats.snapshot() for key, b in _batchers.items()}
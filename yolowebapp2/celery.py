@@ -8,6 +8,12 @@ to work with Django settings.
 import os
 
 from celery import Celery
+from celery.signals import (
+    task_postrun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 
 # Set default Django settings module for Celery
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yolowebapp2.settings")
@@ -22,3 +28,38 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Auto-discover tasks from all registered Django apps
 # This will automatically find tasks.py files in each app
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def preload_worker_models(**kwargs):
+    """Load hot models in the main process before the pool forks children."""
+    from django.conf import settings
+
+    if not getattr(settings, "MODEL_SHARED_PRELOAD", False):
+        return
+
+    from yolowebapp2.predict_tree import preload_shared_models
+
+    preload_shared_models()
+
+
+@worker_process_init.connect
+def warm_up_worker_models(**kwargs):
+    """Preload hot models in every freshly forked worker process."""
+    from django.conf import settings
+
+    if not getattr(settings, "MODEL_WARMUP_ENABLED", True):
+        return
+
+    from yolowebapp2.predict_tree import warm_up_models
+
+    warm_up_models()
+
+
+@task_postrun.connect
+@worker_process_shutdown.connect
+def flush_worker_prediction_stats(**kwargs):
+    """Write buffered prediction cache statistics before they can be lost."""
+    from detection.cache_utils import flush_prediction_stats
+
+    flush_prediction_stats()
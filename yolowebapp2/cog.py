@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Cloud-Optimized GeoTIFF (COG) output.
+
+The map viewer reads rasters with HTTP range requests. A COG keeps the
+raster in compressed 512x512 tiles with its overviews stored ahead of the
+full-resolution data, so a zoomed-out view reads a few small overview tiles
+instead of the whole file.
+
+Rasters are rendered to a plain tiled GeoTIFF first and then copied through
+GDAL's COG driver, which builds the overviews and lays the file out.
+"""
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+import rasterio
+import rasterio.shutil
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BLOCKSIZE = 512
+
+# Overview resampling. Index rasters hold colormap entries, which must not be
+# averaged (and GDAL averages paletted rasters very slowly); imagery is
+# averaged for smooth zoomed-out views.
+INDEX_RESAMPLING = "NEAREST"
+IMAGERY_RESAMPLING = "AVERAGE"
+
+
+def cog_options(resampling: str = INDEX_RESAMPLING) -> Dict[str, Any]:
+    """Creation options of the COG driver for every raster written here."""
+    return {
+        "BLOCKSIZE": BLOCKSIZE,
+        "COMPRESS": getattr(settings, "COG_COMPRESS", "DEFLATE"),
+        # Horizontal differencing; shrinks smooth imagery and index rasters
+        "PREDICTOR": "YES",
+        "OVERVIEW_RESAMPLING": resampling,
+        "BIGTIFF": "IF_SAFER",
+        "NUM_THREADS": "ALL_CPUS",
+    }
+
+
+def write_cog(
+    src_path: str | Path, dst_path: str | Path, resampling: str = INDEX_RESAMPLING
+) -> None:
+    """Copy ``src_path`` to ``dst_path`` as a COG with overviews."""
+    rasterio.shutil.copy(
+        str(src_path), str(dst_path), driver="COG", **cog_options(resampling)
+    )
+
+
+def is_cog(path: str | Path) -> bool:
+    """Whether ``path`` was written with the COG layout."""
+    with rasterio.open(str(path)) as src:
+        return src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT", "").upper() == "COG"
+
+
+def convert_in_place(path: str | Path, resampling: str = INDEX_RESAMPLING) -> bool:
+    """
+    Rewrite an existing GeoTIFF as a COG, atomically.
+
+    Args:
+        path: GeoTIFF to convert
+        resampling: Overview resampling; IMAGERY_RESAMPLING for orthophotos
+
+    Returns:
+        bool: True if the file was rewritten, False if it already was a COG
+    """
+    path = Path(path)
+    if is_cog(path):
+        return False
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.cog.tmp.tif")
+    try:
+        write_cog(path, tmp_path, resampling)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    logger.info("COG biçimine dönüştürüldü: %s", path)
+    return True
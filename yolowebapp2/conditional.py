@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional GET support for API endpoints with expensive bodies.
+
+A view derives a validator from the version of the data behind the response
+(the analysis artifact it serves, or the newest row of a table) before doing
+any work. :func:`not_modified` answers ``If-None-Match`` /
+``If-Modified-Since`` with a bodiless 304, so an unchanged result is neither
+recomputed nor serialized; otherwise the view builds its response and tags
+it with :func:`add_validators`.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Per-user data: clients may keep a copy but must revalidate before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag value (quoted) over the JSON form of ``parts``."""
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _timestamp(last_modified: Optional[datetime]) -> Optional[int]:
+    if last_modified is None:
+        return None
+    return int(last_modified.timestamp())
+
+
+def add_validators(
+    response: HttpResponse, etag: str, last_modified: Optional[datetime] = None
+) -> HttpResponse:
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(_timestamp(last_modified))
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def not_modified(
+    request, etag: str, last_modified: Optional[datetime] = None
+) -> Optional[HttpResponse]:
+    """
+    The 304 response for ``request`` if the client's copy is still current.
+
+    Args:
+        request: Incoming GET/HEAD request
+        etag: Validator of the current representation, from :func:`make_etag`
+        last_modified: Modification time of the underlying data, if known
+
+    Returns:
+        HttpResponse or None: 304 response carrying the validators, or None if
+        the view has to build the full response
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=_timestamp(last_modified)
+    )
+    if response is None:
+        return None
+    return add_validators(response, etag, last_modified)
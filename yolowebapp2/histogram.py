@@ -3,16 +3,35 @@
 Vegetation Index Calculator for Remote Sensing
 Implements 24 vegetation indices with optimized class-based architecture
 """
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import numpy as np
 import rasterio
+from django.conf import settings
 from rio_tiler.colormap import cmap
 from rio_tiler.io import Reader
 from rio_tiler.utils import linear_rescale
 
+from yolowebapp2 import cog, raster_io, raster_store
+
 # Suppress numpy warnings for division by zero and invalid values
 np.seterr(divide="ignore", invalid="ignore")
 
@@ -29,13 +48,140 @@ def get_zoom(raster_path: str) -> Dict[str, int]:
     return {"minzoom": minzoom, "maxzoom": maxzoom, "band_count": band_count}
 
 
+# Band number of each band name in the orthophoto
+BAND_NUMBERS: Dict[str, int] = {"red": 1, "green": 2, "blue": 3, "nir": 4}
+
+
+class ScratchPool:
+    """
+    Free list of float32 window buffers, keyed by shape.
+
+    One pool serves all windows rendered by a thread, so after the first
+    window every band, term and temporary reuses an existing buffer.
+    """
+
+    def __init__(self) -> None:
+        self._free: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+
+    def take(self, shape: Tuple[int, ...]) -> np.ndarray:
+        free = self._free.get(shape)
+        if free:
+            return free.pop()
+        return np.empty(shape, dtype=np.float32)
+
+    def give(self, buffers: Iterable[np.ndarray]) -> None:
+        for buffer in buffers:
+            self._free.setdefault(buffer.shape, []).append(buffer)
+
+
+class BandWindow:
+    """
+    Float32 bands of one raster window and the terms indices have in common.
+
+    Every term is computed on first use and then shared by all indices
+    evaluated on the same window, e.g. ``nir_minus_red`` serves NDVI, SAVI,
+    OSAVI, RDVI, TDVI and EVI. Terms and temporaries live in buffers taken
+    from a :class:`ScratchPool`; :meth:`release` hands them back once the
+    window is done, after which neither the window nor its results may be
+    used. Bands that no index needs are None.
+    """
+
+    def __init__(
+        self,
+        red: Optional[np.ndarray] = None,
+        green: Optional[np.ndarray] = None,
+        blue: Optional[np.ndarray] = None,
+        nir: Optional[np.ndarray] = None,
+        pool: Optional[ScratchPool] = None,
+    ):
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.nir = nir
+        self.shape = next(b.shape for b in (red, green, blue, nir) if b is not None)
+        self._pool = pool or ScratchPool()
+        self._taken: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def read(
+        cls, src: Any, window: Any, bands: Sequence[str], pool: ScratchPool
+    ) -> "BandWindow":
+        """Read ``bands`` of ``window`` as float32 in one call, into a pooled buffer."""
+        stack = pool.take((len(bands), int(window.height), int(window.width)))
+        raster_io.read_bands(src, window, [BAND_NUMBERS[name] for name in bands], stack)
+        terms = cls(pool=pool, **dict(zip(bands, stack)))
+        terms._taken[id(stack)] = stack
+        return terms
+
+    def scratch(self) -> np.ndarray:
+        """An uninitialized float32 buffer of the window's shape."""
+        buffer = self._pool.take(self.shape)
+        self._taken[id(buffer)] = buffer
+        return buffer
+
+    def free(self, buffer: np.ndarray) -> None:
+        """Return a temporary to the pool before the window is released."""
+        self._pool.give([self._taken.pop(id(buffer))])
+
+    def release(self) -> None:
+        self._pool.give(self._taken.values())
+        self._taken = {}
+
+    @cached_property
+    def nir_plus_red(self) -> np.ndarray:
+        return np.add(self.nir, self.red, out=self.scratch())
+
+    @cached_property
+    def nir_minus_red(self) -> np.ndarray:
+        return np.subtract(self.nir, self.red, out=self.scratch())
+
+    @cached_property
+    def nir_plus_green(self) -> np.ndarray:
+        return np.add(self.nir, self.green, out=self.scratch())
+
+    @cached_property
+    def green_plus_red(self) -> np.ndarray:
+        return np.add(self.green, self.red, out=self.scratch())
+
+    @cached_property
+    def green_minus_red(self) -> np.ndarray:
+        return np.subtract(self.green, self.red, out=self.scratch())
+
+    @cached_property
+    def nir_squared(self) -> np.ndarray:
+        return np.square(self.nir, out=self.scratch())
+
+    @cached_property
+    def nir_over_red(self) -> np.ndarray:
+        return np.divide(self.nir, self.red, out=self.scratch())
+
+    @cached_property
+    def evi(self) -> np.ndarray:
+        """2.5 * (NIR - R) / (NIR + 6*R - 7.5*B + 1)"""
+        denominator = np.multiply(self.red, 6, out=self.scratch())
+        np.add(self.nir, denominator, out=denominator)
+        tmp = np.multiply(self.blue, 7.5, out=self.scratch())
+        np.subtract(denominator, tmp, out=denominator)
+        np.add(denominator, 1, out=denominator)
+        np.multiply(self.nir_minus_red, 2.5, out=tmp)
+        np.divide(tmp, denominator, out=tmp)
+        self.free(denominator)
+        return tmp
+
+
 class VegetationIndex(ABC):
     """
     Abstract base class for vegetation indices.
 
-    All vegetation index implementations must subclass this and implement calculate().
+    All vegetation index implementations must subclass this, list the bands
+    they use in ``BANDS`` and implement calculate(). calculate() evaluates
+    the formula with in-place ufuncs into ``out`` (or a scratch buffer of the
+    window), in the same operation order as the written formula, so the
+    result matches the plain numpy expression bit for bit.
     """
 
+    BANDS: Tuple[str, ...] = ("red", "green", "blue", "nir")
+
     def __init__(
         self, red: np.ndarray, green: np.ndarray, blue: np.ndarray, nir: np.ndarray
     ):
@@ -48,13 +194,30 @@ class VegetationIndex(ABC):
             blue: Blue band as float32 array
             nir: NIR band as float32 array
         """
-        self.red = red.astype(np.float32)
-        self.green = green.astype(np.float32)
-        self.blue = blue.astype(np.float32)
-        self.nir = nir.astype(np.float32)
+        self.red = np.asarray(red, dtype=np.float32)
+        self.green = np.asarray(green, dtype=np.float32)
+        self.blue = np.asarray(blue, dtype=np.float32)
+        self.nir = np.asarray(nir, dtype=np.float32)
+        self.terms = BandWindow(self.red, self.green, self.blue, self.nir)
+
+    @classmethod
+    def from_window(cls, terms: BandWindow) -> "VegetationIndex":
+        """Index over a window whose bands (and terms) are shared with other indices."""
+        index = cls.__new__(cls)
+        index.red, index.green, index.blue, index.nir = (
+            terms.red,
+            terms.green,
+            terms.blue,
+            terms.nir,
+        )
+        index.terms = terms
+        return index
+
+    def _out(self, out: Optional[np.ndarray]) -> np.ndarray:
+        return self.terms.scratch() if out is None else out
 
     @abstractmethod
-    def calculate(self) -> np.ndarray:
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
         """Calculate the vegetation index. Must be implemented by subclasses."""
         pass
 
@@ -71,189 +234,297 @@ class VegetationIndex(ABC):
 class NDVI(VegetationIndex):
     """Normalized Difference Vegetation Index: (NIR - R) / (NIR + R)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.red) / (self.nir + self.red)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.divide(self.terms.nir_minus_red, self.terms.nir_plus_red, out=self._out(out))
 
 
 class VARI(VegetationIndex):
     """Visible Atmospherically Resistant Index: (G - R) / (G + R - B)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.green - self.red) / (self.green + self.red - self.blue)
+    BANDS = ("red", "green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.terms.green_plus_red, self.blue, out=self._out(out))
+        return np.divide(self.terms.green_minus_red, out, out=out)
 
 
 class GLI(VegetationIndex):
     """Green Leaf Index: ((G * 2) - R - B) / ((G * 2) + R + B)"""
 
-    def calculate(self) -> np.ndarray:
-        return ((self.green * 2) - self.red - self.blue) / (
-            (self.green * 2) + self.red + self.blue
-        )
+    BANDS = ("red", "green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.multiply(self.green, 2, out=self._out(out))
+        np.subtract(out, self.red, out=out)
+        np.subtract(out, self.blue, out=out)
+        denominator = np.multiply(self.green, 2, out=self.terms.scratch())
+        np.add(denominator, self.red, out=denominator)
+        np.add(denominator, self.blue, out=denominator)
+        np.divide(out, denominator, out=out)
+        self.terms.free(denominator)
+        return out
 
 
 class NDYI(VegetationIndex):
     """Normalized Difference Yellowness Index: (G - B) / (G + B)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.green - self.blue) / (self.green + self.blue)
+    BANDS = ("green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.green, self.blue, out=self._out(out))
+        denominator = np.add(self.green, self.blue, out=self.terms.scratch())
+        np.divide(out, denominator, out=out)
+        self.terms.free(denominator)
+        return out
 
 
 class NDRE(VegetationIndex):
     """Normalized Difference Red Edge: (NIR - R) / (NIR + R)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.red) / (self.nir + self.red)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.divide(self.terms.nir_minus_red, self.terms.nir_plus_red, out=self._out(out))
 
 
 class NDWI(VegetationIndex):
     """Normalized Difference Water Index: (G - NIR) / (NIR + G)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.green - self.nir) / (self.nir + self.green)
+    BANDS = ("green", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.green, self.nir, out=self._out(out))
+        return np.divide(out, self.terms.nir_plus_green, out=out)
 
 
 class NDVI_Blue(VegetationIndex):
     """NDVI using Blue band: (NIR - B) / (NIR + B)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.blue) / (self.nir + self.blue)
+    BANDS = ("blue", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.nir, self.blue, out=self._out(out))
+        denominator = np.add(self.nir, self.blue, out=self.terms.scratch())
+        np.divide(out, denominator, out=out)
+        self.terms.free(denominator)
+        return out
 
 
 class ENDVI(VegetationIndex):
     """Enhanced NDVI: ((NIR + G) - (2 * B)) / ((NIR + G) + (2 * B))"""
 
-    def calculate(self) -> np.ndarray:
-        return ((self.nir + self.green) - (2 * self.blue)) / (
-            (self.nir + self.green) + (2 * self.blue)
-        )
+    BANDS = ("green", "blue", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        two_blue = np.multiply(self.blue, 2, out=self.terms.scratch())
+        out = np.subtract(self.terms.nir_plus_green, two_blue, out=self._out(out))
+        np.add(self.terms.nir_plus_green, two_blue, out=two_blue)
+        np.divide(out, two_blue, out=out)
+        self.terms.free(two_blue)
+        return out
 
 
 class VNDVI(VegetationIndex):
     """Visible NDVI: 0.5268*((R ** -0.1294) * (G ** 0.3389) * (B ** -0.3118))"""
 
-    def calculate(self) -> np.ndarray:
-        return 0.5268 * (
-            (self.red**-0.1294) * (self.green**0.3389) * (self.blue**-0.3118)
-        )
+    BANDS = ("red", "green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.power(self.red, -0.1294, out=self._out(out))
+        tmp = np.power(self.green, 0.3389, out=self.terms.scratch())
+        np.multiply(out, tmp, out=out)
+        np.power(self.blue, -0.3118, out=tmp)
+        np.multiply(out, tmp, out=out)
+        np.multiply(out, 0.5268, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class MPRI(VegetationIndex):
     """Modified Photochemical Reflectance Index: (G - R) / (G + R)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.green - self.red) / (self.green + self.red)
+    BANDS = ("red", "green")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.divide(
+            self.terms.green_minus_red, self.terms.green_plus_red, out=self._out(out)
+        )
 
 
 class EXG(VegetationIndex):
     """Excess Green Index: (2 * G) - (R + B)"""
 
-    def calculate(self) -> np.ndarray:
-        return (2 * self.green) - (self.red + self.blue)
+    BANDS = ("red", "green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.multiply(self.green, 2, out=self._out(out))
+        tmp = np.add(self.red, self.blue, out=self.terms.scratch())
+        np.subtract(out, tmp, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class TGI(VegetationIndex):
     """Triangular Greenness Index: (G - 0.39) * (R - 0.61) * B"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.green - 0.39) * (self.red - 0.61) * self.blue
+    BANDS = ("red", "green", "blue")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.green, 0.39, out=self._out(out))
+        tmp = np.subtract(self.red, 0.61, out=self.terms.scratch())
+        np.multiply(out, tmp, out=out)
+        np.multiply(out, self.blue, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class BAI(VegetationIndex):
     """Burn Area Index: 1.0 / (((0.1 - R) ** 2) + ((0.06 - NIR) ** 2))"""
 
-    def calculate(self) -> np.ndarray:
-        return 1.0 / (((0.1 - self.red) ** 2) + ((0.06 - self.nir) ** 2))
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(0.1, self.red, out=self._out(out))
+        np.square(out, out=out)
+        tmp = np.subtract(0.06, self.nir, out=self.terms.scratch())
+        np.square(tmp, out=tmp)
+        np.add(out, tmp, out=out)
+        np.divide(1.0, out, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class GNDVI(VegetationIndex):
     """Green NDVI: (NIR - G) / (NIR + G)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.green) / (self.nir + self.green)
+    BANDS = ("green", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.nir, self.green, out=self._out(out))
+        return np.divide(out, self.terms.nir_plus_green, out=out)
 
 
 class GRVI(VegetationIndex):
     """Green Ratio Vegetation Index: NIR / G"""
 
-    def calculate(self) -> np.ndarray:
-        return self.nir / self.green
+    BANDS = ("green", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.divide(self.nir, self.green, out=self._out(out))
 
 
 class SAVI(VegetationIndex):
     """Soil Adjusted Vegetation Index: (1.5 * (NIR - R)) / (NIR + R + 0.5)"""
 
-    def calculate(self) -> np.ndarray:
-        return (1.5 * (self.nir - self.red)) / (self.nir + self.red + 0.5)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.multiply(self.terms.nir_minus_red, 1.5, out=self._out(out))
+        tmp = np.add(self.terms.nir_plus_red, 0.5, out=self.terms.scratch())
+        np.divide(out, tmp, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class MNLI(VegetationIndex):
     """Modified Non-Linear Index: ((NIR ** 2 - R) * 1.5) / (NIR ** 2 + R + 0.5)"""
 
-    def calculate(self) -> np.ndarray:
-        return ((self.nir**2 - self.red) * 1.5) / (self.nir**2 + self.red + 0.5)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.terms.nir_squared, self.red, out=self._out(out))
+        np.multiply(out, 1.5, out=out)
+        tmp = np.add(self.terms.nir_squared, self.red, out=self.terms.scratch())
+        np.add(tmp, 0.5, out=tmp)
+        np.divide(out, tmp, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class MSR(VegetationIndex):
     """Modified Simple Ratio: ((NIR / R) - 1) / (sqrt(NIR / R) + 1)"""
 
-    def calculate(self) -> np.ndarray:
-        return ((self.nir / self.red) - 1) / (np.sqrt(self.nir / self.red) + 1)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.subtract(self.terms.nir_over_red, 1, out=self._out(out))
+        tmp = np.sqrt(self.terms.nir_over_red, out=self.terms.scratch())
+        np.add(tmp, 1, out=tmp)
+        np.divide(out, tmp, out=out)
+        self.terms.free(tmp)
+        return out
 
 
 class RDVI(VegetationIndex):
     """Renormalized Difference Vegetation Index: (NIR - R) / sqrt(NIR + R)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.red) / np.sqrt(self.nir + self.red)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.sqrt(self.terms.nir_plus_red, out=self._out(out))
+        return np.divide(self.terms.nir_minus_red, out, out=out)
 
 
 class TDVI(VegetationIndex):
     """Transformed Difference Vegetation Index: 1.5 * ((NIR - R) / sqrt(NIR ** 2 + R + 0.5))"""
 
-    def calculate(self) -> np.ndarray:
-        return 1.5 * ((self.nir - self.red) / np.sqrt(self.nir**2 + self.red + 0.5))
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.add(self.terms.nir_squared, self.red, out=self._out(out))
+        np.add(out, 0.5, out=out)
+        np.sqrt(out, out=out)
+        np.divide(self.terms.nir_minus_red, out, out=out)
+        return np.multiply(out, 1.5, out=out)
 
 
 class OSAVI(VegetationIndex):
     """Optimized Soil Adjusted Vegetation Index: (NIR - R) / (NIR + R + 0.16)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - self.red) / (self.nir + self.red + 0.16)
+    BANDS = ("red", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.add(self.terms.nir_plus_red, 0.16, out=self._out(out))
+        return np.divide(self.terms.nir_minus_red, out, out=out)
 
 
 class LAI(VegetationIndex):
     """Leaf Area Index: 3.618 * (2.5 * (NIR - R) / (NIR + 6*R - 7.5*B + 1)) * 0.118"""
 
-    def calculate(self) -> np.ndarray:
-        return (
-            3.618
-            * (
-                2.5
-                * (self.nir - self.red)
-                / (self.nir + 6 * self.red - 7.5 * self.blue + 1)
-            )
-            * 0.118
-        )
+    BANDS = ("red", "blue", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.multiply(self.terms.evi, 3.618, out=self._out(out))
+        return np.multiply(out, 0.118, out=out)
 
 
 class EVI(VegetationIndex):
     """Enhanced Vegetation Index: 2.5 * (NIR - R) / (NIR + 6*R - 7.5*B + 1)"""
 
-    def calculate(self) -> np.ndarray:
-        return (
-            2.5
-            * (self.nir - self.red)
-            / (self.nir + 6 * self.red - 7.5 * self.blue + 1)
-        )
+    BANDS = ("red", "blue", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = self._out(out)
+        np.copyto(out, self.terms.evi)
+        return out
 
 
 class ARVI(VegetationIndex):
     """Atmospherically Resistant Vegetation Index: (NIR - (2 * R) + B) / (NIR + (2 * R) + B)"""
 
-    def calculate(self) -> np.ndarray:
-        return (self.nir - (2 * self.red) + self.blue) / (
-            self.nir + (2 * self.red) + self.blue
-        )
+    BANDS = ("red", "blue", "nir")
+
+    def calculate(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        two_red = np.multiply(self.red, 2, out=self.terms.scratch())
+        out = np.subtract(self.nir, two_red, out=self._out(out))
+        np.add(out, self.blue, out=out)
+        np.add(self.nir, two_red, out=two_red)
+        np.add(two_red, self.blue, out=two_red)
+        np.divide(out, two_red, out=out)
+        self.terms.free(two_red)
+        return out
 
 
 # =============================================================================
@@ -288,6 +559,89 @@ INDICES: Dict[str, type] = {
 }
 
 
+def _on_every_thread(
+    pool: ThreadPoolExecutor, workers: int, fn: Callable[[], Any]
+) -> None:
+    """Run ``fn`` once on each of the ``workers`` threads of ``pool``."""
+    # Each call holds its thread until all of them have started, so no
+    # thread runs two of them and the pool spawns every thread it may use
+    barrier = threading.Barrier(workers)
+
+    def run() -> Any:
+        barrier.wait()
+        return fn()
+
+    for future in [pool.submit(run) for _ in range(workers)]:
+        future.result()
+
+
+def _ordered_map(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: int,
+    initializer: Optional[Callable[[], Any]] = None,
+    finalizer: Optional[Callable[[], Any]] = None,
+) -> Iterator[Any]:
+    """
+    ``map(fn, items)`` on a thread pool, yielding results in input order.
+
+    At most ``2 * workers`` items are in flight, so a slow consumer (the
+    writer) bounds the memory held by finished results. Closing the
+    generator returns only once no item is running any more.
+
+    ``initializer`` and ``finalizer`` run once on every pool thread, before
+    the first item and after the last, so per-thread resources are opened
+    and closed by the thread that uses them. The finalizer also runs when
+    the map fails or is closed early.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight: deque = deque()
+        try:
+            if initializer is not None:
+                _on_every_thread(pool, workers, initializer)
+            for item in items:
+                in_flight.append(pool.submit(fn, item))
+                if len(in_flight) >= 2 * workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            # Closed early (the consumer failed): drop queued items, and
+            # leaving the block waits for the ones already running
+            for future in in_flight:
+                future.cancel()
+            if finalizer is not None:
+                _on_every_thread(pool, workers, finalizer)
+
+
+class IndexSpec(NamedTuple):
+    """One index rendering requested from :meth:`algos.process_indices`."""
+
+    index_class: type
+    ranges: Tuple[float, float]
+    colormap: Optional[str] = None
+    rescale: bool = True
+
+
+def index_spec(
+    name: str, ranges: Tuple[float, float], colormap: Optional[str] = None
+) -> IndexSpec:
+    """
+    Spec of the registry index ``name``, as the ``algos`` methods render it.
+
+    Raises:
+        KeyError: If ``name`` is not in :data:`INDICES`
+    """
+    index_class = INDICES[name]
+    if index_class is NDVI and ranges == (-0.0, 0.0):
+        ranges = (-0.5, 1)
+    return IndexSpec(index_class, ranges, colormap, rescale=index_class is not EXG)
+
+
 # =============================================================================
 # Backward Compatible Interface
 # =============================================================================
@@ -313,15 +667,6 @@ class algos:
         self.output_path = out
         self.raster = rasterio.open(self.input_path)
 
-    def _iter_windows(self, tile_size: int = 1024):
-        height = self.raster.height
-        width = self.raster.width
-        for row_off in range(0, height, tile_size):
-            win_h = min(tile_size, height - row_off)
-            for col_off in range(0, width, tile_size):
-                win_w = min(tile_size, width - col_off)
-                yield rasterio.windows.Window(col_off, row_off, win_w, win_h)
-
     def _process_index(
         self,
         index_class: type,
@@ -332,6 +677,9 @@ class algos:
         """
         Generic method to process any vegetation index.
 
+        The rendering is looked up in the content-addressed raster store
+        first and only computed on a miss.
+
         Args:
             index_class: The vegetation index class to use
             ranges: Min/max range for rescaling
@@ -341,42 +689,161 @@ class algos:
         Returns:
             Dict with path, colormap, and ranges
         """
-        cm = cmap.get(colormap or "rdylgn")
+        return self.process_indices([IndexSpec(index_class, ranges, colormap, rescale)])[0]
+
+    def process_indices(self, specs: Iterable[IndexSpec]) -> List[Dict[str, Any]]:
+        """
+        Render several vegetation indices in a single pass over the raster.
+
+        Each window's bands are read and converted once, the terms indices
+        have in common are computed once (see :class:`BandWindow`), and every
+        index missing from the raster store is written from the same pass.
+        Stored rasters are Cloud-Optimized GeoTIFFs (see :mod:`yolowebapp2.cog`).
+
+        Args:
+            specs: Indices to render
+
+        Returns:
+            One dict with path, colormap and ranges per spec, in order
+        """
+        results = []
+        pending: Dict[str, IndexSpec] = {}
+        for spec in specs:
+            key = raster_store.index_key(
+                self.input_path,
+                spec.index_class.__name__,
+                spec.ranges,
+                spec.colormap,
+                spec.rescale,
+            )
+            results.append(
+                {
+                    "path": raster_store.relative_path(self.output_path, key),
+                    "colormap": spec.colormap,
+                    "ranges": spec.ranges,
+                }
+            )
+            if key not in pending and raster_store.lookup(self.output_path, key) is None:
+                pending[key] = spec
+
+        if pending:
+            render_paths = {
+                key: raster_store.temp_path(self.output_path, f"{key}.render")
+                for key in pending
+            }
+            output_paths = {
+                key: raster_store.temp_path(self.output_path, key) for key in pending
+            }
+            try:
+                self._write_indices(pending, render_paths)
+                for key, output_path in output_paths.items():
+                    cog.write_cog(render_paths[key], output_path)
+                    raster_store.publish(self.output_path, key, output_path)
+            finally:
+                for path in [*render_paths.values(), *output_paths.values()]:
+                    path.unlink(missing_ok=True)
+
+        return results
+
+    def _write_indices(
+        self, specs: Dict[str, IndexSpec], output_paths: Dict[str, Path]
+    ) -> None:
+        # Intermediate rendering, laid out in the tiles of the final COG
         meta = self.raster.meta
         meta.update(
             {
                 "count": 1,
                 "driver": "GTiff",
                 "nodata": 0,
-                "bins": 255,
                 "dtype": np.uint16,
-                "quality": 90,
+                "tiled": True,
+                "blockxsize": cog.BLOCKSIZE,
+                "blockysize": cog.BLOCKSIZE,
             }
         )
 
-        output_path = (
-            f"{BASE_DIR}/static/results/{self.output_path}/odm_orthophoto/output.tif"
-        )
-        with rasterio.open(output_path, "w", **meta) as dst:
-            for window in self._iter_windows():
-                red = self.raster.read(1, window=window).astype(np.float32)
-                green = self.raster.read(2, window=window).astype(np.float32)
-                blue = self.raster.read(3, window=window).astype(np.float32)
-                nir = self.raster.read(4, window=window).astype(np.float32)
-                index = index_class(red, green, blue, nir)
-                result = index.calculate().astype(np.float32)
-                if rescale:
-                    rgb = linear_rescale(result, in_range=ranges).astype(np.float32)
+        workers = getattr(settings, "INDEX_RENDER_WORKERS", 1)
+        index_specs = list(specs.values())
+
+        with ExitStack() as stack:
+            outputs = [
+                stack.enter_context(rasterio.open(output_paths[key], "w", **meta))
+                for key in specs
+            ]
+
+            # Each thread recycles its own window buffers and, when rendering
+            # in parallel, reads through its own dataset handle: handles are
+            # not thread-safe, and GDAL's environment is per thread
+            local = threading.local()
+
+            def open_source() -> None:
+                local.src = rasterio.open(self.input_path)
+
+            def close_source() -> None:
+                src = getattr(local, "src", None)
+                if src is not None:
+                    src.close()
+
+            def pool() -> ScratchPool:
+                scratch = getattr(local, "pool", None)
+                if scratch is None:
+                    scratch = local.pool = ScratchPool()
+                return scratch
+
+            # Only the bands some requested index uses are read
+            bands = [
+                name
+                for name in BAND_NUMBERS
+                if any(name in spec.index_class.BANDS for spec in index_specs)
+            ]
+            windows = raster_io.aligned_windows(self.raster, len(bands))
+
+            def render(window: Any) -> List[np.ndarray]:
+                src = local.src if workers > 1 else self.raster
+                return self._render_window(src, window, index_specs, bands, pool())
+
+            rendered = _ordered_map(
+                render,
+                windows,
+                workers,
+                initializer=open_source,
+                finalizer=close_source,
+            )
+            # Single writer, in window order. The pool is shut down before
+            # the outputs are closed, even if a write fails
+            try:
+                for window, arrays in zip(windows, rendered):
+                    for dst, rgb in zip(outputs, arrays):
+                        dst.write(rgb, 1, window=window)
+            finally:
+                rendered.close()
+            for spec, dst in zip(index_specs, outputs):
+                dst.write_colormap(1, cmap.get(spec.colormap or "rdylgn"))
+
+    @staticmethod
+    def _render_window(
+        src: Any,
+        window: Any,
+        specs: List[IndexSpec],
+        bands: List[str],
+        pool: ScratchPool,
+    ) -> List[np.ndarray]:
+        """Rendered values of every index in ``specs`` for one window."""
+        terms = BandWindow.read(src, window, bands, pool)
+        arrays = []
+        try:
+            for spec in specs:
+                result = spec.index_class.from_window(terms).calculate()
+                if spec.rescale:
+                    rgb = linear_rescale(result, in_range=spec.ranges).astype(np.float32)
                 else:
+                    # Copied out: the scratch buffer is reused by the next window
                     rgb = result.astype(np.float32)
-                dst.write(rgb, 1, window=window)
-            dst.write_colormap(1, cm)
-
-        return {
-            "path": f"results/{self.output_path}/odm_orthophoto/output.tif",
-            "colormap": colormap,
-            "ranges": ranges,
-        }
+                arrays.append(rgb)
+                terms.free(result)
+        finally:
+            terms.release()
+        return arrays
 
     # Keep original method names for backward compatibility
     def Ndvi(
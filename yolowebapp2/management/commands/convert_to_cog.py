@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from yolowebapp2 import cog, raster_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite stored vegetation index rasters (and optionally ODM orthophotos) "
+        "of existing projects as Cloud-Optimized GeoTIFFs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project",
+            action="append",
+            default=[],
+            help="Project hashing_path to convert (repeatable; default: all projects)",
+        )
+        parser.add_argument(
+            "--orthophoto",
+            action="store_true",
+            help=(
+                "Also convert the ODM orthophoto. Its fingerprint changes, so the "
+                "project's analysis artifacts and index rasters are recomputed on "
+                "next use"
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the rasters that would be converted without rewriting them",
+        )
+
+    def handle(self, *args, **options):
+        from dron_map import analysis_cache
+        from dron_map.api_views import orthophoto_path
+        from dron_map.models import Projects
+
+        projects = Projects.objects.all()
+        if options["project"]:
+            projects = projects.filter(hashing_path__in=options["project"])
+
+        dry_run = options["dry_run"]
+        converted = failed = 0
+
+        for project in projects.iterator():
+            store = raster_store.store_dir(project.hashing_path)
+            paths = [
+                path
+                for path in sorted(store.glob("*.tif"))
+                if not path.name.endswith(".tmp.tif")
+            ]
+            ortho = orthophoto_path(project) if options["orthophoto"] else None
+            if ortho is not None and ortho.exists():
+                paths.append(ortho)
+
+            ortho_converted = False
+            for path in paths:
+                try:
+                    if cog.is_cog(path):
+                        continue
+                    if dry_run:
+                        converted += 1
+                        self.stdout.write(f"Would convert: {path}")
+                        continue
+                    cog.convert_in_place(
+                        path,
+                        cog.IMAGERY_RESAMPLING if path == ortho else cog.INDEX_RESAMPLING,
+                    )
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Failed: {path}: {e}"))
+                    continue
+                converted += 1
+                ortho_converted = ortho_converted or path == ortho
+                self.stdout.write(self.style.SUCCESS(f"Converted: {path}"))
+
+            if ortho_converted:
+                analysis_cache.invalidate_project(project.hashing_path)
+
+        summary = f"{converted} raster(s) converted, {failed} failed"
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"DRY RUN: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.constants import MODELS_DIR
+from detection.model_registry import get_model_info
+
+
+class Command(BaseCommand):
+    help = "Export every .pt model in models/ to ONNX and validate it against PyTorch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--models-dir",
+            default=str(MODELS_DIR),
+            help=f"Directory containing .pt weights (default: {MODELS_DIR})",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1e-2,
+            help="Maximum allowed absolute output difference (default: 0.01)",
+        )
+        parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="Only validate models whose .onnx file already exists",
+        )
+
+    def handle(self, *args, **options):
+        from yolowebapp2 import onnx_backend
+
+        if not onnx_backend.is_available():
+            raise CommandError("onnxruntime is not installed")
+
+        models_dir = Path(options["models_dir"])
+        weights = sorted(models_dir.glob("*.pt"))
+        if not weights:
+            self.stdout.write(self.style.WARNING(f"No .pt files in {models_dir}"))
+            return
+
+        from yolowebapp2.predict_tree import attempt_load
+
+        failed = []
+        for weights_path in weights:
+            info = get_model_info(weights_path.name) or {}
+            img_size = info.get("input_size", 640)
+            onnx_path = onnx_backend.onnx_path_for(weights_path)
+
+            try:
+                model = attempt_load(str(weights_path), map_location="cpu")
+                model.eval()
+
+                if options["skip_existing"] and onnx_path.exists():
+                    self.stdout.write(f"Validating {onnx_path.name}")
+                else:
+                    self.stdout.write(f"Exporting {weights_path.name} ({img_size}px)")
+                    onnx_backend.export_onnx(model, onnx_path, img_size=img_size)
+
+                max_diff = onnx_backend.validate_onnx(model, onnx_path, img_size=img_size)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{weights_path.name}: {e}"))
+                failed.append(weights_path.name)
+                continue
+
+            if max_diff > options["tolerance"]:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{onnx_path.name}: max diff {max_diff:.2e} exceeds "
+                        f"{options['tolerance']:.0e}"
+                    )
+                )
+                failed.append(weights_path.name)
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f"{onnx_path.name}: OK (max diff {max_diff:.2e})")
+                )
+
+        if failed:
+            raise CommandError(f"ONNX export/validation failed: {', '.join(failed)}")
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage latency instrumentation for the detection hot path.
+
+A :class:`StageTimer` is started per request and accumulates wall-clock time
+per named stage (decode, letterbox, h2d, forward, nms, draw, imwrite, ...).
+On :meth:`StageTimer.finish` the durations are observed into per
+``(stage, model)`` histograms, which ``/metrics/`` exposes in the Prometheus
+text format. Only a sampled fraction of requests is timed
+(INFERENCE_METRICS_SAMPLE_RATE); unsampled requests get a no-op timer.
+
+Histograms are aggregated in Redis, so every gunicorn worker and Celery
+process adds to the same series and a scrape sees all of them, whichever
+worker answers it. Each process also keeps its own copy, which is served
+only while Redis is unavailable.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond post-processing to slow forwards
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if idx < len(self.counts):
+                self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Cumulative bucket counts, total count and sum."""
+        with self._lock:
+            cumulative, total = [], 0
+            for c in self.counts:
+                total += c
+                cumulative.append(total)
+            return cumulative, self.count, self.sum
+
+
+_histograms: Dict[Tuple[str, str], Histogram] = {}
+_histograms_lock = threading.Lock()
+
+Snapshot = Tuple[List[int], int, float]
+
+
+def observe_stage(stage: str, model: str, seconds: float) -> None:
+    key = (stage, model)
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+    histogram.observe(seconds)
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def _series_set_key() -> str:
+    return cache.make_key("inference_stage_series")
+
+
+def _series_key(stage: str, model: str) -> str:
+    return cache.make_key(f"inference_stage:{stage}:{model}")
+
+
+def record_stages(model: str, seconds: Dict[str, float]) -> None:
+    """
+    Observe one request's stage durations, locally and in Redis.
+
+    The shared histogram of a series is the hash ``inference_stage:<stage>:
+    <model>`` with one (non-cumulative) counter per bucket bound plus
+    ``count`` and ``sum``. All stages go out in a single pipeline.
+    """
+    for name, value in seconds.items():
+        observe_stage(name, model, value)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for name, value in seconds.items():
+            key = _series_key(name, model)
+            idx = bisect.bisect_left(DEFAULT_BUCKETS, value)
+            if idx < len(DEFAULT_BUCKETS):
+                pipe.hincrby(key, f"le:{DEFAULT_BUCKETS[idx]}", 1)
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "sum", value)
+            pipe.sadd(_series_set_key(), f"{name}\t{model}")
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Aşama metrikleri Redis'e yazılamadı: %s", e)
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _shared_snapshots() -> Optional[Dict[Tuple[str, str], Snapshot]]:
+    """Histograms aggregated over all processes; None if Redis is unavailable."""
+    try:
+        conn = _redis()
+        series = sorted(
+            tuple(_text(member).split("\t", 1))
+            for member in conn.smembers(_series_set_key())
+        )
+        pipe = conn.pipeline(transaction=False)
+        for stage, model in series:
+            pipe.hgetall(_series_key(stage, model))
+        rows = pipe.execute()
+    except Exception as e:
+        logger.warning("Aşama metrikleri Redis'ten okunamadı: %s", e)
+        return None
+
+    snapshots = {}
+    for key, row in zip(series, rows):
+        row = {_text(k): _text(v) for k, v in row.items()}
+        cumulative, total = [], 0
+        for bound in DEFAULT_BUCKETS:
+            total += int(row.get(f"le:{bound}", 0))
+            cumulative.append(total)
+        snapshots[key] = (cumulative, int(row.get("count", 0)), float(row.get("sum", 0)))
+    return snapshots
+
+
+def _local_snapshots() -> Dict[Tuple[str, str], Snapshot]:
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {key: histogram.snapshot() for key, histogram in items}
+
+
+class StageTimer:
+    """
+    Accumulates per-stage durations for one sampled request.
+
+    Args:
+        model: Model label (weights file name)
+        synchronize: Called before reading the clock at stage boundaries, e.g.
+            ``torch.cuda.synchronize`` so asynchronous GPU work is attributed
+            to the stage that launched it
+    """
+
+    sampled = True
+
+    def __init__(self, model: str, synchronize: Callable[[], None] | None = None):
+        self.model = model
+        self.synchronize = synchronize
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.synchronize:
+            self.synchronize()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize:
+                self.synchronize()
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """Accumulated durations in milliseconds, by stage."""
+        with self._lock:
+            return {k: round(v * 1000.0, 3) for k, v in self._seconds.items()}
+
+    def finish(self) -> Dict[str, float]:
+        """Record every stage into the histograms and return :attr:`timings`."""
+        with self._lock:
+            seconds = dict(self._seconds)
+        if seconds:
+            record_stages(self.model, seconds)
+        return self.timings
+
+
+class _NullTimer:
+    """Timer for unsampled requests; every hook is a no-op."""
+
+    sampled = False
+    timings: Dict[str, float] = {}
+
+    def stage(self, name: str) -> nullcontext:
+        return nullcontext()
+
+    def add(self, name: str, seconds: float) -> None:
+        pass
+
+    def finish(self) -> Dict[str, float]:
+        return {}
+
+
+NULL_TIMER = _NullTimer()
+
+
+def start_timer(
+    model_path: str, synchronize: Callable[[], None] | None = None
+) -> StageTimer | _NullTimer:
+    """Return a real timer for a sampled request, otherwise :data:`NULL_TIMER`."""
+    rate = getattr(settings, "INFERENCE_METRICS_SAMPLE_RATE", 0.0)
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return NULL_TIMER
+    return StageTimer(Path(model_path).name, synchronize)
+
+
+def render_prometheus() -> str:
+    """All stage histograms in the Prometheus text exposition format."""
+    name = "farmvision_inference_stage_seconds"
+    lines = [
+        f"# HELP {name} Detection pipeline stage latency in seconds",
+        f"# TYPE {name} histogram",
+    ]
+    snapshots = _shared_snapshots()
+    if snapshots is None:
+        snapshots = _local_snapshots()
+    for (stage, model), (cumulative, count, total) in sorted(snapshots.items()):
+        labels = f'stage="{stage}",model="{model}"'
+        for bound, value in zip(DEFAULT_BUCKETS, cumulative):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {value}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-budgeted LRU cache for loaded inference models.
+
+Each entry is charged with the bytes of its parameters and buffers. When an
+insert pushes the total over the budget, the least recently used models are
+dropped until it fits again; the newest model is always kept, even if it
+alone exceeds the budget.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def model_nbytes(model: Any) -> int:
+    """Parameter and buffer bytes of a ``torch.nn.Module``.
+
+    Non-torch models (e.g. ONNX Runtime sessions) may expose an ``nbytes``
+    attribute instead; anything else is counted as zero.
+    """
+    if hasattr(model, "parameters") and hasattr(model, "buffers"):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return int(getattr(model, "nbytes", 0))
+
+
+class ModelCache:
+    """
+    Thread-safe LRU mapping of model name to loaded model.
+
+    Args:
+        max_bytes: Memory budget for all cached models (0 = unlimited)
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.RLock()
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._models
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._models)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._models))
+
+    def __getitem__(self, name: str) -> Any:
+        model = self.get(name)
+        if model is None:
+            raise KeyError(name)
+        return model
+
+    def __setitem__(self, name: str, model: Any) -> None:
+        self.put(name, model)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def get(self, name: str) -> Any:
+        """Return the cached model and mark it most recently used."""
+        with self._lock:
+            if name not in self._models:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._models.move_to_end(name)
+            return self._models[name]
+
+    def put(self, name: str, model: Any) -> None:
+        """Insert ``model`` and evict least recently used entries over budget."""
+        size = model_nbytes(model)
+        with self._lock:
+            self._models[name] = model
+            self._models.move_to_end(name)
+            self._sizes[name] = size
+            logger.info("Model önbelleğe alındı: %s (%.1f MB)", name, size / 2**20)
+
+            while (
+                self.max_bytes
+                and len(self._models) > 1
+                and self.total_bytes > self.max_bytes
+            ):
+                evicted, _ = self._models.popitem(last=False)
+                self._sizes.pop(evicted, None)
+                self.evictions += 1
+                logger.info("Model önbellekten çıkarıldı (LRU): %s", evicted)
+
+    def pop(self, name: str) -> Any:
+        with self._lock:
+            self._sizes.pop(name, None)
+            return self._models.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": list(self._models),
+                "total_mb": round(self.total_bytes / 2**20, 1),
+                "max_mb": round(self.max_bytes / 2**20, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
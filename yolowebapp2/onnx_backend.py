@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+ONNX Runtime inference backend for the YOLO models.
+
+Models are exported with the decoded detection head concatenated into a
+single ``(batch, anchors, 5 + nc)`` output, i.e. exactly what the PyTorch
+model returns as ``model(img)[0]``. Thresholding and NMS therefore stay in
+``predict_tree`` and both backends share the same result contract.
+
+The detection grid is traced as a constant, so graphs have a fixed square
+input size and only the batch axis is dynamic. Rectangular letterboxed
+inputs are padded at the bottom/right, which leaves box coordinates
+unchanged for ``scale_coords``.
+"""
+import inspect
+import logging
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+ONNX_OPSET = 12
+
+
+def onnx_path_for(weights_path: str | Path) -> Path:
+    """Location of the exported graph for a ``.pt`` weights file."""
+    return Path(weights_path).with_suffix(".onnx")
+
+
+def is_available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class OnnxModel:
+    """
+    Callable wrapper around an ``onnxruntime.InferenceSession``.
+
+    Mirrors the parts of the PyTorch model interface used by ``predict_tree``:
+    calling it returns a tuple whose first element is the raw prediction tensor.
+
+    Args:
+        onnx_path: Path to the exported ``.onnx`` graph
+        intra_op_threads: ORT intra-op thread count (0 = runtime default)
+    """
+
+    backend = "onnx"
+
+    def __init__(self, onnx_path: str | Path, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.path = Path(onnx_path)
+        # Weights are held by the session; the graph size approximates them
+        self.nbytes = self.path.stat().st_size
+        self.session = ort.InferenceSession(
+            str(self.path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        graph_input = self.session.get_inputs()[0]
+        self.input_name = graph_input.name
+        self.input_hw = tuple(graph_input.shape[2:4])
+
+    def __call__(self, img: torch.Tensor) -> Tuple[torch.Tensor]:
+        x = img.detach().to("cpu", torch.float32).numpy()
+        height, width = self.input_hw
+        if x.shape[2] > height or x.shape[3] > width:
+            raise ValueError(
+                f"Girdi boyutu ONNX grafından büyük: {x.shape[2:]} > {self.input_hw}"
+            )
+        if x.shape[2:] != (height, width):
+            padded = np.full((x.shape[0], 3, height, width), 114 / 255.0, np.float32)
+            padded[:, :, : x.shape[2], : x.shape[3]] = x
+            x = padded
+        output = self.session.run(None, {self.input_name: x})[0]
+        return (torch.from_numpy(output).to(img.device),)
+
+    def eval(self) -> "OnnxModel":
+        return self
+
+
+def _set_concat_head(model: Any, enabled: bool) -> None:
+    head = model.model[-1]
+    head.export = False
+    head.concat = enabled
+
+
+def export_onnx(
+    model: Any, onnx_path: str | Path, img_size: int = 640, opset: int = ONNX_OPSET
+) -> Path:
+    """
+    Export a loaded PyTorch YOLO model to ONNX with a dynamic batch axis.
+
+    Args:
+        model: Model returned by ``attempt_load`` (on CPU, float32)
+        onnx_path: Destination file
+        img_size: Square input size of the graph
+        opset: ONNX opset version
+
+    Returns:
+        Path to the written graph
+    """
+    onnx_path = Path(onnx_path)
+    dummy = torch.zeros(1, 3, img_size, img_size)
+
+    kwargs: Dict[str, Any] = {}
+    # Newer torch releases default to the dynamo exporter; the YOLO head is
+    # only traceable with the TorchScript-based one.
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+
+    _set_concat_head(model, True)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                dummy,
+                str(onnx_path),
+                opset_version=opset,
+                input_names=["images"],
+                output_names=["output"],
+                dynamic_axes={"images": {0: "batch"}, "output": {0: "batch"}},
+                **kwargs,
+            )
+    finally:
+        _set_concat_head(model, False)
+
+    return onnx_path
+
+
+def validate_onnx(
+    model: Any,
+    onnx_path: str | Path,
+    img_size: int = 640,
+    batch_sizes: Tuple[int, ...] = (1, 2),
+) -> float:
+    """
+    Compare ONNX Runtime output against the PyTorch model on random inputs.
+
+    Args:
+        model: Reference PyTorch model (CPU, float32)
+        onnx_path: Exported graph to check
+        img_size: Square input size the graph was exported with
+        batch_sizes: Batch sizes to compare
+
+    Returns:
+        Largest absolute difference across all compared outputs
+    """
+    try:
+        import onnx
+
+        onnx.checker.check_model(str(onnx_path))
+    except ImportError:
+        logger.warning("onnx paketi yok, graf doğrulaması atlandı: %s", onnx_path)
+
+    session = OnnxModel(onnx_path)
+    generator = torch.Generator().manual_seed(0)
+    max_diff = 0.0
+    for batch in batch_sizes:
+        img = torch.rand((batch, 3, img_size, img_size), generator=generator)
+        with torch.no_grad():
+            expected = model(img)[0].numpy()
+        actual = session(img)[0].numpy()
+        if expected.shape != actual.shape:
+            raise ValueError(
+                f"ONNX çıktı boyutu uyuşmuyor: {actual.shape} != {expected.shape}"
+            )
+        max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+    return max_diff
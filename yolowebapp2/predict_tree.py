@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
+import gc
 import glob
 import logging
+import queue
 import sys
 import threading
+import time
 import uuid
 import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple
 
 import cv2
 import numpy as np
 from numpy import random as np_random
 import openpyxl
+import rasterio
 import torch
+import torchvision
+from django.conf import settings
 from natsort import natsorted
+from rasterio.windows import Window
 
 logger = logging.getLogger(__name__)
 
@@ -22,12 +32,23 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR / "detection" / "yolo"))
 
 from models.experimental import attempt_load  # noqa: E402
-from utils.datasets import LoadImages  # noqa: E402
+from utils.datasets import LoadImages, letterbox  # noqa: E402
 from utils.general import non_max_suppression, scale_coords  # noqa: E402
 from utils.plots import plot_one_box  # noqa: E402
 from utils.torch_utils import select_device  # noqa: E402
 
-_model_cache = {}
+from detection.model_registry import get_model_backend  # noqa: E402
+from yolowebapp2 import onnx_backend  # noqa: E402
+from yolowebapp2.artifact_cache import load_compiled_model  # noqa: E402
+from yolowebapp2.batching import get_batcher  # noqa: E402
+from yolowebapp2.metrics import NULL_TIMER, StageTimer, start_timer  # noqa: E402
+from yolowebapp2.model_cache import ModelCache  # noqa: E402
+
+IMG_SIZE = 640
+CONF_THRES = 0.1
+IOU_THRES = 0.45
+
+_model_cache = ModelCache(getattr(settings, "MODEL_CACHE_MAX_MB", 0) * 2**20)
 _device = None
 _lock = threading.RLock()
 
@@ -45,9 +66,48 @@ def get_device() -> torch.device:
         return _device
 
 
+def _load_onnx_model(model_path: Path) -> Any:
+    """ONNX Runtime session for ``model_path``, or None to fall back to PyTorch."""
+    onnx_path = onnx_backend.onnx_path_for(model_path)
+    if not onnx_backend.is_available():
+        logger.warning("onnxruntime kurulu değil, PyTorch kullanılıyor: %s", model_path)
+        return None
+    if not onnx_path.exists():
+        logger.warning(
+            "ONNX grafı bulunamadı (manage.py export_onnx), PyTorch kullanılıyor: %s",
+            onnx_path,
+        )
+        return None
+
+    logger.info("ONNX modeli yükleniyor: %s", onnx_path)
+    return onnx_backend.OnnxModel(
+        onnx_path, intra_op_threads=getattr(settings, "ONNX_INTRA_OP_THREADS", 0)
+    )
+
+
+def _load_torch_model(model_path: Path, device: torch.device) -> Any:
+    """Fused and traced model from the artifact cache, or plain ``attempt_load``."""
+    if getattr(settings, "MODEL_ARTIFACT_CACHE_ENABLED", False):
+        try:
+            cache_dir = getattr(
+                settings, "MODEL_ARTIFACT_CACHE_DIR", BASE_DIR / "models" / ".cache"
+            )
+            return load_compiled_model(
+                model_path, device, IMG_SIZE, cache_dir, attempt_load
+            )
+        except Exception as e:
+            logger.warning(
+                "Derlenmiş model kullanılamadı, attempt_load kullanılıyor %s: %s",
+                model_path,
+                e,
+            )
+    return attempt_load(str(model_path), map_location=device)
+
+
 def get_model(model_name: str) -> Any:
     with _lock:
-        if model_name not in _model_cache:
+        model = _model_cache.get(model_name)
+        if model is None:
             try:
                 device = get_device()
                 model_path = Path(model_name)
@@ -56,14 +116,21 @@ def get_model(model_name: str) -> Any:
                     logger.error("Model dosyası bulunamadı: %s", model_path)
                     raise FileNotFoundError(f"Model bulunamadı: {model_path}")
 
+                if get_model_backend(model_name) == "onnx":
+                    model = _load_onnx_model(model_path)
+                    if model is not None:
+                        _model_cache.put(model_name, model)
+                        logger.info("Model başarıyla yüklendi: %s", model_name)
+                        return model
+
                 logger.info("Model yükleniyor: %s", model_name)
-                model = attempt_load(str(model_path), map_location=device)
+                model = _load_torch_model(model_path, device)
                 model.eval()
 
                 if device.type != "cpu":
                     model.half()
 
-                _model_cache[model_name] = model
+                _model_cache.put(model_name, model)
                 logger.info("Model başarıyla yüklendi: %s", model_name)
 
             except FileNotFoundError:
@@ -72,24 +139,181 @@ def get_model(model_name: str) -> Any:
                 logger.error("Model yükleme hatası %s: %s", model_name, e)
                 raise RuntimeError(f"Model yüklenemedi {model_name}: {e}")
 
-        return _model_cache[model_name]
+        return model
+
+
+def _resolve_model_path(name: str) -> Path:
+    model_path = Path(name)
+    if not model_path.is_absolute():
+        model_path = BASE_DIR / "models" / model_path
+    return model_path
+
+
+def preload_shared_models(model_names: List[str] | None = None) -> List[str]:
+    """Load the hot models in a parent process so forked workers share them.
+
+    Called in the gunicorn master (``preload_app``) and the Celery main
+    process (``worker_init``) when MODEL_SHARED_PRELOAD is enabled. Tensor
+    storage is never written during inference, so children keep sharing the
+    parent's pages copy-on-write. No forward pass runs here, so the parent
+    does not spin up intra-op thread pools before forking. CUDA contexts do
+    not survive ``fork``; on GPU nodes this is a no-op.
+    """
+    if model_names is None:
+        model_names = getattr(settings, "MODEL_WARMUP_MODELS", [])
+
+    if get_device().type != "cpu":
+        logger.warning("Paylaşımlı model ön yüklemesi yalnızca CPU'da desteklenir")
+        return []
+
+    loaded: List[str] = []
+    for name in model_names:
+        model_path = _resolve_model_path(name)
+        try:
+            get_model(str(model_path))
+            loaded.append(str(model_path))
+        except Exception as e:
+            logger.warning("Model ön yüklemesi atlandı %s: %s", model_path, e)
+
+    # Move everything allocated so far out of the GC generations, so cyclic
+    # collections in the children do not touch (and copy) these pages.
+    gc.freeze()
+    if loaded:
+        logger.info("Modeller fork öncesi yüklendi: %s", ", ".join(loaded))
+    return loaded
+
+
+def warm_up_models(model_names: List[str] | None = None) -> List[str]:
+    """Load the hot models and run one dummy forward pass through each.
+
+    Called from the Celery ``worker_process_init`` signal and the gunicorn
+    ``post_worker_init`` hook (both gated by MODEL_WARMUP_ENABLED) so the first request after a worker recycle does not
+    pay for ``torch.load``, layer fusion and lazy kernel initialisation.
+    Relative names are resolved against ``models/``. Failures are logged and
+    skipped; the names that were warmed up are returned.
+    """
+    if model_names is None:
+        model_names = getattr(settings, "MODEL_WARMUP_MODELS", [])
+
+    warmed: List[str] = []
+    for name in model_names:
+        model_path = _resolve_model_path(name)
+        try:
+            model = get_model(str(model_path))
+            device = get_device()
+            dummy = torch.zeros((1, 3, IMG_SIZE, IMG_SIZE), device=device)
+            if device.type != "cpu":
+                dummy = dummy.half()
+            with torch.no_grad():
+                model(dummy)
+            warmed.append(str(model_path))
+        except Exception as e:
+            logger.warning("Model ısıtma atlandı %s: %s", model_path, e)
+
+    if warmed:
+        logger.info("Modeller ısıtıldı: %s", ", ".join(warmed))
+    return warmed
+
+
+def _model_batcher(model_name: str) -> Any:
+    """Process-wide micro-batcher of ``model_name``, or None when disabled."""
+    if not getattr(settings, "INFERENCE_BATCHING_ENABLED", False):
+        return None
+    return get_batcher(
+        model_name,
+        lambda batch: get_model(model_name)(batch)[0],
+        max_batch_size=getattr(settings, "INFERENCE_MAX_BATCH_SIZE", 8),
+        max_wait_ms=getattr(settings, "INFERENCE_MAX_WAIT_MS", 5.0),
+    )
+
+
+def _forward(model_name: str, model: Any, img: torch.Tensor) -> torch.Tensor:
+    """Run the raw forward pass, through the micro-batcher when enabled.
+
+    ``img`` may hold several images; each is queued as its own batcher
+    request, so they share forward passes with concurrent requests. If the
+    batcher does not answer within INFERENCE_BATCH_TIMEOUT_S, the queued
+    requests are cancelled and the model is called directly.
+    """
+    batcher = _model_batcher(model_name)
+    if batcher is not None:
+        futures = [batcher.submit(img[i : i + 1]) for i in range(img.shape[0])]
+        timeout = getattr(settings, "INFERENCE_BATCH_TIMEOUT_S", 10.0)
+        deadline = time.monotonic() + timeout
+        try:
+            return torch.cat(
+                [
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+                    for future in futures
+                ]
+            )
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            logger.warning(
+                "Toplu çıkarım %s sn içinde yanıt vermedi, doğrudan çalıştırılıyor: %s",
+                timeout,
+                model_name,
+            )
+
+    with torch.no_grad():
+        return model(img)[0]
+
+
+def _cuda_sync(device: torch.device) -> Callable[[], None] | None:
+    """Stage-boundary sync so GPU time lands in the stage that queued it."""
+    return torch.cuda.synchronize if device.type == "cuda" else None
+
+
+def _centers_and_scores(
+    det: torch.Tensor,
+) -> Tuple[List[Dict[str, int]], List[float]]:
+    """Box centres and confidences of an ``(n, 6)`` detection tensor.
+
+    Rows are emitted last-to-first, the order results have always been
+    stored in. Coordinates are promoted to float32 first, since half
+    precision cannot represent pixel sums above 2048 exactly.
+    """
+    det = det.flip(0).float()
+    centers = ((det[:, :2] + det[:, 2:4]) / 2.0).round().int().tolist()
+    return [{"x": cx, "y": cy} for cx, cy in centers], det[:, 4].tolist()
+
+
+def render_detections(
+    im0: np.ndarray, det: torch.Tensor, color: List[int] | None = None
+) -> np.ndarray:
+    """Draw every box of ``det`` with its confidence label onto ``im0`` in place."""
+    if color is None:
+        color = [np_random.randint(0, 255) for _ in range(3)]
+    for *xyxy, conf, _cls in det.flip(0).tolist():
+        plot_one_box(xyxy, im0, label=f"{conf:.2f}", color=color, line_thickness=2)
+    return im0
 
 
 def predict(
-    path_to_weights: str, path_to_source: str, return_boxes: bool = False
+    path_to_weights: str,
+    path_to_source: str,
+    return_boxes: bool = False,
+    timings: Dict[str, float] | None = None,
+    render: bool = True,
 ) -> Tuple[bytes, str, float] | Tuple[bytes, str, float, List[Dict[str, int]]]:
+    """Run detection on a single image.
+
+    The annotated copy is only drawn and written to
+    ``static/detected/<unique_id>/`` when ``render`` is true; callers that
+    only need counts and points should pass ``render=False``. When the
+    request is sampled for metrics, per-stage durations in milliseconds are
+    written into ``timings`` (if given).
+    """
     unique_id = str(uuid.uuid4())
 
     try:
         model = get_model(path_to_weights)
         device = get_device()
-
-        img_size = 640
-        conf_thres = 0.1
-        iou_thres = 0.45
+        timer = start_timer(path_to_weights, _cuda_sync(device))
 
         try:
-            dataset = LoadImages(path_to_source, img_size=img_size)
+            dataset = LoadImages(path_to_source, img_size=IMG_SIZE)
         except Exception as e:
             logger.error("Görüntü yükleme hatası: %s: %s", path_to_source, e)
             raise ValueError(f"Görüntü yüklenemedi: {e}")
@@ -98,45 +322,48 @@ def predict(
         confidence_scores: List[float] = []
         bbox_centers: List[Dict[str, int]] = []
 
-        for path, img, im0s, vid_cap in dataset:
-            try:
-                img = torch.from_numpy(img).to(device)
-                img = img.half() if device.type != "cpu" else img.float()
-                img /= 255.0
+        images = iter(dataset)
+        while True:
+            # LoadImages decodes and letterboxes inside __next__
+            with timer.stage("decode_letterbox"):
+                item = next(images, None)
+            if item is None:
+                break
+            path, img, im0s, vid_cap = item
 
-                if img.ndimension() == 3:
-                    img = img.unsqueeze(0)
+            try:
+                with timer.stage("h2d"):
+                    img = torch.from_numpy(img).to(device)
+                    img = img.half() if device.type != "cpu" else img.float()
+                    img /= 255.0
 
-                with torch.no_grad():
-                    pred = model(img)[0]
+                    if img.ndimension() == 3:
+                        img = img.unsqueeze(0)
 
-                pred = non_max_suppression(pred, conf_thres, iou_thres)
+                with timer.stage("forward"):
+                    pred = _forward(path_to_weights, model, img)
 
-                for i, det in enumerate(pred):
-                    im0 = im0s.copy()
+                pred = non_max_suppression(pred, CONF_THRES, IOU_THRES, timer=timer)
 
-                    if det:
-                        det[:, :4] = scale_coords(
-                            img.shape[2:], det[:, :4], im0.shape
-                        ).round()
+                for det in pred:
+                    if len(det):
+                        with timer.stage("scale_coords"):
+                            det[:, :4] = scale_coords(
+                                img.shape[2:], det[:, :4], im0s.shape
+                            ).round()
                         total_detections = len(det)
 
-                        colors = [[np_random.randint(0, 255) for _ in range(3)]]
-
-                        for *xyxy, conf, cls in reversed(det):
-                            x1, y1, x2, y2 = [float(v) for v in xyxy]
-                            cx = int(round((x1 + x2) / 2.0))
-                            cy = int(round((y1 + y2) / 2.0))
-                            bbox_centers.append({"x": cx, "y": cy})
-                            confidence_scores.append(float(conf))
-                            label = f"{conf:.2f}"
-                            plot_one_box(
-                                xyxy,
-                                im0,
-                                label=label,
-                                color=colors[0],
-                                line_thickness=2,
-                            )
+                        with timer.stage("postprocess"):
+                            centers, scores = _centers_and_scores(det)
+                        bbox_centers.extend(centers)
+                        confidence_scores.extend(scores)
+
+                    if not render:
+                        continue
+
+                    im0 = im0s.copy()
+                    with timer.stage("draw"):
+                        render_detections(im0, det)
 
                     try:
                         output_dir = BASE_DIR / "static" / "detected" / unique_id
@@ -145,7 +372,9 @@ def predict(
                         img_name = Path(path).name
                         output_path = output_dir / img_name
 
-                        if not cv2.imwrite(str(output_path), im0):
+                        with timer.stage("imwrite"):
+                            written = cv2.imwrite(str(output_path), im0)
+                        if not written:
                             logger.error("Görüntü yazma hatası: %s", output_path)
                             raise IOError(f"Görüntü kaydedilemedi: {output_path}")
 
@@ -157,6 +386,10 @@ def predict(
                 logger.error("Algılama işlemi hatası: %s: %s", path, e)
                 raise
 
+        stage_timings = timer.finish()
+        if timings is not None:
+            timings.update(stage_timings)
+
         count_str = f"{total_detections:02d}"
         avg_confidence = (
             sum(confidence_scores) / len(confidence_scores)
@@ -174,9 +407,316 @@ def predict(
         raise RuntimeError(f"Algılama işlemi başarısız: {e}")
 
 
+def _tile_offsets(length: int, tile_size: int, overlap: int) -> List[int]:
+    """Start offsets of overlapping tiles covering ``length`` pixels.
+
+    The last tile is aligned to the raster edge so every tile keeps the full
+    ``tile_size`` whenever the raster is large enough.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    offsets = list(range(0, length - tile_size, stride))
+    offsets.append(length - tile_size)
+    return offsets
+
+
+def _ownership_bounds(
+    offsets: List[int], tile_size: int, length: int
+) -> List[Tuple[float, float]]:
+    """Half-open pixel range owned by each tile along one axis.
+
+    Neighbouring tiles split their overlap at its midpoint, so a box whose
+    centre falls inside the overlap is kept by exactly one tile.
+    """
+    bounds = []
+    for i, start in enumerate(offsets):
+        lo = 0.0 if i == 0 else (start + offsets[i - 1] + tile_size) / 2.0
+        hi = (
+            float(length)
+            if i == len(offsets) - 1
+            else (offsets[i + 1] + start + tile_size) / 2.0
+        )
+        bounds.append((lo, hi))
+    return bounds
+
+
+def _band_ranges(src: Any, max_side: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-band ``(low, high)`` of the RGB bands, from a decimated read.
+
+    The read is served from the overviews when the raster has them, so it
+    stays cheap for full-size orthophotos. Nodata, zero and NaN pixels are
+    ignored.
+    """
+    step = max(1, max(src.width, src.height) // max_side)
+    sample = src.read(
+        [1, 2, 3],
+        out_shape=(3, max(1, src.height // step), max(1, src.width // step)),
+        masked=True,
+    ).astype(np.float64)
+    sample = np.ma.masked_invalid(sample)
+    sample = np.ma.masked_equal(sample, 0).reshape(3, -1)
+    low = sample.min(axis=1).filled(0.0)
+    high = sample.max(axis=1).filled(0.0)
+    return low, high
+
+
+def _scale_to_uint8(data: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Linearly map each band of ``data`` from ``[low, high]`` onto 0-255."""
+    span = np.maximum(high - low, np.finfo(np.float32).eps).astype(np.float32)
+    scaled = np.nan_to_num(data.astype(np.float32))
+    scaled -= low.astype(np.float32)[:, None, None]
+    scaled *= (255.0 / span)[:, None, None]
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def _infer_tile_batch(
+    model_name: str, model: Any, device: torch.device, tiles: List[np.ndarray]
+) -> List[torch.Tensor]:
+    img = torch.from_numpy(np.stack(tiles)).to(device)
+    img = img.half() if device.type != "cpu" else img.float()
+    img /= 255.0
+
+    pred = _forward(model_name, model, img)
+
+    return non_max_suppression(pred, CONF_THRES, IOU_THRES)
+
+
+def _max_tile_size(model: Any) -> int | None:
+    """Largest square input the model accepts; None if it takes any size.
+
+    Exported ONNX graphs have a fixed input size (see ``onnx_backend``).
+    """
+    input_hw = getattr(model, "input_hw", None)
+    if not input_hw or not all(isinstance(v, int) for v in input_hw):
+        return None
+    return min(input_hw)
+
+
+def predict_tiled(
+    path_to_weights: str,
+    path_to_source: str,
+    return_boxes: bool = False,
+    tile_size: int | None = None,
+    overlap: int | None = None,
+    batch_size: int | None = None,
+) -> Tuple[bytes, str, float] | Tuple[bytes, str, float, List[Dict[str, int]]]:
+    """Run detection over a large GeoTIFF in overlapping native-resolution tiles.
+
+    Tiles are read window by window with rasterio, so the raster is never fully
+    decoded in memory. Boxes are shifted back to global pixel coordinates, each
+    tile keeps only the boxes whose centre lies in the part of the overlap it
+    owns, and a final global NMS removes any remaining duplicates along seams.
+
+    Args:
+        path_to_weights: Model weights file
+        path_to_source: Path to the orthophoto (band 1-3 = RGB)
+        return_boxes: Also return box centres in global pixel coordinates
+        tile_size: Tile edge in pixels (defaults to TILED_INFERENCE_TILE_SIZE)
+        overlap: Tile overlap in pixels (defaults to TILED_INFERENCE_OVERLAP)
+        batch_size: Tiles per forward pass (defaults to TILED_INFERENCE_BATCH_SIZE)
+
+    Returns:
+        Same contract as :func:`predict`; no annotated image is written.
+    """
+    unique_id = str(uuid.uuid4())
+
+    tile_size = tile_size or getattr(settings, "TILED_INFERENCE_TILE_SIZE", IMG_SIZE)
+    overlap = overlap if overlap is not None else getattr(
+        settings, "TILED_INFERENCE_OVERLAP", 128
+    )
+    batch_size = batch_size or getattr(settings, "TILED_INFERENCE_BATCH_SIZE", 4)
+
+    if tile_size % 32 or not 0 <= overlap < tile_size:
+        raise ValueError(
+            f"Geçersiz karo ayarı: tile_size={tile_size}, overlap={overlap}"
+        )
+
+    try:
+        model = get_model(path_to_weights)
+        device = get_device()
+
+        max_tile = _max_tile_size(model)
+        if max_tile is not None and tile_size > max_tile:
+            logger.warning(
+                "Karo boyutu model girdisine düşürüldü: %s -> %s (%s)",
+                tile_size,
+                max_tile,
+                path_to_weights,
+            )
+            tile_size = max_tile
+            overlap = min(overlap, tile_size // 4)
+
+        try:
+            src = rasterio.open(path_to_source)
+        except Exception as e:
+            logger.error("Raster açma hatası: %s: %s", path_to_source, e)
+            raise ValueError(f"Raster açılamadı: {e}")
+
+        kept: List[torch.Tensor] = []
+
+        with src:
+            if src.count < 3:
+                raise ValueError(
+                    f"Raster en az 3 bant içermeli (RGB), bulunan: {src.count}"
+                )
+
+            # 16-bit and float orthophotos are stretched to 8 bit with the
+            # raster's own range; clipping them would saturate every pixel
+            band_range = None if src.dtypes[0] == "uint8" else _band_ranges(src)
+
+            col_offsets = _tile_offsets(src.width, tile_size, overlap)
+            row_offsets = _tile_offsets(src.height, tile_size, overlap)
+            col_bounds = _ownership_bounds(col_offsets, tile_size, src.width)
+            row_bounds = _ownership_bounds(row_offsets, tile_size, src.height)
+
+            batch: List[np.ndarray] = []
+            batch_meta: List[Tuple[int, int, Tuple[float, float], Tuple[float, float]]] = []
+
+            def flush() -> None:
+                for det, (col, row, xb, yb) in zip(
+                    _infer_tile_batch(path_to_weights, model, device, batch),
+                    batch_meta,
+                ):
+                    if not len(det):
+                        continue
+                    det = det.float()
+                    det[:, [0, 2]] += col
+                    det[:, [1, 3]] += row
+                    cx = (det[:, 0] + det[:, 2]) / 2.0
+                    cy = (det[:, 1] + det[:, 3]) / 2.0
+                    owned = (
+                        (cx >= xb[0]) & (cx < xb[1]) & (cy >= yb[0]) & (cy < yb[1])
+                    )
+                    kept.append(det[owned].cpu())
+                batch.clear()
+                batch_meta.clear()
+
+            for row, yb in zip(row_offsets, row_bounds):
+                for col, xb in zip(col_offsets, col_bounds):
+                    win_w = min(tile_size, src.width - col)
+                    win_h = min(tile_size, src.height - row)
+                    data = src.read(
+                        [1, 2, 3], window=Window(col, row, win_w, win_h)
+                    )
+                    # Skip nodata tiles outside the surveyed area
+                    if not data.any():
+                        continue
+                    if band_range is not None:
+                        data = _scale_to_uint8(data, *band_range)
+
+                    tile = np.full((3, tile_size, tile_size), 114, dtype=np.uint8)
+                    tile[:, :win_h, :win_w] = data
+                    batch.append(tile)
+                    batch_meta.append((col, row, xb, yb))
+
+                    if len(batch) >= batch_size:
+                        flush()
+
+            if batch:
+                flush()
+
+        bbox_centers: List[Dict[str, int]] = []
+        confidence_scores: List[float] = []
+
+        if kept:
+            det = torch.cat(kept)
+            keep = torchvision.ops.nms(det[:, :4], det[:, 4], IOU_THRES)
+            det = det[keep]
+            centers = ((det[:, :2] + det[:, 2:4]) / 2.0).round().int().tolist()
+            bbox_centers = [{"x": cx, "y": cy} for cx, cy in centers]
+            confidence_scores = det[:, 4].tolist()
+
+        total_detections = len(bbox_centers)
+        logger.info(
+            "Karolu algılama tamamlandı: %s (%d karo, %d tespit)",
+            path_to_source,
+            len(col_offsets) * len(row_offsets),
+            total_detections,
+        )
+
+        count_str = f"{total_detections:02d}"
+        avg_confidence = (
+            sum(confidence_scores) / len(confidence_scores)
+            if confidence_scores
+            else 0.0
+        )
+        if return_boxes:
+            return count_str.encode("utf-8"), unique_id, avg_confidence, bbox_centers
+        return count_str.encode("utf-8"), unique_id, avg_confidence
+
+    except (FileNotFoundError, RuntimeError, ValueError, IOError):
+        raise
+    except Exception as e:
+        logger.error("Karolu algılama genel hatası: %s", e)
+        raise RuntimeError(f"Karolu algılama işlemi başarısız: {e}")
+
+
+def _load_letterboxed(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode an image and letterbox it into a contiguous RGB CHW array."""
+    im0 = cv2.imread(path)
+    if im0 is None:
+        raise FileNotFoundError(f"Görüntü okunamadı: {path}")
+    img = letterbox(im0, IMG_SIZE, stride=32)[0]
+    img = np.ascontiguousarray(img[:, :, ::-1].transpose(2, 0, 1))
+    return img, im0
+
+
+def _prefetch_images(
+    executor: ThreadPoolExecutor, paths: List[str], depth: int
+) -> Iterator[Tuple[int, str, Future]]:
+    """Yield decode futures in input order, keeping ``depth`` of them in flight."""
+    pending: Deque[Tuple[int, str, Future]] = deque()
+    it = iter(enumerate(paths))
+    for idx, path in it:
+        pending.append((idx, path, executor.submit(_load_letterboxed, path)))
+        if len(pending) >= depth:
+            break
+    while pending:
+        yield pending.popleft()
+        for idx, path in it:
+            pending.append((idx, path, executor.submit(_load_letterboxed, path)))
+            break
+
+
+def _result_writer(
+    jobs: "queue.Queue",
+    output_dir: Path,
+    archive: zipfile.ZipFile,
+    timer: StageTimer | Any = NULL_TIMER,
+) -> None:
+    """Draw, encode and persist annotated images until a ``None`` sentinel."""
+    color = [np_random.randint(0, 255) for _ in range(3)]
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        name, im0, det = job
+        try:
+            with timer.stage("draw"):
+                render_detections(im0, det, color)
+            with timer.stage("encode"):
+                ok, encoded = cv2.imencode(Path(name).suffix or ".jpg", im0)
+            if not ok:
+                raise IOError(f"Görüntü kodlanamadı: {name}")
+            data = encoded.tobytes()
+            with timer.stage("imwrite"):
+                (output_dir / name).write_bytes(data)
+                archive.writestr(f"detected/{name}", data)
+        except Exception as e:
+            logger.error("Görüntü kaydetme hatası: %s: %s", name, e)
+
+
 def multi_predictor(
     path_to_weights: str, path_to_source: str, ekim_sirasi: str, hashing: str
 ) -> str:
+    """Count detections for every image in a folder and package the results.
+
+    Images are decoded and letterboxed ahead of time by a thread pool, grouped
+    into same-shape batches for a single forward pass, and handed to a writer
+    thread that draws, encodes and stores the annotated images directly into
+    the result ZIP, so the model is not stalled by disk I/O.
+    """
     try:
         try:
             a_str, b_str = ekim_sirasi.split("-")
@@ -187,7 +727,11 @@ def multi_predictor(
             raise ValueError(f"Geçersiz ekim sırası formatı: {ekim_sirasi}")
 
         try:
-            path_to_source_images = natsorted(glob.glob(f"{path_to_source}/*"))
+            path_to_source_images = [
+                p
+                for p in natsorted(glob.glob(f"{path_to_source}/*"))
+                if Path(p).is_file()
+            ]
             if not path_to_source_images:
                 logger.error("Kaynak dizinde görüntü bulunamadı: %s", path_to_source)
                 raise FileNotFoundError(f"Görüntü bulunamadı: {path_to_source}")
@@ -197,12 +741,12 @@ def multi_predictor(
 
         model = get_model(path_to_weights)
         device = get_device()
+        timer = start_timer(path_to_weights, _cuda_sync(device))
 
-        img_size = 640
-        conf_thres = 0.1
-        iou_thres = 0.45
+        batch_size = getattr(settings, "MULTI_PREDICT_BATCH_SIZE", 8)
+        workers = getattr(settings, "MULTI_PREDICT_DECODE_WORKERS", 4)
 
-        detection_counts = []
+        detection_counts = [0] * len(path_to_source_images)
 
         try:
             output_dir = Path(path_to_source) / "detected"
@@ -211,55 +755,84 @@ def multi_predictor(
             logger.error("Çıktı dizini oluşturma hatası: %s", e)
             raise IOError(f"Dizin oluşturulamadı: {e}")
 
-        for img_path in path_to_source_images:
-            try:
-                dataset = LoadImages(img_path, img_size=img_size)
-
-                for path, img, im0s, vid_cap in dataset:
-                    img = torch.from_numpy(img).to(device)
-                    img = img.half() if device.type != "cpu" else img.float()
-                    img /= 255.0
-
-                    if img.ndimension() == 3:
-                        img = img.unsqueeze(0)
-
-                    with torch.no_grad():
-                        pred = model(img)[0]
-
-                    pred = non_max_suppression(pred, conf_thres, iou_thres)
-
-                    total_detections = 0
-                    for i, det in enumerate(pred):
-                        im0 = im0s.copy()
+        zip_path = BASE_DIR / "media" / f"{hashing}_result.zip"
+        zip_tmp_path = zip_path.with_name(zip_path.name + ".tmp")
+        try:
+            zip_path.parent.mkdir(parents=True, exist_ok=True)
+            archive = zipfile.ZipFile(
+                str(zip_tmp_path), mode="w", compression=zipfile.ZIP_DEFLATED
+            )
+        except Exception as e:
+            logger.error("ZIP oluşturma hatası: %s", e)
+            raise IOError(f"ZIP dosyası oluşturulamadı: {e}")
 
-                        if det:
-                            det[:, :4] = scale_coords(
-                                img.shape[2:], det[:, :4], im0.shape
-                            ).round()
-                            total_detections = len(det)
+        # Bounded so decoded images cannot pile up faster than they are written
+        write_queue: "queue.Queue" = queue.Queue(maxsize=batch_size * 2)
+        writer = threading.Thread(
+            target=_result_writer,
+            args=(write_queue, output_dir, archive, timer),
+            name="multi-predictor-writer",
+            daemon=True,
+        )
+        writer.start()
 
-                            colors = [[np_random.randint(0, 255) for _ in range(3)]]
+        batch: List[Tuple[int, str, np.ndarray, np.ndarray]] = []
 
-                            for *xyxy, conf, cls in reversed(det):
-                                label = f"{conf:.2f}"
-                                plot_one_box(
-                                    xyxy,
-                                    im0,
-                                    label=label,
-                                    color=colors[0],
-                                    line_thickness=2,
-                                )
+        def run_batch() -> None:
+            try:
+                with timer.stage("h2d"):
+                    img = torch.from_numpy(
+                        np.stack([item[2] for item in batch])
+                    ).to(device)
+                    img = img.half() if device.type != "cpu" else img.float()
+                    img /= 255.0
 
-                        img_name = Path(path).name
-                        output_path = output_dir / img_name
-                        if not cv2.imwrite(str(output_path), im0):
-                            logger.error("Görüntü kaydetme hatası: %s", output_path)
+                with timer.stage("forward"), torch.no_grad():
+                    pred = model(img)[0]
 
-                    detection_counts.append(total_detections)
+                pred = non_max_suppression(pred, CONF_THRES, IOU_THRES, timer=timer)
 
+                for (idx, path, _img, im0), det in zip(batch, pred):
+                    with timer.stage("scale_coords"):
+                        det[:, :4] = scale_coords(
+                            img.shape[2:], det[:, :4], im0.shape
+                        ).round()
+                    detection_counts[idx] = len(det)
+                    write_queue.put((Path(path).name, im0, det.cpu()))
             except Exception as e:
-                logger.error("Görüntü işleme hatası %s: %s", img_path, e)
-                detection_counts.append(0)
+                logger.error(
+                    "Görüntü işleme hatası %s: %s", [item[1] for item in batch], e
+                )
+            finally:
+                batch.clear()
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="multi-predictor-decode"
+            ) as executor:
+                for idx, path, future in _prefetch_images(
+                    executor, path_to_source_images, depth=batch_size * 2
+                ):
+                    try:
+                        # Time spent waiting on the decode/letterbox pool
+                        with timer.stage("decode_wait"):
+                            img, im0 = future.result()
+                    except Exception as e:
+                        logger.error("Görüntü işleme hatası %s: %s", path, e)
+                        continue
+
+                    if batch and (
+                        len(batch) >= batch_size or batch[0][2].shape != img.shape
+                    ):
+                        run_batch()
+                    batch.append((idx, path, img, im0))
+
+                if batch:
+                    run_batch()
+        finally:
+            write_queue.put(None)
+            writer.join()
+            timer.finish()
 
         try:
             excel_dir = Path(path_to_source) / "excel"
@@ -291,23 +864,19 @@ def multi_predictor(
 
         except Exception as e:
             logger.error("Excel oluşturma hatası: %s", e)
+            archive.close()
+            zip_tmp_path.unlink(missing_ok=True)
             raise IOError(f"Excel dosyası oluşturulamadı: {e}")
 
         try:
-            zip_path = BASE_DIR / "media" / f"{hashing}_result.zip"
-            zip_path.parent.mkdir(parents=True, exist_ok=True)
-
-            with zipfile.ZipFile(
-                str(zip_path), mode="w", compression=zipfile.ZIP_DEFLATED
-            ) as archive:
-                archive.write(str(excel_dir / "output.xlsx"), "output.xlsx")
-                for img in natsorted(output_dir.glob("*")):
-                    archive.write(str(img), f"detected/{img.name}")
-
+            archive.write(str(excel_path), "output.xlsx")
+            archive.close()
+            zip_tmp_path.replace(zip_path)
             logger.info("ZIP dosyası oluşturuldu: %s", zip_path)
 
         except Exception as e:
             logger.error("ZIP oluşturma hatası: %s", e)
+            zip_tmp_path.unlink(missing_ok=True)
             raise IOError(f"ZIP dosyası oluşturulamadı: {e}")
 
         return hashing
@@ -317,5 +886,3 @@ def multi_predictor(
     except Exception as e:
         logger.error("Multi predictor genel hatası: %s", e)
         raise RuntimeError(f"Çoklu algılama işlemi başarısız: {e}")
-
-
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Block-aligned windowed reads of multi-band rasters.
+
+GDAL reads a GeoTIFF one internal block (tile or strip) at a time, so a
+window that straddles block boundaries decodes the partial blocks on both
+sides and a later window decodes them again. Windows produced here are whole
+multiples of the raster's block shape, laid out on the block grid, and as
+large as ``RASTER_WINDOW_BUDGET_MB`` allows for the bands being read: every
+block is decoded exactly once and a striped file is read in full-width
+bands of rows.
+
+All bands a caller needs come from one ``read(indexes=[...])`` call into a
+buffer that is reused from window to window.
+"""
+import math
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from rasterio.windows import Window
+
+
+def _budget_bytes() -> int:
+    return int(getattr(settings, "RASTER_WINDOW_BUDGET_MB", 16) * 2**20)
+
+
+def window_shape(
+    src: Any,
+    band_count: int,
+    dtype: Any = np.float32,
+    budget_bytes: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    ``(height, width)`` of the windows :func:`aligned_windows` yields.
+
+    Blocks are added along a block row first, then whole block rows, until
+    ``band_count`` bands of ``dtype`` would exceed the budget. At least one
+    block is always read.
+
+    Args:
+        src: Open rasterio dataset
+        band_count: Number of bands read per window
+        dtype: Dtype the bands are read as
+        budget_bytes: Size limit of one window's bands; RASTER_WINDOW_BUDGET_MB
+            by default
+
+    Returns:
+        tuple: Window height and width in pixels, before clipping at the
+        raster edge
+    """
+    if budget_bytes is None:
+        budget_bytes = _budget_bytes()
+    block_h, block_w = src.block_shapes[0]
+    pixel_bytes = max(1, band_count) * np.dtype(dtype).itemsize
+    max_blocks = max(1, budget_bytes // (block_h * block_w * pixel_bytes))
+
+    cols = min(math.ceil(src.width / block_w), max_blocks)
+    rows = min(math.ceil(src.height / block_h), max(1, max_blocks // cols))
+    return rows * block_h, cols * block_w
+
+
+def aligned_windows(
+    src: Any,
+    band_count: int,
+    dtype: Any = np.float32,
+    budget_bytes: Optional[int] = None,
+) -> List[Window]:
+    """Windows covering ``src`` in row-major order, aligned to its block grid."""
+    height, width = window_shape(src, band_count, dtype, budget_bytes)
+    return [
+        Window(
+            col_off,
+            row_off,
+            min(width, src.width - col_off),
+            min(height, src.height - row_off),
+        )
+        for row_off in range(0, src.height, height)
+        for col_off in range(0, src.width, width)
+    ]
+
+
+def read_bands(
+    src: Any, window: Window, indexes: Sequence[int], out: np.ndarray
+) -> np.ndarray:
+    """
+    Read ``indexes`` of ``window`` into ``out`` with a single dataset read.
+
+    GDAL converts to ``out.dtype`` while reading, so no intermediate array of
+    the source dtype is allocated.
+
+    Args:
+        src: Open rasterio dataset
+        window: Window to read
+        indexes: 1-based band numbers, in the order they fill ``out``
+        out: Array of shape ``(len(indexes), window.height, window.width)``
+
+    Returns:
+        np.ndarray: ``out``
+    """
+    return src.read(list(indexes), window=window, out=out, out_dtype=out.dtype)
+
+
+class WindowBuffers:
+    """
+    Read buffers reused across windows, one per window shape.
+
+    Aligned windows come in at most four shapes (interior, right edge, bottom
+    edge, corner), so a full pass allocates at most four buffers.
+    """
+
+    def __init__(self, band_count: int, dtype: Any = np.float32) -> None:
+        self.band_count = band_count
+        self.dtype = np.dtype(dtype)
+        self._buffers: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def get(self, window: Window) -> np.ndarray:
+        shape = (int(window.height), int(window.width))
+        buffer = self._buffers.get(shape)
+        if buffer is None:
+            buffer = self._buffers[shape] = np.empty(
+                (self.band_count,) + shape, dtype=self.dtype
+            )
+        return buffer
+
+
+def iter_windows(
+    src: Any,
+    indexes: Sequence[int],
+    dtype: Any = np.float32,
+    budget_bytes: Optional[int] = None,
+) -> Iterator[Tuple[Window, np.ndarray]]:
+    """
+    Yield ``(window, bands)`` over the whole raster.
+
+    ``bands`` has shape ``(len(indexes), height, width)`` and is overwritten
+    by the next window; copy anything that must outlive the iteration step.
+
+    Args:
+        src: Open rasterio dataset
+        indexes: 1-based band numbers to read
+        dtype: Dtype the bands are converted to while reading
+        budget_bytes: Size limit of one window's bands; RASTER_WINDOW_BUDGET_MB
+            by default
+    """
+    buffers = WindowBuffers(len(indexes), dtype)
+    for window in aligned_windows(src, len(indexes), dtype, budget_bytes):
+        yield window, read_bands(src, window, indexes, buffers.get(window))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed store for derived index rasters.
+
+Every vegetation index rendering is written to
+``static/results/<project>/indices/<key>.tif``, where the key is derived from
+the source raster fingerprint, the index, the value range, the colormap and
+the rescale flag. A repeated request is answered with the stored file
+without reading the orthophoto, and different indices no longer overwrite
+each other's output.
+
+Files are written under a temporary name and renamed into place. Each
+project's store is bounded by INDEX_RASTER_STORE_MAX_MB; the least recently
+used rasters (by mtime, refreshed on every hit) are evicted first.
+
+Stored rasters are Cloud-Optimized GeoTIFFs. Their pixel values are the same
+as before, so rasters stored earlier keep their keys; the ``convert_to_cog``
+management command rewrites them in place.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Bump when the rendering of stored rasters changes
+STORE_VERSION = 1
+
+
+def source_fingerprint(path: str | Path) -> str:
+    """Fingerprint of a raster that changes whenever it is rewritten."""
+    stat = os.stat(str(path))
+    parts = [str(Path(path).resolve()), str(stat.st_size), str(stat.st_mtime_ns)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def index_key(
+    source_path: str | Path,
+    index_name: str,
+    ranges: Tuple[float, float],
+    colormap: Optional[str],
+    rescale: bool,
+) -> str:
+    """Store key of one rendering of ``source_path``."""
+    parts = [
+        str(STORE_VERSION),
+        source_fingerprint(source_path),
+        index_name,
+        repr(tuple(float(v) for v in ranges)),
+        colormap or "",
+        str(bool(rescale)),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:24]
+
+
+def store_dir(project: str) -> Path:
+    return BASE_DIR / "static" / "results" / project / "indices"
+
+
+def relative_path(project: str, key: str) -> str:
+    """Path of a stored raster relative to ``static/``."""
+    return f"results/{project}/indices/{key}.tif"
+
+
+def lookup(project: str, key: str) -> Optional[Path]:
+    """Stored raster for ``key``, marked as recently used; None on a miss."""
+    path = store_dir(project) / f"{key}.tif"
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    logger.info("İndeks rasterı önbellekten: %s", relative_path(project, key))
+    return path
+
+
+def temp_path(project: str, key: str) -> Path:
+    """Private file to render ``key`` into before :func:`publish`."""
+    directory = store_dir(project)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.tif"
+
+
+def publish(project: str, key: str, tmp_path: Path) -> Path:
+    """Atomically move a rendered raster into place and enforce the size bound."""
+    path = store_dir(project) / f"{key}.tif"
+    os.replace(tmp_path, path)
+    evict(project, keep=path)
+    return path
+
+
+def evict(project: str, keep: Any = None) -> int:
+    """
+    Delete least recently used rasters until the project fits its budget.
+
+    Args:
+        project: Project directory name
+        keep: Path that must not be evicted (the raster just published)
+
+    Returns:
+        int: Number of files deleted
+    """
+    max_bytes = getattr(settings, "INDEX_RASTER_STORE_MAX_MB", 2048) * 2**20
+    if max_bytes <= 0:
+        return 0
+
+    entries = []
+    for path in store_dir(project).glob("*.tif"):
+        if path.name.endswith(".tmp.tif"):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    deleted = 0
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        deleted += 1
+
+    if deleted:
+        logger.info("İndeks rasterı deposundan %s dosya silindi (%s)", deleted, project)
+    return deleted
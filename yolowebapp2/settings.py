@@ -367,6 +367,92 @@ ODM_TOKEN = os.environ.get("ODM_TOKEN", "")
 # Set to False to disable ODM integration entirely (use pre-processed orthophotos)
 ODM_ENABLED = os.environ.get("ODM_ENABLED", "True") == "True"
 
+# ==============================================================================
+# INFERENCE
+# ==============================================================================
+
+# Tiled (sliced) inference for full-resolution orthophotos, in pixels.
+# Tile size must be a multiple of the model stride (32).
+TILED_INFERENCE_TILE_SIZE = int(os.environ.get("TILED_INFERENCE_TILE_SIZE", "640"))
+TILED_INFERENCE_OVERLAP = int(os.environ.get("TILED_INFERENCE_OVERLAP", "128"))
+TILED_INFERENCE_BATCH_SIZE = int(os.environ.get("TILED_INFERENCE_BATCH_SIZE", "4"))
+
+# Dynamic micro-batching: concurrent single-image requests for the same model
+# are grouped into one forward pass, flushed when the batch is full or when
+# the oldest request has waited INFERENCE_MAX_WAIT_MS. Off by default: it only
+# pays off in the concurrent gunicorn web workers (gunicorn_config.py turns it
+# on there); in Celery prefork children it would only add the wait.
+INFERENCE_BATCHING_ENABLED = (
+    os.environ.get("INFERENCE_BATCHING_ENABLED", "False") == "True"
+)
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "5"))
+# Seconds a request waits for the batcher before running the model directly
+INFERENCE_BATCH_TIMEOUT_S = float(os.environ.get("INFERENCE_BATCH_TIMEOUT_S", "10"))
+
+# Folder (multi-image) detection pipeline: images per forward pass and number
+# of threads decoding/letterboxing images ahead of the model.
+MULTI_PREDICT_BATCH_SIZE = int(os.environ.get("MULTI_PREDICT_BATCH_SIZE", "8"))
+MULTI_PREDICT_DECODE_WORKERS = int(os.environ.get("MULTI_PREDICT_DECODE_WORKERS", "4"))
+
+# Fraction of detection requests whose per-stage latencies are recorded into
+# the /metrics/ histograms and DetectionResult.stage_timings (0 disables).
+INFERENCE_METRICS_SAMPLE_RATE = float(
+    os.environ.get("INFERENCE_METRICS_SAMPLE_RATE", "0.1")
+)
+# /metrics/ is served to staff users and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" (empty = staff only).
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# ONNX Runtime backend (models with "backend": "onnx" in MODEL_REGISTRY).
+# Intra-op threads per session; 0 lets the runtime use all physical cores.
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))
+
+# Loaded-model cache: least recently used models are evicted once their
+# parameter/buffer memory exceeds this budget (0 = unlimited).
+MODEL_CACHE_MAX_MB = int(os.environ.get("MODEL_CACHE_MAX_MB", "2048"))
+# Fused + traced models are stored once per (weights SHA256, input size,
+# device, torch version) and loaded directly by later workers.
+MODEL_ARTIFACT_CACHE_ENABLED = (
+    os.environ.get("MODEL_ARTIFACT_CACHE_ENABLED", "True") == "True"
+)
+MODEL_ARTIFACT_CACHE_DIR = Path(
+    os.environ.get("MODEL_ARTIFACT_CACHE_DIR", str(BASE_DIR / "models" / ".cache"))
+)
+# Drone project analysis artifacts (tree detections, stress zones, average
+# NDVI) are stored per project and reused until the orthophoto changes.
+ANALYSIS_CACHE_ENABLED = os.environ.get("ANALYSIS_CACHE_ENABLED", "True") == "True"
+ANALYSIS_CACHE_DIR = Path(
+    os.environ.get("ANALYSIS_CACHE_DIR", str(BASE_DIR / "cache" / "analysis"))
+)
+# Rendered vegetation index rasters kept per project (least recently used
+# evicted first once the project's store exceeds this size)
+INDEX_RASTER_STORE_MAX_MB = int(os.environ.get("INDEX_RASTER_STORE_MAX_MB", "2048"))
+# Threads rendering vegetation index windows concurrently (1 = serial). Each
+# thread reads through its own dataset handle; writes stay in window order.
+INDEX_RENDER_WORKERS = int(
+    os.environ.get("INDEX_RENDER_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# Memory for the bands of one raster read window. Windows are whole multiples
+# of the GeoTIFF's internal blocks, as many as fit in this budget.
+RASTER_WINDOW_BUDGET_MB = int(os.environ.get("RASTER_WINDOW_BUDGET_MB", "16"))
+# Compression of Cloud-Optimized GeoTIFF outputs (index rasters). ZSTD is
+# smaller and faster to decode but needs a GDAL built with it.
+COG_COMPRESS = os.environ.get("COG_COMPRESS", "DEFLATE")
+# Models loaded and warmed up with a dummy forward pass when a Celery or
+# gunicorn worker starts. Names are relative to models/.
+# gunicorn_config.py reads MODEL_WARMUP_ENABLED from the environment too.
+MODEL_WARMUP_ENABLED = os.environ.get("MODEL_WARMUP_ENABLED", "True") == "True"
+MODEL_WARMUP_MODELS = [
+    name.strip()
+    for name in os.environ.get("MODEL_WARMUP_MODELS", "mandalina.pt").split(",")
+    if name.strip()
+]
+# Load MODEL_WARMUP_MODELS once in the gunicorn master / Celery main process
+# so forked workers share the weight pages copy-on-write (CPU nodes only).
+# gunicorn_config.py reads the same variable to enable preload_app.
+MODEL_SHARED_PRELOAD = os.environ.get("MODEL_SHARED_PRELOAD", "False") == "True"
+
 # ==============================================================================
 # EMAIL
 # ==============================================================================
@@ -520,6 +606,29 @@ CACHES = {
 }
 
 
-# Cache key format for predictions
-PREDICTION_CACHE_KEY_FORMAT = "prediction:{image_hash}:{fruit_type}"
+# Cache key format for predictions. {generation} is bumped per fruit type to
+# invalidate in O(1); {model} changes with the weights and inference params.
+PREDICTION_CACHE_KEY_FORMAT = "prediction:{fruit_type}:{generation}:{model}:{image_hash}"
+# Seconds a process reuses a fruit's generation before re-reading it
+PREDICTION_GENERATION_TTL = 5
 PREDICTION_CACHE_TIMEOUT = 86400  # 24 hours
+# In-process LRU tier in front of Redis (entries, seconds)
+PREDICTION_LOCAL_CACHE_SIZE = 512
+PREDICTION_LOCAL_CACHE_TTL = 300
+# Single-flight: the lock expires after PREDICTION_LOCK_TIMEOUT seconds if its
+# holder dies; waiters give up and compute themselves after PREDICTION_LOCK_WAIT
+PREDICTION_LOCK_TIMEOUT = 120
+PREDICTION_LOCK_WAIT = 60
+PREDICTION_LOCK_POLL_INTERVAL = 0.1
+# Per-fruit, per-day hit/miss/set counters: buffered per process and written
+# to Redis every PREDICTION_STATS_FLUSH_INTERVAL seconds
+PREDICTION_STATS_FLUSH_INTERVAL = 10
+PREDICTION_STATS_RETENTION_DAYS = 30
+# Near-duplicate lookup: an upload whose 64-bit dHash is within this many bits
+# of an earlier image reuses that image's prediction (re-compressed, resized
+# or EXIF-edited re-uploads). 0 disables the lookup. Off by default: a 9x8
+# dHash cannot tell apart similar orchard photos reliably, so enable it
+# (1-4) only after validating it on your own imagery.
+PREDICTION_NEAR_DUPLICATE_MAX_DISTANCE = int(
+    os.getenv("PREDICTION_NEAR_DUPLICATE_MAX_DISTANCE", "0")
+)
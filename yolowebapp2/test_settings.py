@@ -3,8 +3,17 @@
 Test-specific Django settings.
 Overrides production settings for testing.
 """
+import tempfile
+
 from .settings import *
 
+# ============================================
+# KEEP GENERATED FILES OUT OF THE SOURCE TREE
+# ============================================
+# Saving a DetectionResult generates its reports eagerly; the report
+# generators and uploads write below MEDIA_ROOT.
+MEDIA_ROOT = tempfile.mkdtemp(prefix="farmvision-test-media-")
+
 # ============================================
 # OVERRIDE CACHE TO USE DUMMY BACKEND
 # ============================================
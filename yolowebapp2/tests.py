@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the shared inference infrastructure in yolowebapp2.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+import openpyxl
+import rasterio
+import torch
+from django.test import SimpleTestCase, override_settings
+
+from yolowebapp2 import artifact_cache, metrics, predict_tree, raster_io
+from utils import general  # noqa: E402  (detection/yolo, added to sys.path by predict_tree)
+from yolowebapp2.batching import MicroBatcher
+from yolowebapp2.model_cache import ModelCache, model_nbytes
+
+
+def _echo_forward(calls):
+    """Fake model: returns the per-image mean so results can be matched."""
+
+    def forward(batch):
+        calls.append(batch.shape[0])
+        return batch.mean(dim=(1, 2, 3)).view(-1, 1, 1)
+
+    return forward
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_requests_share_one_forward_pass(self):
+        calls = []
+        batcher = MicroBatcher(
+            _echo_forward(calls), "test", max_batch_size=4, max_wait_ms=500
+        )
+        results = {}
+
+        def worker(value):
+            tensor = torch.full((1, 3, 8, 8), float(value))
+            results[value] = batcher.infer(tensor, timeout=5).item()
+
+        threads = [threading.Thread(target=worker, args=(v,)) for v in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, {0: 0.0, 1: 1.0, 2: 2.0, 3: 3.0})
+        self.assertEqual(calls, [4])
+        stats = batcher.stats.snapshot()
+        self.assertEqual(stats["items"], 4)
+        self.assertEqual(stats["fill_rate"], 1.0)
+
+    def test_deadline_flushes_partial_batch(self):
+        calls = []
+        batcher = MicroBatcher(
+            _echo_forward(calls), "test", max_batch_size=8, max_wait_ms=1
+        )
+        result = batcher.infer(torch.ones((3, 8, 8)), timeout=5)
+
+        self.assertEqual(result.shape[0], 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(batcher.stats.snapshot()["fill_rate"], 0.125)
+
+    def test_mixed_shapes_run_separate_forward_passes(self):
+        calls = []
+        batcher = MicroBatcher(
+            _echo_forward(calls), "test", max_batch_size=2, max_wait_ms=500
+        )
+        first = batcher.submit(torch.zeros((1, 3, 8, 8)))
+        second = batcher.submit(torch.ones((1, 3, 16, 8)))
+
+        self.assertEqual(first.result(timeout=5).item(), 0.0)
+        self.assertEqual(second.result(timeout=5).item(), 1.0)
+        self.assertEqual(sorted(calls), [1, 1])
+        self.assertEqual(batcher.stats.snapshot()["forward_passes"], 2)
+
+    def test_forward_error_is_raised_to_every_caller(self):
+        def failing(batch):
+            raise RuntimeError("CUDA OOM")
+
+        batcher = MicroBatcher(failing, "test", max_batch_size=1, max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            batcher.infer(torch.zeros((1, 3, 8, 8)), timeout=5)
+
+    def test_cancelled_requests_are_skipped(self):
+        calls = []
+        batcher = MicroBatcher(
+            _echo_forward(calls), "test", max_batch_size=2, max_wait_ms=200
+        )
+        abandoned = batcher.submit(torch.zeros((1, 3, 8, 8)))
+        self.assertTrue(abandoned.cancel())
+        kept = batcher.submit(torch.ones((1, 3, 8, 8)))
+
+        self.assertEqual(kept.result(timeout=5).item(), 1.0)
+        self.assertEqual(calls, [1])
+
+    @override_settings(INFERENCE_BATCHING_ENABLED=True, INFERENCE_BATCH_TIMEOUT_S=0.05)
+    def test_forward_falls_back_when_batcher_times_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def stuck(batch):
+            release.wait(5)
+            return batch
+
+        batcher = MicroBatcher(stuck, "test", max_batch_size=1, max_wait_ms=0)
+        model = MagicMock(return_value=(torch.full((1, 2, 6), 7.0),))
+        with patch.object(predict_tree, "get_batcher", return_value=batcher):
+            pred = predict_tree._forward("elma.pt", model, torch.zeros((1, 3, 8, 8)))
+
+        model.assert_called_once()
+        self.assertEqual(pred[0, 0, 0].item(), 7.0)
+
+
+class _FakeDetector:
+    """One confident 20 px box per image; records forward batch shapes."""
+
+    def __init__(self):
+        self.batch_shapes = []
+
+    def __call__(self, img):
+        self.batch_shapes.append(tuple(img.shape))
+        pred = torch.zeros((img.shape[0], 1, 6))
+        pred[:, 0, :4] = torch.tensor([50.0, 50.0, 20.0, 20.0])
+        pred[:, 0, 4:] = 0.9
+        return (pred,)
+
+
+@override_settings(MULTI_PREDICT_BATCH_SIZE=2, MULTI_PREDICT_DECODE_WORKERS=2)
+class MultiPredictorPipelineTests(SimpleTestCase):
+    def _run(self, tmp, ekim_sirasi="2-3"):
+        source = Path(tmp) / "src"
+        source.mkdir()
+        for i in range(6):
+            h = 320 if i < 3 else 480
+            cv2.imwrite(str(source / f"img{i}.jpg"), np.full((h, 320, 3), 90, np.uint8))
+
+        model = _FakeDetector()
+        with patch.object(predict_tree, "BASE_DIR", Path(tmp)), \
+             patch.object(predict_tree, "get_model", return_value=model), \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cpu")):
+            predict_tree.multi_predictor("elma.pt", str(source), ekim_sirasi, "abc")
+        return source, model
+
+    def test_batches_same_shape_images_and_packages_results(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source, model = self._run(tmp)
+
+            self.assertEqual(len(model.batch_shapes), 4)
+            self.assertTrue(all(s[0] <= 2 for s in model.batch_shapes))
+            self.assertEqual(sum(s[0] for s in model.batch_shapes), 6)
+
+            ws = openpyxl.load_workbook(source / "excel" / "output.xlsx").active
+            self.assertEqual(
+                [list(r) for r in ws.iter_rows(values_only=True)],
+                [[1, 1, 1], [1, 1, 1]],
+            )
+
+            with zipfile.ZipFile(Path(tmp) / "media" / "abc_result.zip") as archive:
+                names = set(archive.namelist())
+            self.assertIn("output.xlsx", names)
+            self.assertEqual(
+                {n for n in names if n.startswith("detected/")},
+                {f"detected/img{i}.jpg" for i in range(6)},
+            )
+            self.assertEqual(len(list((source / "detected").iterdir())), 6)
+
+    def test_layout_mismatch_leaves_no_partial_zip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(IOError):
+                self._run(tmp, ekim_sirasi="2-2")
+            self.assertEqual(list((Path(tmp) / "media").iterdir()), [])
+
+
+class OnnxBackendSelectionTests(SimpleTestCase):
+    def setUp(self):
+        predict_tree._model_cache.clear()
+        self.addCleanup(predict_tree._model_cache.clear)
+
+    def _get_model(self, tmp, backend, onnx_model=None):
+        weights = Path(tmp) / "elma.pt"
+        weights.touch()
+        torch_model = _FakeDetector()
+        torch_model.eval = lambda: torch_model
+        with patch.object(predict_tree, "get_model_backend", return_value=backend), \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cpu")), \
+             patch.object(predict_tree, "attempt_load", return_value=torch_model), \
+             patch.object(predict_tree.onnx_backend, "is_available", return_value=True), \
+             patch.object(predict_tree.onnx_backend, "OnnxModel", return_value=onnx_model):
+            return predict_tree.get_model(str(weights)), torch_model
+
+    def test_onnx_backend_uses_exported_graph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "elma.onnx").touch()
+            onnx_model = object()
+            model, _ = self._get_model(tmp, "onnx", onnx_model)
+            self.assertIs(model, onnx_model)
+
+    def test_missing_graph_falls_back_to_pytorch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            model, torch_model = self._get_model(tmp, "onnx", object())
+            self.assertIs(model, torch_model)
+
+
+class ModelCacheTests(SimpleTestCase):
+    def test_model_size_counts_parameters_and_buffers(self):
+        model = torch.nn.BatchNorm2d(4)
+        # weight, bias, running_mean, running_var (float32) + num_batches_tracked (int64)
+        self.assertEqual(model_nbytes(model), 4 * 4 * 4 + 8)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        size = model_nbytes(torch.nn.Linear(16, 16))
+        cache = ModelCache(max_bytes=2 * size)
+        cache.put("a", torch.nn.Linear(16, 16))
+        cache.put("b", torch.nn.Linear(16, 16))
+        cache.get("a")
+        cache.put("c", torch.nn.Linear(16, 16))
+
+        self.assertEqual(list(cache), ["a", "c"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.total_bytes, 2 * size)
+
+    def test_oversized_model_is_still_cached(self):
+        cache = ModelCache(max_bytes=1)
+        cache.put("a", torch.nn.Linear(4, 4))
+        cache.put("b", torch.nn.Linear(4, 4))
+        self.assertEqual(list(cache), ["b"])
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_runs_dummy_forward_and_skips_failures(self):
+        model = _FakeDetector()
+
+        def fake_get_model(name):
+            if name.endswith("missing.pt"):
+                raise FileNotFoundError(name)
+            return model
+
+        with patch.object(predict_tree, "get_model", side_effect=fake_get_model), \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cpu")):
+            warmed = predict_tree.warm_up_models(["elma.pt", "missing.pt"])
+
+        self.assertEqual(warmed, [str(predict_tree.BASE_DIR / "models" / "elma.pt")])
+        self.assertEqual(
+            model.batch_shapes, [(1, 3, predict_tree.IMG_SIZE, predict_tree.IMG_SIZE)]
+        )
+
+
+class SharedPreloadTests(SimpleTestCase):
+    def test_loads_models_without_forward_pass(self):
+        model = _FakeDetector()
+        with patch.object(predict_tree, "get_model", return_value=model) as get_model, \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cpu")), \
+             patch.object(predict_tree.gc, "freeze") as freeze:
+            loaded = predict_tree.preload_shared_models(["elma.pt"])
+
+        self.assertEqual(loaded, [str(predict_tree.BASE_DIR / "models" / "elma.pt")])
+        get_model.assert_called_once()
+        freeze.assert_called_once()
+        self.assertEqual(model.batch_shapes, [])
+
+    def test_skipped_on_gpu(self):
+        with patch.object(predict_tree, "get_model") as get_model, \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cuda")):
+            self.assertEqual(predict_tree.preload_shared_models(["elma.pt"]), [])
+        get_model.assert_not_called()
+
+    def test_gevent_master_is_patched_before_preload(self):
+        for patched in (True, False):
+            monkey = MagicMock()
+            monkey.is_module_patched.return_value = patched
+            spec = importlib.util.spec_from_file_location(
+                "gunicorn_config", predict_tree.BASE_DIR / "gunicorn_config.py"
+            )
+            config = importlib.util.module_from_spec(spec)
+            with self.subTest(patched=patched), \
+                 patch.dict(os.environ, {"MODEL_SHARED_PRELOAD": "True"}), \
+                 patch.dict(sys.modules, {"gevent": MagicMock(monkey=monkey)}), \
+                 patch.object(predict_tree, "preload_shared_models", return_value=[]) as preload:
+                spec.loader.exec_module(config)
+                monkey.patch_all.assert_called_once()
+
+                config.when_ready(MagicMock())
+                # Models are never loaded into a master whose locks are unpatched
+                self.assertEqual(preload.called, patched)
+
+
+class ArtifactCacheTests(SimpleTestCase):
+    def _compiled(self):
+        conv = torch.nn.Conv2d(3, 2, 1)
+        backbone = torch.jit.trace(conv, torch.rand(1, 3, 8, 8))
+        return artifact_cache.CompiledModel(backbone, torch.nn.Identity(), 32, ["a"])
+
+    def test_key_depends_on_content_size_and_device(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = Path(tmp) / "elma.pt"
+            weights.write_bytes(b"v1")
+            cpu = torch.device("cpu")
+            key = artifact_cache.artifact_key(weights, 640, cpu)
+
+            self.assertEqual(key, artifact_cache.artifact_key(weights, 640, cpu))
+            self.assertNotEqual(key, artifact_cache.artifact_key(weights, 320, cpu))
+            weights.write_bytes(b"v2-longer")
+            self.assertNotEqual(key, artifact_cache.artifact_key(weights, 640, cpu))
+
+    def test_compiles_once_then_loads_artifact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = Path(tmp) / "elma.pt"
+            weights.write_bytes(b"weights")
+            cache_dir = Path(tmp) / "cache"
+            compiled = self._compiled()
+            x = torch.rand(1, 3, 16, 16)
+
+            with patch.object(artifact_cache, "_compile", return_value=compiled) as build:
+                first = artifact_cache.load_compiled_model(
+                    weights, torch.device("cpu"), 640, cache_dir, None
+                )
+                second = artifact_cache.load_compiled_model(
+                    weights, torch.device("cpu"), 640, cache_dir, None
+                )
+
+            self.assertEqual(build.call_count, 1)
+            self.assertEqual(len(list(cache_dir.iterdir())), 2)
+            self.assertTrue(torch.allclose(first(x), second(x)))
+            self.assertEqual(second.names, ["a"])
+
+
+class RasterWindowTests(SimpleTestCase):
+    def _raster(self, tmp, **profile):
+        path = Path(tmp) / "ortho.tif"
+        data = np.random.default_rng(0).integers(0, 4000, (4, 700, 1100), dtype=np.uint16)
+        with rasterio.open(
+            path, "w", driver="GTiff", width=1100, height=700, count=4,
+            dtype="uint16", **profile,
+        ) as dst:
+            dst.write(data)
+        return path, data
+
+    def test_windows_follow_block_grid_within_budget(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path, _ = self._raster(tmp, tiled=True, blockxsize=256, blockysize=256)
+            with rasterio.open(path) as src:
+                # Room for six 256x256 blocks of two float32 bands
+                budget = 6 * 256 * 256 * 2 * 4
+                shape = raster_io.window_shape(src, 2, budget_bytes=budget)
+                windows = raster_io.aligned_windows(src, 2, budget_bytes=budget)
+
+        self.assertEqual(shape, (256, 1280))
+        for window in windows:
+            self.assertEqual(window.col_off % 256, 0)
+            self.assertEqual(window.row_off % 256, 0)
+        self.assertEqual(sum(w.width * w.height for w in windows), 1100 * 700)
+
+    def test_striped_raster_is_read_in_full_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path, _ = self._raster(tmp)
+            with rasterio.open(path) as src:
+                windows = raster_io.aligned_windows(src, 4, budget_bytes=2**20)
+                block_h = src.block_shapes[0][0]
+
+        self.assertTrue(all(w.width == 1100 and w.col_off == 0 for w in windows))
+        self.assertTrue(all(w.row_off % block_h == 0 for w in windows))
+
+    def test_iter_windows_reads_bands_in_one_call(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path, data = self._raster(tmp, tiled=True, blockxsize=256, blockysize=256)
+            mosaic = np.zeros((2, 700, 1100), dtype=np.float32)
+            with rasterio.open(path) as src:
+                with patch.object(src, "read", wraps=src.read) as mock_read:
+                    for window, bands in raster_io.iter_windows(
+                        src, [4, 1], budget_bytes=2 * 256 * 256 * 2 * 4
+                    ):
+                        rows, cols = window.toslices()
+                        mosaic[:, rows, cols] = bands
+                count = mock_read.call_count
+
+        self.assertEqual(count, len(range(0, 700, 256)) * len(range(0, 1100, 512)))
+        np.testing.assert_array_equal(mosaic, data[[3, 0]].astype(np.float32))
+
+
+class _FakeRedis:
+    """The few hash/set commands the metrics aggregate uses, pipelined."""
+
+    def __init__(self):
+        self.data = {}
+        self._queued = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hincrby(self, key, field, amount):
+        self._queued.append(lambda: self._incr(key, field, int(amount)))
+
+    def hincrbyfloat(self, key, field, amount):
+        self._queued.append(lambda: self._incr(key, field, float(amount)))
+
+    def sadd(self, key, member):
+        self._queued.append(lambda: self.data.setdefault(key, set()).add(member.encode()))
+
+    def hgetall(self, key):
+        self._queued.append(
+            lambda: {k.encode(): str(v).encode() for k, v in self.data.get(key, {}).items()}
+        )
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def execute(self):
+        queued, self._queued = self._queued, []
+        return [fn() for fn in queued]
+
+    def _incr(self, key, field, amount):
+        row = self.data.setdefault(key, {})
+        row[field] = row.get(field, 0) + amount
+
+
+class StageMetricsTests(SimpleTestCase):
+    @override_settings(INFERENCE_METRICS_SAMPLE_RATE=0)
+    def test_disabled_sampling_returns_null_timer(self):
+        timer = metrics.start_timer("models/elma.pt")
+        with timer.stage("forward"):
+            pass
+        self.assertFalse(timer.sampled)
+        self.assertEqual(timer.finish(), {})
+
+    @override_settings(INFERENCE_METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN="scrape")
+    def test_stages_accumulate_and_reach_metrics_endpoint(self):
+        timer = metrics.start_timer("models/metrics-test.pt")
+        for _ in range(2):
+            with timer.stage("nms"):
+                pass
+        timer.add("forward", 0.02)
+        timings = timer.finish()
+
+        self.assertEqual(set(timings), {"nms", "forward"})
+        self.assertEqual(timings["forward"], 20.0)
+
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape")
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'farmvision_inference_stage_seconds_bucket{stage="forward",'
+            'model="metrics-test.pt",le="0.025"} 1',
+            body,
+        )
+        self.assertIn(
+            'farmvision_inference_stage_seconds_count{stage="nms",'
+            'model="metrics-test.pt"} 1',
+            body,
+        )
+
+    @override_settings(METRICS_TOKEN="scrape")
+    def test_metrics_endpoint_requires_staff_or_token(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(INFERENCE_METRICS_SAMPLE_RATE=1.0)
+    def test_processes_share_histograms_through_redis(self):
+        redis = _FakeRedis()
+        with patch.object(metrics, "_redis", return_value=redis):
+            # Two workers: each has its own local histograms but one Redis
+            metrics.record_stages("shared.pt", {"forward": 0.02})
+            with patch.object(metrics, "_histograms", {}):
+                metrics.record_stages("shared.pt", {"forward": 0.2})
+                body = metrics.render_prometheus()
+
+        self.assertIn(
+            'farmvision_inference_stage_seconds_bucket{stage="forward",'
+            'model="shared.pt",le="0.025"} 1',
+            body,
+        )
+        self.assertIn(
+            'farmvision_inference_stage_seconds_count{stage="forward",'
+            'model="shared.pt"} 2',
+            body,
+        )
+
+    @override_settings(INFERENCE_METRICS_SAMPLE_RATE=1.0)
+    def test_nms_records_filter_and_kernel_stages(self):
+        timer = metrics.StageTimer("elma.pt")
+        pred = _FakeDetector()(torch.zeros((2, 3, 64, 64)))[0]
+        out = predict_tree.non_max_suppression(pred, 0.1, 0.45, timer=timer)
+        self.assertEqual([len(d) for d in out], [1, 1])
+        self.assertEqual(set(timer.timings), {"nms_filter", "nms"})
+
+
+@override_settings(INFERENCE_BATCHING_ENABLED=False, INFERENCE_METRICS_SAMPLE_RATE=0)
+class PredictPostprocessTests(SimpleTestCase):
+    def _predict(self, tmp, render):
+        source = Path(tmp) / "img.jpg"
+        cv2.imwrite(str(source), np.full((64, 64, 3), 90, np.uint8))
+        with patch.object(predict_tree, "BASE_DIR", Path(tmp)), \
+             patch.object(predict_tree, "get_model", return_value=_FakeDetector()), \
+             patch.object(predict_tree, "get_device", return_value=torch.device("cpu")):
+            return predict_tree.predict(
+                "elma.pt", str(source), return_boxes=True, render=render
+            )
+
+    def test_centers_and_scores_match_per_box_loop(self):
+        det = torch.tensor(
+            [[10.0, 20.0, 31.0, 41.0, 0.9, 0.0], [0.0, 0.0, 5.0, 5.0, 0.4, 0.0]]
+        )
+        centers, scores = predict_tree._centers_and_scores(det)
+
+        expected = []
+        for *xyxy, conf, _cls in reversed(det):
+            x1, y1, x2, y2 = [float(v) for v in xyxy]
+            expected.append(
+                ({"x": int(round((x1 + x2) / 2.0)), "y": int(round((y1 + y2) / 2.0))},
+                 float(conf))
+            )
+        self.assertEqual(centers, [c for c, _ in expected])
+        self.assertEqual(scores, [score for _, score in expected])
+
+    def test_render_false_skips_annotated_image(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            count, unique_id, confidence, centers = self._predict(tmp, render=False)
+
+            self.assertEqual(count, b"01")
+            self.assertEqual(len(centers), 1)
+            self.assertAlmostEqual(confidence, 0.9, places=5)
+            self.assertFalse((Path(tmp) / "static" / "detected" / unique_id).exists())
+
+    def test_render_writes_annotated_image(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _, unique_id, _, _ = self._predict(tmp, render=True)
+            output = Path(tmp) / "static" / "detected" / unique_id / "img.jpg"
+            self.assertTrue(output.exists())
+
+
+class BatchedNmsParityTests(SimpleTestCase):
+    """The batched NMS must match the per-image reference implementation."""
+
+    def _prediction(self, bs, anchors, nc, seed):
+        g = torch.Generator().manual_seed(seed)
+        pred = torch.rand((bs, anchors, 5 + nc), generator=g)
+        pred[..., :2] *= 640
+        pred[..., 2:4] = pred[..., 2:4] * 120 + 4
+        return pred
+
+    def _assert_same(self, pred, **kwargs):
+        expected = general._non_max_suppression_per_image(pred.clone(), **kwargs)
+        actual = predict_tree.non_max_suppression(pred.clone(), **kwargs)
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertEqual(a.shape, e.shape)
+            a = a[a[:, 4].argsort(descending=True)]
+            e = e[e[:, 4].argsort(descending=True)]
+            self.assertTrue(torch.allclose(a, e.float(), atol=1e-5))
+
+    def test_matches_reference_across_batch_sizes_and_classes(self):
+        for bs, nc, seed in [(1, 1, 0), (3, 1, 1), (4, 3, 2), (2, 5, 3)]:
+            with self.subTest(bs=bs, nc=nc):
+                pred = self._prediction(bs, 2000, nc, seed)
+                self._assert_same(pred, conf_thres=0.3, iou_thres=0.45)
+
+    def test_matches_reference_with_options(self):
+        pred = self._prediction(3, 1500, 4, 7)
+        for kwargs in [
+            {"multi_label": True},
+            {"agnostic": True},
+            {"classes": [0, 2]},
+        ]:
+            with self.subTest(**kwargs):
+                self._assert_same(pred, conf_thres=0.25, iou_thres=0.5, **kwargs)
+
+    def test_empty_images_and_max_det(self):
+        pred = self._prediction(3, 4000, 1, 11)
+        pred[1, :, 4] = 0.0
+        out = predict_tree.non_max_suppression(
+            pred, conf_thres=0.05, iou_thres=0.9, max_det=5
+        )
+        self.assertEqual([len(d) for d in out], [5, 0, 5])
+        self._assert_same(pred, conf_thres=0.05, iou_thres=0.9)
@@ -11,7 +11,7 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
-from yolowebapp2.api_views import health_check
+from yolowebapp2.api_views import health_check, metrics
 
 urlpatterns = [
     path("", RedirectView.as_view(url="/detection/", permanent=False)),
@@ -42,6 +42,7 @@ urlpatterns = [
     path("accounts/", include("accounts.urls")),
     path("api/", include("yolowebapp2.api_urls")),
     path("health/", health_check, name="health-check"),
+    path("metrics/", metrics, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),